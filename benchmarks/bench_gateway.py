@@ -0,0 +1,280 @@
+"""Load-test the generated gateway locally with `php -S`.
+
+Builds the ZIP from `src/` into a temp dir (the tracked bundle and manifest are
+left alone), unpacks it there, writes a `.env`, seeds a synthetic folder straight on disk and serves the
+tree with PHP's built-in server. Then it runs concurrent upload, list and
+delete workloads and prints latency percentiles and throughput as JSON:
+
+    python benchmarks/bench_gateway.py --seed-files 50000 --concurrency 8 --output bench.json
+    python benchmarks/bench_gateway.py --env HALAL_BLOB_LAYOUT=sharded --env HALAL_BLOB_DEDUP=true
+
+Needs the `php` CLI (with fileinfo; pdo_sqlite for the list index) on PATH.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import argparse
+import json
+import math
+import os
+import secrets
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+import zipfile
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from src.build_ops import bundle_files, zip_bytes
+
+ZIP_NAME = "halal-custom-blob-setup.zip"
+BENCH_FOLDER = "bench"
+PNG_1X1 = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360000002000154a24f5d0000000049454e44ae426082"
+)
+
+
+def build_zip(serving_profile: str, target: Path) -> Path:
+    zip_path = target / ZIP_NAME
+    zip_path.write_bytes(zip_bytes(bundle_files(serving_profile)))
+    return zip_path
+
+
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def deploy(zip_path: Path, target: Path, base_url: str, key: str, overrides: dict) -> dict:
+    with zipfile.ZipFile(zip_path) as bundle:
+        bundle.extractall(target)
+    env = {}
+    for line in (target / ".env-template").read_text(encoding="utf-8").splitlines():
+        if "=" in line:
+            name, value = line.split("=", 1)
+            env[name.strip()] = value.strip().strip('"')
+    env.update({
+        "HALAL_BLOB_KEY": key,
+        "HALAL_BLOB_BASE_URL": base_url,
+        "HALAL_BLOB_ALLOWED_EXT": "jpg,jpeg,png,webp,gif",
+    })
+    env.update(overrides)
+    (target / ".env").write_text("".join(f'{name}="{value}"\n' for name, value in env.items()), encoding="utf-8")
+    return env
+
+
+def seed_tree(root: Path, env: dict, count: int) -> float:
+    """Write `count` blobs plus sidecars directly on disk, mirroring upload.php's layout."""
+    started = time.perf_counter()
+    blob_path = env.get("HALAL_BLOB_PATH", "blob")
+    sharded = env.get("HALAL_BLOB_LAYOUT", "flat") == "sharded"
+    stamp = time.strftime("%Y-%m-%dT%H:%M:%S+00:00", time.gmtime())
+    for i in range(count):
+        base = secrets.token_hex(16)
+        name = f"{base}.png"
+        stored = f"{base[0:2]}/{base[2:4]}/{name}" if sharded else name
+        rel = f"{BENCH_FOLDER}/{stored}"
+        blob_file = root / blob_path / rel
+        meta_file = root / "meta" / f"{rel}.json"
+        blob_file.parent.mkdir(parents=True, exist_ok=True)
+        meta_file.parent.mkdir(parents=True, exist_ok=True)
+        data = PNG_1X1 + i.to_bytes(8, "big")
+        blob_file.write_bytes(data)
+        meta = {
+            "path": rel,
+            "url": f"{env['HALAL_BLOB_BASE_URL']}/{blob_path}/{rel}",
+            "size_bytes": len(data),
+            "mime_type": "image/png",
+            "original_name": f"seed-{i}.png",
+            "uploaded_at": stamp,
+            "client_ip": "127.0.0.1",
+            "folder": BENCH_FOLDER,
+        }
+        meta_file.write_text(json.dumps(meta, indent=4), encoding="utf-8")
+    return time.perf_counter() - started
+
+
+def start_server(root: Path, port: int, workers: int) -> subprocess.Popen:
+    env = dict(os.environ, PHP_CLI_SERVER_WORKERS=str(workers))
+    proc = subprocess.Popen(
+        ["php", "-S", f"127.0.0.1:{port}", "-t", str(root)],
+        cwd=root,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return proc
+        except OSError:
+            time.sleep(0.05)
+    proc.terminate()
+    raise SystemExit("php -S did not start")
+
+
+class Gateway:
+    def __init__(self, base_url: str, key: str, blob_path: str) -> None:
+        self.api = f"{base_url}/api/{blob_path}"
+        self.key = key
+
+    def call(self, method: str, endpoint: str, body: bytes = None, content_type: str = None) -> tuple:
+        request = urllib.request.Request(f"{self.api}/{endpoint}", data=body, method=method)
+        request.add_header("X-Halal-Blob-Key", self.key)
+        if content_type:
+            request.add_header("Content-Type", content_type)
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=60) as res:
+                status, payload = res.status, res.read()
+        except urllib.error.HTTPError as exc:
+            status, payload = exc.code, exc.read()
+        except OSError:
+            status, payload = 0, b""
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        try:
+            data = json.loads(payload)
+        except ValueError:
+            data = None
+        ok = status == 200 and isinstance(data, dict) and data.get("success") is True
+        return ok, elapsed_ms, data
+
+    def upload(self, index: int) -> tuple:
+        boundary = secrets.token_hex(12)
+        content = PNG_1X1 + secrets.token_bytes(64)
+        body = (
+            f"--{boundary}\r\nContent-Disposition: form-data; name=\"folder\"\r\n\r\n{BENCH_FOLDER}\r\n"
+            f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"bench-{index}.png\"\r\n"
+            f"Content-Type: image/png\r\n\r\n"
+        ).encode() + content + f"\r\n--{boundary}--\r\n".encode()
+        return self.call("POST", "upload.php", body, f"multipart/form-data; boundary={boundary}")
+
+    def list_page(self, cursor: str = None, page: int = 1, per_page: int = 100) -> tuple:
+        query = f"folder={BENCH_FOLDER}&per_page={per_page}" + (f"&cursor={cursor}" if cursor else f"&page={page}")
+        return self.call("GET", f"list.php?{query}")
+
+    def delete(self, path: str) -> tuple:
+        return self.call("POST", "delete.php", json.dumps({"path": path}).encode(), "application/json")
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(q * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(results: list, wall_seconds: float) -> dict:
+    latencies = sorted(ms for _, ms, _ in results)
+    return {
+        "requests": len(results),
+        "errors": sum(1 for ok, _, _ in results if not ok),
+        "wall_s": round(wall_seconds, 3),
+        "throughput_rps": round(len(results) / wall_seconds, 2) if wall_seconds > 0 else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50), 2),
+        "p95_ms": round(percentile(latencies, 0.95), 2),
+        "p99_ms": round(percentile(latencies, 0.99), 2),
+        "max_ms": round(latencies[-1], 2) if latencies else 0.0,
+    }
+
+
+def run_concurrent(fn, items: list, concurrency: int) -> tuple:
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(fn, items))
+    return summarize(results, time.perf_counter() - started), results
+
+
+def run(args: argparse.Namespace) -> dict:
+    if shutil.which("php") is None:
+        raise SystemExit("php CLI not found on PATH")
+    overrides = dict(item.split("=", 1) for item in args.env)
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    key = secrets.token_hex(32)
+    php_version = subprocess.run(["php", "-r", "echo PHP_VERSION;"], capture_output=True, text=True).stdout.strip()
+
+    with tempfile.TemporaryDirectory(prefix="halal-blob-bench-") as tmp:
+        zip_path = Path(args.zip) if args.zip else build_zip(args.serving_profile, Path(tmp))
+        root = Path(tmp) / "site"
+        env = deploy(zip_path, root, base_url, key, overrides)
+        seed_seconds = seed_tree(root, env, args.seed_files)
+        server = start_server(root, port, args.php_workers)
+        try:
+            gateway = Gateway(base_url, key, env.get("HALAL_BLOB_PATH", "blob"))
+            workloads = {}
+
+            started = time.perf_counter()
+            cold = gateway.list_page(per_page=args.per_page)
+            workloads["list_cold"] = summarize([cold], time.perf_counter() - started)
+
+            workloads["upload"], uploads = run_concurrent(gateway.upload, list(range(args.uploads)), args.concurrency)
+
+            pages = [max(1, (i * 7919) % max(1, args.seed_files // args.per_page) + 1) for i in range(args.lists)]
+            workloads["list_offset"], _ = run_concurrent(lambda page: gateway.list_page(page=page, per_page=args.per_page), pages, args.concurrency)
+
+            walk = []
+            cursor, started = None, time.perf_counter()
+            for _ in range(args.lists):
+                result = gateway.list_page(cursor=cursor, per_page=args.per_page)
+                walk.append(result)
+                cursor = result[2].get("next_cursor") if isinstance(result[2], dict) else None
+                if not cursor:
+                    break
+            workloads["list_cursor"] = summarize(walk, time.perf_counter() - started)
+
+            paths = [data["path"] for ok, _, data in uploads if ok]
+            workloads["delete"], _ = run_concurrent(gateway.delete, paths, args.concurrency)
+        finally:
+            server.terminate()
+            server.wait(timeout=10)
+
+    return {
+        "php_version": php_version,
+        "config": {
+            "seed_files": args.seed_files,
+            "uploads": args.uploads,
+            "lists": args.lists,
+            "per_page": args.per_page,
+            "concurrency": args.concurrency,
+            "php_workers": args.php_workers,
+            "serving_profile": args.serving_profile,
+            "env": overrides,
+        },
+        "seed_s": round(seed_seconds, 3),
+        "workloads": workloads,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the generated gateway under php -S.")
+    parser.add_argument("--seed-files", type=int, default=10000, help="Synthetic files written into blob/bench before the run")
+    parser.add_argument("--uploads", type=int, default=500, help="Upload requests")
+    parser.add_argument("--lists", type=int, default=200, help="List requests per list workload")
+    parser.add_argument("--per-page", type=int, default=100, help="list.php page size")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent client requests")
+    parser.add_argument("--php-workers", type=int, default=8, help="PHP_CLI_SERVER_WORKERS for php -S")
+    parser.add_argument("--serving-profile", default="standard", help="Builder serving profile")
+    parser.add_argument("--zip", help="Use an existing bundle instead of building one")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="Extra .env setting (repeatable)")
+    parser.add_argument("--output", type=Path, help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    report = json.dumps(run(args), indent=2)
+    if args.output:
+        args.output.write_text(report + "\n", encoding="utf-8")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
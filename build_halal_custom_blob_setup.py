@@ -2,27 +2,91 @@
 # Fallback:     `python this_script.py`
 
 from pathlib import Path
+import argparse
 import os
+import sys
 import src.contents as contents
-from src.build_ops import create_directories, write_files, create_zip
+from src.build_ops import (
+    bundle_files,
+    build_manifest,
+    create_delta_zip,
+    create_directories,
+    create_zip,
+    is_up_to_date,
+    load_manifest,
+    write_files,
+    write_manifest,
+)
 from src.sdk_writer import write_sdk
 from src import __version__
 
 ZIP_NAME = "halal-custom-blob-setup.zip"
+MANIFEST_NAME = "halal-custom-blob-setup.manifest.json"
+DELTA_ZIP_NAME = "halal-custom-blob-setup.delta.zip"
 
 
 def main() -> None:
-    base_path = Path.cwd() / "halal_custom_blob_setup_build"
-    print(f"Building Halal Custom Blob Setup v{__version__}...")
+    parser = argparse.ArgumentParser(description="Build the Halal Custom Blob Setup ZIP and SDK.")
+    parser.add_argument(
+        "--serving-profile",
+        choices=contents.SERVING_PROFILES,
+        default="standard",
+        help="blob/.htaccess profile: 'performance' adds immutable caching, ETags and precompressed .br/.gz serving",
+    )
+    parser.add_argument(
+        "--delta",
+        action="store_true",
+        help=f"Also write {DELTA_ZIP_NAME} containing only files changed since the previous manifest",
+    )
+    parser.add_argument("--serve", type=Path, metavar="ROOT", help="Serve a deployed tree with the Python reference gateway instead of building")
+    parser.add_argument("--host", default="127.0.0.1", help="Bind address for --serve")
+    parser.add_argument("--port", type=int, default=8080, help="Port for --serve")
+    parser.add_argument(
+        "--conformance",
+        action="store_true",
+        help="Replay the protocol conformance session against the PHP and Python gateways instead of building",
+    )
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="Extra .env setting for --conformance (repeatable)")
+    parser.add_argument("--base-url", help="Also run --conformance against this already deployed host")
+    parser.add_argument("--key", help="HALAL_BLOB_KEY of the --base-url host")
+    args = parser.parse_args()
+
+    if args.serve:
+        from src.gateway import serve
+        serve(args.serve, args.host, args.port)
+        return
+    if args.conformance:
+        from src.conformance import run
+        overrides = dict(item.split("=", 1) for item in args.env)
+        sys.exit(run(overrides, args.serving_profile, args.base_url, args.key))
+
+    root = Path.cwd()
+    base_path = root / "halal_custom_blob_setup_build"
+    zip_path = root / ZIP_NAME
+    manifest_path = root / MANIFEST_NAME
+    print(f"Building Halal Custom Blob Setup v{__version__} ({args.serving_profile} profile)...")
+
+    files = bundle_files(args.serving_profile)
+    previous = load_manifest(manifest_path)
+    manifest = build_manifest(files, args.serving_profile)
+    write_sdk(root)
+
+    if is_up_to_date(previous, manifest, zip_path):
+        print(f"No changes since last build; {ZIP_NAME} left untouched.")
+        return
+
     create_directories(base_path)
-    write_files(base_path)
-    create_zip(base_path, ZIP_NAME)
-    write_sdk(Path.cwd())
+    write_files(base_path, files)
+    manifest["bundle_sha256"] = create_zip(files, str(zip_path))
+    write_manifest(manifest_path, manifest)
 
-    zip_path = Path.cwd() / ZIP_NAME
     if not zip_path.exists():
         raise FileNotFoundError(f"{ZIP_NAME} missing at {zip_path}")
 
+    if args.delta and previous is not None:
+        changed = create_delta_zip(files, previous, manifest, str(root / DELTA_ZIP_NAME))
+        print(f"DELTA READY! {DELTA_ZIP_NAME} ({len(changed)} changed file(s))")
+
     print(f"ZIP READY! {ZIP_NAME}")
 
 
@@ -0,0 +1,410 @@
+"""Async Python client for the Halal Blob gateway.
+
+Usage example (requires httpx: `pip install httpx`):
+
+    import asyncio
+    from halal_blob_client import HalalBlobClient
+
+    async def main():
+        async with HalalBlobClient(base_url="https://blob.example.com", key="...") as client:
+            await client.ping()
+            results = await client.upload_many(["a.jpg", "b.png"], folder="images", concurrency=8)
+            async for item in client.iter_files(folder="images"):
+                print(item["path"])
+
+    asyncio.run(main())
+"""
+
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterable, Optional, Union
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import os
+import random
+import time
+
+import httpx
+
+HALAL_BLOB_SDK_VERSION = "1.1.2"
+
+PathLike = Union[str, "os.PathLike[str]"]
+RETRY_STATUSES = frozenset({500, 502, 503, 504})
+
+
+class HalalBlobError(Exception):
+    def __init__(self, code: str, message: str) -> None:
+        super().__init__(f"{code}: {message}")
+        self.code = code
+        self.message = message
+
+
+def _error(code: str, message: str) -> dict:
+    return {"success": False, "error": {"code": code, "message": message}}
+
+
+def _sha256_file(path: Path, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for block in iter(lambda: handle.read(chunk_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class HalalBlobClient:
+    """Pooled keep-alive client; reuse one instance per process and close it with `aclose()`."""
+
+    def __init__(
+        self,
+        base_url: str,
+        key: str,
+        blob_path: str = "blob",
+        *,
+        max_connections: int = 16,
+        timeout: float = 60.0,
+        retries: int = 3,
+        backoff: float = 0.5,
+        client: Optional[httpx.AsyncClient] = None,
+    ) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.key = key
+        self.blob_path = blob_path.strip("/") or "blob"
+        self.retries = max(0, retries)
+        self.backoff = backoff
+        self._owns_client = client is None
+        self._client = client or httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            headers={"User-Agent": f"halal-blob-client-python/{HALAL_BLOB_SDK_VERSION}"},
+        )
+
+    async def __aenter__(self) -> "HalalBlobClient":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        if self._owns_client:
+            await self._client.aclose()
+
+    def _url(self, endpoint: str) -> str:
+        return f"{self.base_url}/api/{self.blob_path}/{endpoint}"
+
+    async def _request(self, method: str, endpoint: str, build: Optional[Callable[[], dict]] = None, **kwargs: Any) -> dict:
+        """Send a request, retrying transport errors and 5xx with jittered exponential backoff.
+
+        `build` is called once per attempt so streamed bodies (open file handles) are
+        recreated from the start on every retry.
+        """
+        headers = {"X-Halal-Blob-Key": self.key}
+        attempt = 0
+        while True:
+            handles: list = []
+            request_kwargs = dict(kwargs)
+            if build is not None:
+                extra = build()
+                handles = extra.pop("_handles", [])
+                request_kwargs.update(extra)
+            try:
+                res = await self._client.request(method, self._url(endpoint), headers=headers, **request_kwargs)
+            except httpx.TransportError as exc:
+                if attempt >= self.retries:
+                    return _error("NETWORK_ERROR", str(exc) or exc.__class__.__name__)
+                res = None
+            finally:
+                for handle in handles:
+                    handle.close()
+            if res is not None and (res.status_code not in RETRY_STATUSES or attempt >= self.retries):
+                try:
+                    return res.json()
+                except ValueError:
+                    return _error("SERVER_ERROR", f"Unexpected HTTP {res.status_code} response")
+            await asyncio.sleep(self.backoff * (2 ** attempt) * (0.5 + random.random()))
+            attempt += 1
+
+    async def ping(self) -> dict:
+        return await self._request("GET", "ping.php")
+
+    def create_upload_token(
+        self,
+        *,
+        folder: str = "",
+        max_bytes: Optional[int] = None,
+        types: Optional[Iterable[str]] = None,
+        ttl: int = 300,
+        private: bool = False,
+    ) -> dict:
+        """Mint a short-lived HMAC-signed token that lets a browser POST straight to
+        `upload.php` (as `?token=` or `X-Halal-Blob-Token`) without the key.
+
+        Returns `{"token", "url", "expires_at"}`; the token pins the folder and optionally a
+        per-file size cap and allowed extensions on top of the gateway's own limits.
+        `private=True` stores the uploads in the private area (see `signed_url`).
+        """
+        claims: dict = {"scope": "upload", "folder": folder.strip("/"), "exp": int(time.time()) + ttl}
+        if max_bytes is not None:
+            claims["max_bytes"] = int(max_bytes)
+        if types is not None:
+            claims["types"] = [value.lower() for value in types]
+        if private:
+            claims["private"] = True
+        token = self._sign(claims)
+        return {"token": token, "url": f"{self._url('upload.php')}?token={token}", "expires_at": claims["exp"]}
+
+    def signed_url(self, path: str, *, ttl: int = 3600) -> str:
+        """Return an expiring `download.php` URL for a private file; it serves Range requests."""
+        token = self._sign({"scope": "download", "path": path.lstrip("/"), "exp": int(time.time()) + ttl})
+        return f"{self._url('download.php')}?token={token}"
+
+    def _sign(self, claims: dict) -> str:
+        body = base64.urlsafe_b64encode(json.dumps(claims, separators=(",", ":")).encode()).decode().rstrip("=")
+        signature = hmac.new(self.key.encode(), body.encode(), hashlib.sha256).digest()
+        return f"{body}.{base64.urlsafe_b64encode(signature).decode().rstrip('=')}"
+
+    async def upload_file(
+        self,
+        path: PathLike,
+        *,
+        folder: Optional[str] = None,
+        filename: Optional[str] = None,
+        dedupe: bool = False,
+        private: bool = False,
+    ) -> dict:
+        """Upload one file from disk; the body is streamed, never read whole into memory.
+
+        `private=True` stores it outside the public tree; fetch it through `signed_url`.
+        """
+        path = Path(path)
+        if dedupe:
+            sha256 = await asyncio.to_thread(_sha256_file, path)
+            found = await self.exists(sha256, folder=folder, filename=filename or path.name, private=private)
+            if not found.get("success") or found.get("exists"):
+                return found
+        data = {name: value for name, value in (("folder", folder), ("filename", filename)) if value}
+
+        def build() -> dict:
+            handle = open(path, "rb")
+            return {"files": {"file": (path.name, handle, "application/octet-stream")}, "data": data, "_handles": [handle]}
+
+        return await self._request("POST", "upload.php", build, params={"private": 1} if private else {})
+
+    async def upload_batch(
+        self,
+        paths: Iterable[PathLike],
+        *,
+        folder: Optional[str] = None,
+        max_batch_bytes: int = 20 * 1024 * 1024,
+        max_batch_files: int = 20,
+        concurrency: int = 2,
+    ) -> list:
+        """Upload files as multi-file `file[]` requests packed up to the batch caps.
+
+        Keep the caps within the gateway's HALAL_BLOB_BATCH_MAX_MB / _MAX_FILES. Results
+        keep the input order; a request-level error is reported for every file it carried.
+        """
+        paths = [Path(path) for path in paths]
+        sizes = await asyncio.to_thread(lambda: [path.stat().st_size for path in paths])
+        batches: list = []
+        current: list = []
+        current_bytes = 0
+        for index, size in enumerate(sizes):
+            if current and (len(current) >= max(1, max_batch_files) or current_bytes + size > max_batch_bytes):
+                batches.append(current)
+                current, current_bytes = [], 0
+            current.append(index)
+            current_bytes += size
+        if current:
+            batches.append(current)
+
+        results: list = [None] * len(paths)
+        data = {"folder": folder} if folder else {}
+
+        async def send(batch: list) -> dict:
+            def build() -> dict:
+                handles = [open(paths[index], "rb") for index in batch]
+                files = [("file[]", (paths[index].name, handle, "application/octet-stream")) for index, handle in zip(batch, handles)]
+                return {"files": files, "data": data, "_handles": handles}
+
+            body = await self._request("POST", "upload.php", build)
+            for result in body.get("results", []):
+                result = dict(result)
+                results[batch[result.pop("index")]] = result
+            for index in batch:
+                if results[index] is None:
+                    results[index] = body if "error" in body else _error("NO_FILE", "No file uploaded")
+            return body
+
+        await self._gather_limited(batches, send, concurrency)
+        return results
+
+    async def exists(self, sha256: str, *, folder: Optional[str] = None, filename: Optional[str] = None, private: bool = False) -> dict:
+        return await self._request(
+            "POST", "exists.php", json={"sha256": sha256, "folder": folder, "filename": filename}, params={"private": 1} if private else {}
+        )
+
+    async def delete_file(self, path: str, *, private: bool = False) -> dict:
+        return await self._request("POST", "delete.php", json={"path": path}, params={"private": 1} if private else {})
+
+    async def copy_file(self, path: str, *, folder: Optional[str] = None, filename: Optional[str] = None) -> dict:
+        """Copy a file on the server (hard link where possible) without re-uploading it."""
+        return await self._request("POST", "copy.php", json={"from": path, "folder": folder, "filename": filename})
+
+    async def move_file(self, path: str, *, folder: Optional[str] = None, filename: Optional[str] = None) -> dict:
+        """Move or rename a file on the server; its sidecar and list index entry follow it."""
+        return await self._request("POST", "copy.php", json={"from": path, "folder": folder, "filename": filename, "move": True})
+
+    async def list_files(
+        self,
+        *,
+        folder: Optional[str] = None,
+        page: Optional[int] = None,
+        per_page: Optional[int] = None,
+        cursor: Optional[str] = None,
+        private: bool = False,
+    ) -> dict:
+        params: dict = {}
+        if folder:
+            params["folder"] = folder
+        if private:
+            params["private"] = 1
+        if cursor:
+            params["cursor"] = cursor
+        elif page:
+            params["page"] = page
+        if per_page:
+            params["per_page"] = per_page
+        return await self._request("GET", "list.php", params=params)
+
+    async def stats(self, folder: Optional[str] = None) -> dict:
+        """Return file count, bytes, per-MIME usage and quota for one folder."""
+        return await self._request("GET", "stats.php", params={"folder": folder} if folder else {})
+
+    async def changes(self, *, since: int = 0, limit: Optional[int] = None) -> dict:
+        """Return one page of the change journal after the `since` seq."""
+        params: dict = {"since": since}
+        if limit:
+            params["limit"] = limit
+        return await self._request("GET", "changes.php", params=params)
+
+    async def iter_changes(
+        self,
+        *,
+        since: int = 0,
+        limit: Optional[int] = None,
+        follow: bool = False,
+        poll_interval: float = 5.0,
+    ) -> AsyncIterator[dict]:
+        """Yield journal events (`put`/`delete`) after `since` in order; store each `seq` to resume.
+
+        With `follow=True` it keeps polling every `poll_interval` seconds once caught up.
+        `HalalBlobError` with code CURSOR_EXPIRED means the journal was pruned past the
+        cursor: re-list, then resume from the `head` that `changes()` reports.
+        """
+        while True:
+            body = await self.changes(since=since, limit=limit)
+            if not body.get("success"):
+                error = body.get("error") or {}
+                raise HalalBlobError(error.get("code", "SERVER_ERROR"), error.get("message", "Changes failed"))
+            for event in body.get("changes", []):
+                yield event
+            since = body.get("next_since", since)
+            if body.get("has_more"):
+                continue
+            if not follow:
+                return
+            await asyncio.sleep(poll_interval)
+
+    async def iter_files(self, *, folder: Optional[str] = None, per_page: int = 100) -> AsyncIterator[dict]:
+        """Yield every file in `folder`, fetching pages lazily via `next_cursor`."""
+        cursor: Optional[str] = None
+        while True:
+            body = await self.list_files(folder=folder, per_page=per_page, cursor=cursor)
+            if not body.get("success"):
+                error = body.get("error") or {}
+                raise HalalBlobError(error.get("code", "SERVER_ERROR"), error.get("message", "List failed"))
+            for item in body.get("files", []):
+                yield item
+            cursor = body.get("next_cursor")
+            if not cursor:
+                return
+
+    async def _gather_limited(self, items: Iterable[Any], worker: Callable[[Any], Awaitable[dict]], concurrency: int) -> list:
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def run(item: Any) -> dict:
+            async with semaphore:
+                return await worker(item)
+
+        return await asyncio.gather(*(run(item) for item in items))
+
+    async def upload_many(
+        self,
+        paths: Iterable[PathLike],
+        *,
+        folder: Optional[str] = None,
+        concurrency: int = 4,
+        dedupe: bool = False,
+    ) -> list:
+        """Upload several files at most `concurrency` at a time; results keep the input order."""
+        return await self._gather_limited(
+            paths, lambda path: self.upload_file(path, folder=folder, dedupe=dedupe), concurrency
+        )
+
+    async def delete_many(self, paths: Iterable[str], *, batch_size: int = 1000, concurrency: int = 2) -> list:
+        """Delete files through bulk requests of up to `batch_size` paths (the gateway caps a
+        request at 1000), `concurrency` at a time; results keep the input order."""
+        paths = list(paths)
+        size = min(1000, max(1, batch_size))
+        batches = [paths[i:i + size] for i in range(0, len(paths), size)]
+
+        async def send(batch: list) -> list:
+            body = await self._request("POST", "delete.php", json={"paths": batch})
+            results = body.get("results") or []
+            fallback = body if "error" in body else _error("SERVER_ERROR", "Missing delete result")
+            return [results[i] if i < len(results) else fallback for i in range(len(batch))]
+
+        responses = await self._gather_limited(batches, send, concurrency)
+        return [result for batch in responses for result in batch]
+
+    async def copy_many(self, items: Iterable[Any], *, folder: Optional[str] = None, batch_size: int = 1000, concurrency: int = 2) -> list:
+        """Copy paths (or `{"from", "folder", "filename"}` dicts) through batched `copy.php`
+        requests; one result per item in input order."""
+        return await self._transfer_many(items, False, folder, batch_size, concurrency)
+
+    async def move_many(self, items: Iterable[Any], *, folder: Optional[str] = None, batch_size: int = 1000, concurrency: int = 2) -> list:
+        """Batched `move_file`; one result per item in input order."""
+        return await self._transfer_many(items, True, folder, batch_size, concurrency)
+
+    async def _transfer_many(self, items: Iterable[Any], move: bool, folder: Optional[str], batch_size: int, concurrency: int) -> list:
+        items = list(items)
+        size = min(1000, max(1, batch_size))
+        batches = [items[i:i + size] for i in range(0, len(items), size)]
+
+        async def send(batch: list) -> list:
+            body = await self._request("POST", "copy.php", json={"items": batch, "folder": folder, "move": move})
+            results = body.get("results") or []
+            fallback = body if "error" in body else _error("SERVER_ERROR", "Missing transfer result")
+            return [results[i] if i < len(results) else fallback for i in range(len(batch))]
+
+        responses = await self._gather_limited(batches, send, concurrency)
+        return [result for batch in responses for result in batch]
+
+    async def delete_folder(self, folder: str, *, on_progress: Optional[Callable[[int], None]] = None) -> dict:
+        """Remove a folder in server-side passes bounded by HALAL_BLOB_DELETE_BUDGET_MS,
+        following the continuation cursor until the gateway reports `done`."""
+        cursor: Optional[str] = None
+        totals = {"deleted": 0, "failed": 0, "bytes": 0}
+        while True:
+            body = await self._request("POST", "delete.php", json={"folder": folder, "cursor": cursor})
+            if "error" in body:
+                return body
+            for key in totals:
+                totals[key] += body.get(key, 0)
+            if on_progress is not None:
+                on_progress(totals["deleted"])
+            if body.get("done") or not body.get("cursor"):
+                return {**body, **totals, "success": totals["failed"] == 0}
+            cursor = body["cursor"]
@@ -1,47 +1,151 @@
 from pathlib import Path
+import hashlib
+import io
+import json
 import zipfile
+from typing import Optional
+from . import __version__
 from .contents import (
     env_template_content,
     api_htaccess_content,
+    bootstrap_php_content,
     blob_htaccess_content,
     upload_php_content,
+    upload_init_php_content,
+    upload_chunk_php_content,
+    upload_complete_php_content,
+    exists_php_content,
     delete_php_content,
+    copy_php_content,
+    download_php_content,
+    changes_php_content,
     list_php_content,
     ping_php_content,
+    stats_php_content,
     howto_txt_content,
+    variant_php_content,
+    variants_htaccess_content,
+    tools_htaccess_content,
+    private_htaccess_content,
+    migrate_layout_py_content,
+    blob_fsck_py_content,
+    analyze_logs_py_content,
 )
 
+ZIP_EPOCH = (1980, 1, 1, 0, 0, 0)
+EMPTY_DIRS = ("blob/", "meta/")
+
+def bundle_files(serving_profile: str = "standard") -> dict[str, str]:
+    files = {
+        ".env-template": env_template_content(serving_profile),
+        "api/.htaccess": api_htaccess_content(),
+        "api/blob/_bootstrap.php": bootstrap_php_content(),
+        "api/blob/upload.php": upload_php_content(),
+        "api/blob/upload_init.php": upload_init_php_content(),
+        "api/blob/upload_chunk.php": upload_chunk_php_content(),
+        "api/blob/upload_complete.php": upload_complete_php_content(),
+        "api/blob/exists.php": exists_php_content(),
+        "api/blob/variant.php": variant_php_content(),
+        "api/blob/delete.php": delete_php_content(),
+        "api/blob/copy.php": copy_php_content(),
+        "api/blob/download.php": download_php_content(),
+        "api/blob/changes.php": changes_php_content(),
+        "api/blob/list.php": list_php_content(),
+        "api/blob/ping.php": ping_php_content(),
+        "api/blob/stats.php": stats_php_content(),
+        "blob/.htaccess": blob_htaccess_content(serving_profile),
+        "variants/.htaccess": variants_htaccess_content(),
+        "tools/.htaccess": tools_htaccess_content(),
+        "private/.htaccess": private_htaccess_content(),
+        "tools/migrate_layout.py": migrate_layout_py_content(),
+        "tools/blob_fsck.py": blob_fsck_py_content(),
+        "tools/analyze_logs.py": analyze_logs_py_content(),
+        "How to Setup [EZ].txt": howto_txt_content(),
+    }
+    return dict(sorted(files.items()))
+
+def sha256_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
 def create_directories(base_path: Path) -> None:
     (base_path / "api" / "blob").mkdir(parents=True, exist_ok=True)
     (base_path / "blob").mkdir(parents=True, exist_ok=True)
     (base_path / "meta").mkdir(parents=True, exist_ok=True)
+    (base_path / "variants").mkdir(parents=True, exist_ok=True)
+    (base_path / "tools").mkdir(parents=True, exist_ok=True)
+    (base_path / "private").mkdir(parents=True, exist_ok=True)
+
+def write_if_changed(path: Path, data: bytes) -> bool:
+    if path.is_file() and path.read_bytes() == data:
+        return False
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return True
+
+def write_files(base_path: Path, files: dict[str, str]) -> None:
+    for arcname, content in files.items():
+        write_if_changed(base_path / arcname, content.encode("utf-8"))
+
+def _zip_entry(arcname: str, mode: int) -> zipfile.ZipInfo:
+    info = zipfile.ZipInfo(arcname, date_time=ZIP_EPOCH)
+    info.create_system = 3
+    info.external_attr = mode << 16
+    if arcname.endswith("/"):
+        info.external_attr |= 0x10
+    else:
+        info.compress_type = zipfile.ZIP_DEFLATED
+    return info
+
+def zip_bytes(files: dict[str, str], dirs: tuple[str, ...] = EMPTY_DIRS, extra: Optional[dict[str, str]] = None) -> bytes:
+    entries = {arcname: content.encode("utf-8") for arcname, content in files.items()}
+    for arcname, content in (extra or {}).items():
+        entries[arcname] = content.encode("utf-8")
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=9) as zf:
+        for arcname in sorted(entries):
+            zf.writestr(_zip_entry(arcname, 0o644), entries[arcname], compress_type=zipfile.ZIP_DEFLATED, compresslevel=9)
+        for arcname in sorted(dirs):
+            zf.writestr(_zip_entry(arcname, 0o755), b"")
+    return buffer.getvalue()
+
+def create_zip(files: dict[str, str], zip_name: str) -> str:
+    data = zip_bytes(files)
+    write_if_changed(Path(zip_name), data)
+    return sha256_bytes(data)
+
+def build_manifest(files: dict[str, str], serving_profile: str, bundle_sha256: str = "") -> dict:
+    return {
+        "version": __version__,
+        "serving_profile": serving_profile,
+        "bundle_sha256": bundle_sha256,
+        "files": {arcname: sha256_bytes(content.encode("utf-8")) for arcname, content in files.items()},
+    }
+
+def load_manifest(path: Path) -> Optional[dict]:
+    try:
+        manifest = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    return manifest if isinstance(manifest, dict) and isinstance(manifest.get("files"), dict) else None
+
+def write_manifest(path: Path, manifest: dict) -> None:
+    write_if_changed(path, (json.dumps(manifest, indent=2, sort_keys=True) + "\n").encode("utf-8"))
 
-def write_files(base_path: Path) -> None:
-    (base_path / ".env-template").write_text(env_template_content(), encoding="utf-8")
-    (base_path / "api" / ".htaccess").write_text(api_htaccess_content(), encoding="utf-8")
-    (base_path / "blob" / ".htaccess").write_text(blob_htaccess_content(), encoding="utf-8")
-    (base_path / "api" / "blob" / "upload.php").write_text(upload_php_content(), encoding="utf-8")
-    (base_path / "api" / "blob" / "delete.php").write_text(delete_php_content(), encoding="utf-8")
-    (base_path / "api" / "blob" / "list.php").write_text(list_php_content(), encoding="utf-8")
-    (base_path / "api" / "blob" / "ping.php").write_text(ping_php_content(), encoding="utf-8")
-    (base_path / "How to Setup [EZ].txt").write_text(howto_txt_content(), encoding="utf-8")
-
-def create_zip(base_path: Path, zip_name: str) -> None:
-    with zipfile.ZipFile(zip_name, "w", compression=zipfile.ZIP_DEFLATED) as zf:
-        zf.write(base_path / "api" / ".htaccess", arcname="api/.htaccess")
-        zf.write(base_path / "api" / "blob" / "upload.php", arcname="api/blob/upload.php")
-        zf.write(base_path / "api" / "blob" / "delete.php", arcname="api/blob/delete.php")
-        zf.write(base_path / "api" / "blob" / "list.php", arcname="api/blob/list.php")
-        zf.write(base_path / "api" / "blob" / "ping.php", arcname="api/blob/ping.php")
-        zf.write(base_path / "blob" / ".htaccess", arcname="blob/.htaccess")
-        zf.write(base_path / ".env-template", arcname=".env-template")
-        zf.write(base_path / "How to Setup [EZ].txt", arcname="How to Setup [EZ].txt")
-
-        info_blob = zipfile.ZipInfo("blob/")
-        info_blob.external_attr = 0o755 << 16
-        zf.writestr(info_blob, "")
-
-        info_meta = zipfile.ZipInfo("meta/")
-        info_meta.external_attr = 0o755 << 16
-        zf.writestr(info_meta, "")
+def is_up_to_date(previous: Optional[dict], manifest: dict, zip_path: Path) -> bool:
+    if previous is None or previous.get("files") != manifest["files"] or previous.get("serving_profile") != manifest["serving_profile"]:
+        return False
+    return zip_path.is_file() and sha256_bytes(zip_path.read_bytes()) == previous.get("bundle_sha256")
 
+def create_delta_zip(files: dict[str, str], previous: dict, manifest: dict, zip_name: str) -> list[str]:
+    old_files = previous.get("files", {})
+    changed = {arcname: content for arcname, content in files.items() if old_files.get(arcname) != manifest["files"][arcname]}
+    removed = sorted(arcname for arcname in old_files if arcname not in files)
+    delta = {
+        "from_bundle_sha256": previous.get("bundle_sha256", ""),
+        "to_bundle_sha256": manifest["bundle_sha256"],
+        "changed": sorted(changed),
+        "removed": removed,
+    }
+    data = zip_bytes(changed, dirs=(), extra={"DELTA.json": json.dumps(delta, indent=2) + "\n"})
+    write_if_changed(Path(zip_name), data)
+    return sorted(changed)
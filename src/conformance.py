@@ -0,0 +1,564 @@
+"""Protocol conformance run for the PHP gateway and the Python reference gateway.
+
+Deploys the current bundle into a temp dir per target, serves it (`php -S` for the
+PHP templates, `src.gateway` for Python, or an already running host given with
+`--base-url`/`--key`) and replays the same scripted session against each: auth
+failures, every upload/list/delete/copy/download error code, single and batch
+uploads, offset and cursor pagination, single, bulk and folder deletes, copies and
+moves, signed upload tokens, private uploads with signed Range and conditional
+downloads, a plain blob GET and the change journal those mutations produced. Every response is checked for its expected status
+and error code, then the JSON bodies are normalized (random names, base URL,
+timestamps, runtime version) and compared byte for byte across targets. PHP
+targets also replay the steps for endpoints the Python gateway does not serve
+(chunked uploads, stats, exists, variants); those are checked but not compared. The
+offline tools shipped in `tools/` are then run against damaged temp trees and
+their results checked on disk:
+
+    python build_halal_custom_blob_setup.py --conformance
+    python build_halal_custom_blob_setup.py --conformance --env HALAL_BLOB_LAYOUT=sharded
+
+Exits non-zero on any expectation failure or cross-target difference. When no
+`php` CLI is on PATH only the Python target runs.
+"""
+
+from pathlib import Path
+import hashlib
+import json
+import os
+import re
+import secrets
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+from src.build_ops import bundle_files, create_directories, write_files
+from src.gateway import blob_alternate_path, index_open, token_sign
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+FOLDER = "conformance"
+MAX_MB = "0.01"
+BATCH_MAX_MB = "0.02"
+PNG_1X1 = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360000002000154a24f5d0000000049454e44ae426082"
+)
+VOLATILE_FIELDS = re.compile(r'"(time|uploaded_at|php_version|ts)":"[^"]*"')
+RANDOM_NAME = re.compile(r"[0-9a-f]{32}")
+CURSOR_FIELD = re.compile(r'"next_cursor":"[^"]*"')
+
+
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port: int, proc: subprocess.Popen, label: str) -> None:
+    deadline = time.time() + 10
+    while time.time() < deadline and proc.poll() is None:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return
+        except OSError:
+            time.sleep(0.05)
+    proc.terminate()
+    raise SystemExit(f"{label} did not start")
+
+
+def deploy(target: Path, base_url: str, key: str, overrides: dict, serving_profile: str) -> None:
+    files = bundle_files(serving_profile)
+    create_directories(target)
+    write_files(target, files)
+    env = {}
+    for line in files[".env-template"].splitlines():
+        name, value = line.split("=", 1)
+        env[name] = value.strip('"')
+    env.update({"HALAL_BLOB_KEY": key, "HALAL_BLOB_BASE_URL": base_url, "HALAL_BLOB_MAX_MB": MAX_MB, "HALAL_BLOB_BATCH_MAX_MB": BATCH_MAX_MB})
+    env.update(overrides)
+    (target / ".env").write_text("".join(f'{name}="{value}"\n' for name, value in env.items()), encoding="utf-8")
+
+
+def start_php(root: Path, port: int) -> subprocess.Popen:
+    proc = subprocess.Popen(
+        ["php", "-S", f"127.0.0.1:{port}", "-t", str(root)],
+        cwd=root,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    wait_for_port(port, proc, "php -S")
+    return proc
+
+
+def start_python(root: Path, port: int) -> subprocess.Popen:
+    proc = subprocess.Popen(
+        [sys.executable, "build_halal_custom_blob_setup.py", "--serve", str(root), "--port", str(port)],
+        cwd=REPO_ROOT,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    wait_for_port(port, proc, "Python gateway")
+    return proc
+
+
+class Client:
+    def __init__(self, base_url: str, key: str, blob_path: str) -> None:
+        self.base_url = base_url
+        self.api = f"{base_url}/api/{blob_path}"
+        self.blob = f"{base_url}/{blob_path}"
+        self.key = key
+
+    def call(self, method: str, url: str, body: bytes = None, content_type: str = None, key: str = None) -> tuple:
+        request = urllib.request.Request(url, data=body, method=method)
+        if key is None:
+            key = self.key
+        if key:
+            request.add_header("X-Halal-Blob-Key", key)
+        if content_type:
+            request.add_header("Content-Type", content_type)
+        try:
+            with urllib.request.urlopen(request, timeout=30) as res:
+                return res.status, res.read()
+        except urllib.error.HTTPError as exc:
+            return exc.code, exc.read()
+
+    def api_call(self, method: str, endpoint: str, body: bytes = None, content_type: str = None, key: str = None) -> tuple:
+        return self.call(method, f"{self.api}/{endpoint}", body, content_type, key)
+
+    def fetch(self, url: str, headers: dict) -> tuple:
+        request = urllib.request.Request(url, headers=headers)
+        try:
+            with urllib.request.urlopen(request, timeout=30) as res:
+                return res.status, res.headers, res.read()
+        except urllib.error.HTTPError as exc:
+            return exc.code, exc.headers, exc.read()
+
+    def list_conditional(self, query: str, etag: str = None) -> tuple:
+        """GET list.php, revalidating with If-None-Match when an ETag is given."""
+        headers = {"X-Halal-Blob-Key": self.key}
+        if etag:
+            headers["If-None-Match"] = etag
+        status, res_headers, body = self.fetch(f"{self.api}/list.php?{query}", headers)
+        return status, body, res_headers.get("ETag")
+
+    def upload(self, filename: str = None, content: bytes = b"", folder: str = FOLDER, token: str = None, private: bool = False) -> tuple:
+        return self.upload_files([] if filename is None else [(filename, content)], folder, "file", token, private)
+
+    def upload_files(self, files: list, folder: str = FOLDER, field: str = "file[]", token: str = None, private: bool = False) -> tuple:
+        boundary = secrets.token_hex(12)
+        body = f"--{boundary}\r\nContent-Disposition: form-data; name=\"folder\"\r\n\r\n{folder}\r\n".encode()
+        for filename, content in files:
+            body += (
+                f"--{boundary}\r\nContent-Disposition: form-data; name=\"{field}\"; filename=\"{filename}\"\r\n"
+                f"Content-Type: application/octet-stream\r\n\r\n"
+            ).encode() + content + b"\r\n"
+        body += f"--{boundary}--\r\n".encode()
+        if token is not None:
+            return self.api_call("POST", f"upload.php?token={token}", body, f"multipart/form-data; boundary={boundary}", key="")
+        return self.api_call("POST", "upload.php?private=1" if private else "upload.php", body, f"multipart/form-data; boundary={boundary}")
+
+    def token(self, ttl: int = 300, **claims) -> str:
+        return token_sign(self.key, {"scope": "upload", "folder": "direct", "exp": int(time.time()) + ttl, **claims})
+
+    def download_token(self, path: str, ttl: int = 300) -> str:
+        return token_sign(self.key, {"scope": "download", "path": path, "exp": int(time.time()) + ttl})
+
+    def download(self, token: str, **headers) -> tuple:
+        """GET download.php; successful bodies are summarized against PNG_1X1 so they compare across targets."""
+        status, res_headers, body = self.fetch(f"{self.api}/download.php?token={token}", {name.replace("_", "-"): value for name, value in headers.items()})
+        if status in (200, 206):
+            span = re.match(r"bytes (\d+)-(\d+)/\d+", res_headers.get("Content-Range", ""))
+            expected = PNG_1X1[int(span.group(1)):int(span.group(2)) + 1] if span else PNG_1X1
+            body = json.dumps({"content_range": res_headers.get("Content-Range"), "match": body == expected}).encode()
+        return status, body, res_headers.get("ETag")
+
+    def delete(self, payload, private: bool = False) -> tuple:
+        body = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+        return self.api_call("POST", "delete.php?private=1" if private else "delete.php", body, "application/json")
+
+    def copy(self, payload) -> tuple:
+        return self.post_json("copy.php", payload)
+
+    def chunk(self, upload_id: str, index: int, content: bytes) -> tuple:
+        return self.api_call("POST", f"upload_chunk.php?upload_id={upload_id}&index={index}", content, "application/octet-stream")
+
+    def post_json(self, endpoint: str, payload) -> tuple:
+        body = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+        return self.api_call("POST", endpoint, body, "application/json")
+
+
+def scenario(client: Client):
+    """Yield (step, status, body, expected_status, expected_code); bodies are raw bytes."""
+    yield "ping without key", *client.api_call("GET", "ping.php", key=""), 403, "INVALID_KEY"
+    yield "ping with wrong key", *client.api_call("GET", "ping.php", key="wrong"), 403, "INVALID_KEY"
+    yield "ping", *client.api_call("GET", "ping.php"), 200, None
+    yield "changes on a fresh journal", *client.api_call("GET", "changes.php"), 200, None
+    yield "upload without file", *client.upload(), 400, "NO_FILE"
+    yield "upload into invalid folder", *client.upload("a.png", PNG_1X1, "bad folder!"), 400, "FOLDER_INVALID"
+    yield "upload disguised text", *client.upload("a.png", b"plain text, not an image\n"), 400, "INVALID_TYPE"
+    yield "upload disallowed extension", *client.upload("a.pdf", PNG_1X1), 400, "INVALID_TYPE"
+    yield "upload too large", *client.upload("big.png", PNG_1X1 + bytes(16384)), 400, "FILE_TOO_LARGE"
+
+    paths = []
+    for _ in range(3):
+        status, body = client.upload("pixel.png", PNG_1X1)
+        if status == 200:
+            paths.append(json.loads(body)["path"])
+        yield "upload", status, body, 200, None
+
+    yield "list invalid folder", *client.api_call("GET", "list.php?folder=../x"), 400, "FOLDER_INVALID"
+    yield "list missing folder", *client.api_call("GET", "list.php?folder=missing"), 400, "FOLDER_INVALID"
+    yield "list invalid cursor", *client.api_call("GET", f"list.php?folder={FOLDER}&cursor=%21%21"), 400, "CURSOR_INVALID"
+    status, body = client.api_call("GET", f"list.php?folder={FOLDER}&per_page=2")
+    yield "list first page", status, body, 200, None
+    cursor = json.loads(body).get("next_cursor") if status == 200 else None
+    first = json.loads(body)["files"][0]["path"] if status == 200 and json.loads(body)["files"] else ""
+    yield "list via cursor", *client.api_call("GET", f"list.php?folder={FOLDER}&per_page=2&cursor={cursor or ''}"), 200, None
+    yield "list via page", *client.api_call("GET", f"list.php?folder={FOLDER}&per_page=2&page=2"), 200, None
+    yield "list after path", *client.api_call("GET", f"list.php?folder={FOLDER}&after={first}"), 200, None
+    yield "list after path outside folder", *client.api_call("GET", f"list.php?folder={FOLDER}&after=elsewhere/a.png"), 400, "CURSOR_INVALID"
+    yield "list subfolders", *client.api_call("GET", "list.php?folders=1"), 200, None
+    yield "list with junk paging", *client.api_call("GET", f"list.php?folder={FOLDER}&per_page=abc&page=-3"), 200, None
+    status, body, etag = client.list_conditional(f"folder={FOLDER}&per_page=2")
+    yield "list cached page", status, body, 200, None
+    yield "list not modified", *client.list_conditional(f"folder={FOLDER}&per_page=2", etag)[:2], 304 if etag else 200, None
+
+    yield "delete invalid JSON", *client.delete(b"{not json"), 400, "SERVER_ERROR"
+    yield "delete without path", *client.delete({}), 400, "SERVER_ERROR"
+    yield "delete traversal", *client.delete({"path": "../.env"}), 400, "PATH_INVALID"
+    yield "delete missing file", *client.delete({"path": f"{FOLDER}/{'0' * 32}.png"}), 404, "FILE_NOT_FOUND"
+    if paths:
+        yield "delete", *client.delete({"path": paths.pop(0)}), 200, None
+    yield "list after delete", *client.api_call("GET", f"list.php?folder={FOLDER}"), 200, None
+    yield "list modified since ETag", *client.list_conditional(f"folder={FOLDER}&per_page=2", etag)[:2], 200, None
+    if paths:
+        status, body = client.call("GET", f"{client.blob}/{paths[0]}", key="")
+        yield "blob download", status, b"match" if body == PNG_1X1 else b"mismatch", 200, None
+        mangled = paths[0].replace(".png", "!.png")
+        yield "blob path with disallowed characters", client.call("GET", f"{client.blob}/{mangled}", key="")[0], b"", 404, None
+
+    batch = [("one.png", PNG_1X1), ("fake.png", b"not an image"), ("two.png", PNG_1X1)]
+    yield "batch upload with a bad file", *client.upload_files(batch), 200, None
+    heavy = [(f"heavy{i}.png", PNG_1X1 + bytes(9000)) for i in range(3)]
+    yield "batch over byte cap", *client.upload_files(heavy), 400, "BATCH_TOO_LARGE"
+    yield "list after batch", *client.api_call("GET", f"list.php?folder={FOLDER}&per_page=1"), 200, None
+
+    missing = f"{FOLDER}/{'0' * 32}.png"
+    yield "copy invalid JSON", *client.copy(b"{not json"), 400, "SERVER_ERROR"
+    yield "copy without source", *client.copy({}), 400, "PATH_INVALID"
+    yield "copy missing file", *client.copy({"from": missing, "folder": "copies"}), 404, "FILE_NOT_FOUND"
+    if len(paths) > 1:
+        status, body = client.copy({"from": paths[1], "folder": "copies"})
+        copied = json.loads(body)["path"] if status == 200 else ""
+        yield "copy to folder", status, body, 200, None
+        yield "copy onto existing", *client.copy({"from": paths[1], "folder": "copies"}), 409, "TARGET_EXISTS"
+        yield "copy onto itself", *client.copy({"from": paths[1]}), 400, "PATH_INVALID"
+        yield "copy changing extension", *client.copy({"from": paths[1], "filename": "x.gif"}), 400, "NAME_INVALID"
+        status, body = client.copy({"from": copied, "filename": "renamed.png", "move": True})
+        yield "move with rename", status, body, 200, None
+        items = ["copies/renamed.png", "../.env", {"from": missing, "folder": "bad folder!"}]
+        yield "batch move with bad items", *client.copy({"items": items, "folder": "moved", "move": True}), 200, None
+        yield "list move target", *client.api_call("GET", "list.php?folder=moved"), 200, None
+        yield "list move source", *client.api_call("GET", "list.php?folder=copies"), 200, None
+
+    bulk = paths[:1] + ["../.env", f"{FOLDER}/{'0' * 32}.png"]
+    yield "bulk delete with bad paths", *client.delete({"paths": bulk}), 200, None
+    yield "bulk delete over cap", *client.delete({"paths": ["x.png"] * 1001}), 400, "BATCH_TOO_LARGE"
+    yield "folder delete without folder", *client.delete({"folder": ""}), 400, "FOLDER_INVALID"
+    yield "folder delete invalid cursor", *client.delete({"folder": FOLDER, "cursor": "!!"}), 400, "CURSOR_INVALID"
+    yield "folder delete", *client.delete({"folder": FOLDER}), 200, None
+    yield "list deleted folder", *client.api_call("GET", f"list.php?folder={FOLDER}"), 400, "FOLDER_INVALID"
+
+    token = client.token(types=["png"], max_bytes=4096)
+    yield "token upload", *client.upload("pixel.png", PNG_1X1, "", token), 200, None
+    yield "token upload into its folder", *client.upload("pixel.png", PNG_1X1, "direct", token), 200, None
+    yield "token batch upload", *client.upload_files([("a.png", PNG_1X1), ("b.png", PNG_1X1)], "", token=token), 200, None
+    yield "token upload outside its folder", *client.upload("pixel.png", PNG_1X1, "other", token), 403, "TOKEN_SCOPE"
+    yield "token upload over its size", *client.upload("big.png", PNG_1X1 + bytes(5000), "", token), 400, "FILE_TOO_LARGE"
+    yield "token upload of another type", *client.upload("pixel.png", PNG_1X1, "", client.token(types=["jpg"])), 400, "INVALID_TYPE"
+    yield "expired token", *client.upload("pixel.png", PNG_1X1, "", client.token(ttl=-60)), 403, "TOKEN_EXPIRED"
+    forged = client.token(types=["png"], max_bytes=10 ** 9).split(".")[0] + "." + token.split(".")[1]
+    yield "tampered token", *client.upload("pixel.png", PNG_1X1, "", forged), 403, "TOKEN_INVALID"
+    yield "token of another scope", *client.upload("pixel.png", PNG_1X1, "", client.token(scope="download")), 403, "TOKEN_INVALID"
+    yield "token on list.php", *client.api_call("GET", f"list.php?folder=direct&token={token}", key=""), 403, "INVALID_KEY"
+    yield "list token uploads", *client.api_call("GET", "list.php?folder=direct"), 200, None
+
+    status, body = client.upload("pixel.png", PNG_1X1, "secret", private=True)
+    private_path = json.loads(body)["path"] if status == 200 else ""
+    yield "private upload", status, body, 200, None
+    yield "private token upload", *client.upload("pixel.png", PNG_1X1, "", client.token(folder="secret", private=True)), 200, None
+    yield "private blob is not public", client.call("GET", f"{client.blob}/{private_path}", key="")[0], b"", 404, None
+    yield "list private folder", *client.api_call("GET", "list.php?folder=secret&private=1"), 200, None
+    yield "private folder is not listed publicly", *client.api_call("GET", "list.php?folder=secret"), 400, "FOLDER_INVALID"
+    signed = client.download_token(private_path)
+    status, body, etag = client.download(signed)
+    yield "signed download", status, body, 200, None
+    yield "range download", *client.download(signed, Range="bytes=8-15")[:2], 206, None
+    yield "suffix range download", *client.download(signed, Range="bytes=-4")[:2], 206, None
+    yield "open-ended range download", *client.download(signed, Range="bytes=60-")[:2], 206, None
+    yield "stale If-Range download", *client.download(signed, Range="bytes=0-3", If_Range='"stale"')[:2], 200, None
+    yield "unsatisfiable range", *client.download(signed, Range="bytes=4096-")[:2], 416, "RANGE_INVALID"
+    yield "conditional download", *client.download(signed, If_None_Match=etag or "")[:2], 304, None
+    yield "download with expired token", *client.download(client.download_token(private_path, -60))[:2], 403, "TOKEN_EXPIRED"
+    yield "download with an upload token", *client.download(client.token())[:2], 403, "TOKEN_INVALID"
+    yield "download of a missing file", *client.download(client.download_token(f"secret/{'0' * 32}.png"))[:2], 404, "FILE_NOT_FOUND"
+    yield "download traversal", *client.download(client.download_token("../.env"))[:2], 400, "PATH_INVALID"
+    yield "private delete", *client.delete({"path": private_path}, private=True), 200, None
+    yield "signed download after delete", *client.download(signed)[:2], 404, "FILE_NOT_FOUND"
+
+    yield "changes without key", *client.api_call("GET", "changes.php", key=""), 403, "INVALID_KEY"
+    yield "changes with invalid cursor", *client.api_call("GET", "changes.php?since=abc"), 400, "CURSOR_INVALID"
+    status, body = client.api_call("GET", "changes.php?since=0&limit=5")
+    yield "changes first page", status, body, 200, None
+    since = json.loads(body).get("next_since", 0) if status == 200 else 0
+    status, body = client.api_call("GET", f"changes.php?since={since}&limit=1000")
+    yield "changes remaining pages", status, body, 200, None
+    head = json.loads(body).get("head", 0) if status == 200 else 0
+    yield "changes at head", *client.api_call("GET", f"changes.php?since={head}"), 200, None
+    yield "changes past head", *client.api_call("GET", f"changes.php?since={head + 1}"), 410, "CURSOR_EXPIRED"
+
+
+def php_scenario(client: Client, imaging: bool = False):
+    """Yield scenario steps for the endpoints only the PHP gateway implements; variants are
+    only rendered when the PHP build has GD or Imagick (`imaging`)."""
+    folder = "phponly"
+    yield "chunked init invalid JSON", *client.post_json("upload_init.php", b"{not json"), 400, "SERVER_ERROR"
+    yield "chunked init disallowed extension", *client.post_json("upload_init.php", {"filename": "a.exe", "size": 10}), 400, "INVALID_TYPE"
+    yield "chunked init without size", *client.post_json("upload_init.php", {"filename": "a.png"}), 400, "NO_FILE"
+    status, body = client.post_json("upload_init.php", {"filename": "pixel.png", "size": len(PNG_1X1), "folder": folder})
+    upload_id = json.loads(body).get("upload_id", "") if status == 200 else ""
+    yield "chunked init", status, body, 200, None
+    yield "chunk out of range", *client.chunk(upload_id, 1, PNG_1X1), 400, "CHUNK_INVALID"
+    yield "chunk longer than its range", *client.chunk(upload_id, 0, PNG_1X1 + b"x"), 400, "CHUNK_INVALID"
+    yield "chunked complete with missing chunks", *client.post_json("upload_complete.php", {"upload_id": upload_id}), 409, "UPLOAD_INCOMPLETE"
+    yield "chunk", *client.chunk(upload_id, 0, PNG_1X1), 200, None
+    yield "chunked resume", *client.post_json("upload_init.php", {"upload_id": upload_id}), 200, None
+    status, body = client.post_json("upload_complete.php", {"upload_id": upload_id})
+    stored = json.loads(body).get("path", "") if status == 200 else ""
+    yield "chunked complete", status, body, 200, None
+    yield "chunked complete twice", *client.post_json("upload_complete.php", {"upload_id": upload_id}), 404, "UPLOAD_NOT_FOUND"
+    yield "chunk for an unknown upload", *client.chunk("0" * 32, 0, PNG_1X1), 404, "UPLOAD_NOT_FOUND"
+    status, body = client.post_json("upload_init.php", {"filename": "fake.png", "size": 12, "folder": folder})
+    fake_id = json.loads(body).get("upload_id", "") if status == 200 else ""
+    client.chunk(fake_id, 0, b"not an image")
+    yield "chunked disguised text", *client.post_json("upload_complete.php", {"upload_id": fake_id}), 400, "INVALID_TYPE"
+    status, body = client.call("GET", f"{client.blob}/{stored}", key="")
+    yield "chunked blob download", status, b"match" if body == PNG_1X1 else b"mismatch", 200, None
+
+    yield "stats without key", *client.api_call("GET", f"stats.php?folder={folder}", key=""), 403, "INVALID_KEY"
+    yield "stats invalid folder", *client.api_call("GET", "stats.php?folder=../x"), 400, "FOLDER_INVALID"
+    yield "stats missing folder", *client.api_call("GET", "stats.php?folder=missing"), 400, "FOLDER_INVALID"
+    status, body = client.api_call("GET", f"stats.php?folder={folder}")
+    usage = json.loads(body) if status == 200 else {}
+    yield "stats", status, b"match" if (usage.get("files"), usage.get("bytes")) == (1, len(PNG_1X1)) else body, 200, None
+
+    sha = hashlib.sha256(PNG_1X1).hexdigest()
+    yield "exists without key", *client.api_call("POST", "exists.php", json.dumps({"sha256": sha}).encode(), "application/json", key=""), 403, "INVALID_KEY"
+    yield "exists invalid JSON", *client.post_json("exists.php", b"{not json"), 400, "SERVER_ERROR"
+    yield "exists invalid hash", *client.post_json("exists.php", {"sha256": "xyz"}), 400, "HASH_INVALID"
+    yield "exists unknown content", *client.post_json("exists.php", {"sha256": "0" * 64, "folder": folder, "filename": "pixel.png"}), 200, None
+    yield "exists stored content", *client.post_json("exists.php", {"sha256": sha, "folder": "claimed", "filename": "pixel.png"}), 200, None
+
+    variant = f"{client.api}/variant.php?v="
+    yield "variant with invalid spec", *client.call("GET", f"{variant}nonsense", key=""), 404, "VARIANT_INVALID"
+    yield "variant outside the presets", *client.call("GET", f"{variant}w100q50/{stored}.png", key=""), 404, "VARIANT_NOT_ALLOWED"
+    yield "variant of a missing file", *client.call("GET", f"{variant}w320q75/{folder}/{'0' * 32}.png.png", key=""), 404, "FILE_NOT_FOUND"
+    yield "variant traversal", *client.call("GET", f"{variant}w320q75/%2E%2E/.env.png", key=""), 404, "FILE_NOT_FOUND"
+    if imaging:
+        for step in ("variant render", "variant from cache"):
+            status, body = client.call("GET", f"{variant}w320q75/{stored}.png", key="")
+            yield step, status, b"png" if body.startswith(PNG_1X1[:8]) else body, 200, None
+
+
+def run_tool(root: Path, *args: str) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, *args], cwd=root, capture_output=True, text=True, timeout=120)
+
+
+def read_json(path: Path):
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def write_blob(blob_dir: Path, meta_dir: Path, name: str, blob_path: str, meta: dict = None) -> None:
+    """Store PNG_1X1 as blob_dir/name with a sidecar like upload.php writes; meta overrides its fields."""
+    blob_dir.mkdir(parents=True, exist_ok=True)
+    (blob_dir / name).write_bytes(PNG_1X1)
+    if meta is not None:
+        folder = blob_dir.name
+        sidecar = {"path": f"{folder}/{name}", "url": f"http://127.0.0.1/{blob_path}/{folder}/{name}", "size_bytes": len(PNG_1X1), "mime_type": "image/png", "folder": folder, **meta}
+        meta_dir.mkdir(parents=True, exist_ok=True)
+        (meta_dir / f"{name}.json").write_text(json.dumps(sidecar), encoding="utf-8")
+
+
+def fsck_checks(root: Path, blob_path: str):
+    """Yield (step, ok) for a blob_fsck scan -> apply round trip on a damaged folder."""
+    blob_dir, meta_dir = root / blob_path / "docs", root / "meta" / "docs"
+    kept, bare, stale, orphan, sibling = (f"{secrets.token_hex(16)}.png" for _ in range(5))
+    write_blob(blob_dir, meta_dir, kept, blob_path, {})
+    write_blob(blob_dir, meta_dir, bare, blob_path)
+    write_blob(blob_dir, meta_dir, stale, blob_path, {"size_bytes": 1})
+    index_open(meta_dir, blob_dir).close()
+    (meta_dir / f"{orphan}.json").write_text("{}", encoding="utf-8")
+    (blob_dir / f"{sibling}.gz").write_bytes(b"")
+    (meta_dir / ".usage.json").write_text('{"files":99,"bytes":99,"mime":{}}', encoding="utf-8")
+
+    scan = run_tool(root, "tools/blob_fsck.py", "scan", "--plan", "plan.ndjson", "--workers", "2")
+    yield "fsck scan", scan.returncode == 0
+    plan = [json.loads(line) for line in (root / "plan.ndjson").read_text(encoding="utf-8").splitlines() if line] if scan.returncode == 0 else []
+    actions = {(action["action"], action.get("path", action.get("folder"))) for action in plan}
+    yield "fsck plan", actions == {
+        ("write_meta", f"docs/{bare}"),
+        ("write_meta", f"docs/{stale}"),
+        ("remove_meta", f"docs/{orphan}"),
+        ("remove_sibling", f"docs/{sibling}.gz"),
+        ("reindex", "docs"),
+    }
+    yield "fsck apply", run_tool(root, "tools/blob_fsck.py", "apply", "plan.ndjson").returncode == 0
+    rebuilt = [read_json(meta_dir / f"{name}.json") or {} for name in (bare, stale)]
+    yield "fsck rebuilt sidecars", all(meta.get("size_bytes") == len(PNG_1X1) and meta.get("mime_type") == "image/png" for meta in rebuilt)
+    yield "fsck removed orphans", not (meta_dir / f"{orphan}.json").exists() and not (blob_dir / f"{sibling}.gz").exists()
+    yield "fsck kept healthy files", (blob_dir / kept).is_file() and (read_json(meta_dir / f"{kept}.json") or {}).get("size_bytes") == len(PNG_1X1)
+    yield "fsck reset usage counters", not (meta_dir / ".usage.json").exists()
+    db = sqlite3.connect(str(meta_dir / ".index.sqlite"))
+    states = db.execute("SELECT COUNT(*) FROM state").fetchone()[0]
+    db.close()
+    yield "fsck invalidated the index", states == 0
+    rescan = run_tool(root, "tools/blob_fsck.py", "scan")
+    yield "fsck rescan is clean", rescan.returncode == 0 and rescan.stdout.strip() == ""
+
+
+def migrate_checks(root: Path, blob_path: str):
+    """Yield (step, ok) for migrate_layout moving a flat folder, its dedup record and variants into shards."""
+    sha = hashlib.sha256(PNG_1X1).hexdigest()
+    plain, deduped = f"{secrets.token_hex(16)}.png", f"{sha}.png"
+    for folder in ("pics", "other"):
+        write_blob(root / blob_path / folder, root / "meta" / folder, deduped, blob_path, {"sha256": sha, "ref_count": 2})
+    write_blob(root / blob_path / "pics", root / "meta" / "pics", plain, blob_path, {})
+    index_open(root / "meta" / "pics", root / blob_path / "pics").close()
+    cas_path = root / "meta" / ".cas" / sha[0:2] / f"{sha}.json"
+    cas_path.parent.mkdir(parents=True)
+    cas_path.write_text(json.dumps({"paths": [f"pics/{deduped}", f"other/{deduped}"]}), encoding="utf-8")
+    variant = root / "variants" / "w64q80" / "pics" / f"{plain}.webp"
+    variant.parent.mkdir(parents=True)
+    variant.write_bytes(b"variant")
+
+    migrate = run_tool(root, "tools/migrate_layout.py", "--pause", "0")
+    yield "migrate run", migrate.returncode == 0 and "Done: moved 3 file(s)." in migrate.stdout
+    moved = blob_alternate_path(f"pics/{plain}")
+    yield "migrate moved blobs", (root / blob_path / moved).is_file() and not (root / blob_path / "pics" / plain).exists()
+    meta = read_json(root / "meta" / f"{moved}.json") or {}
+    yield "migrate moved sidecars", (
+        meta.get("path") == moved
+        and str(meta.get("url", "")).endswith(f"/{blob_path}/{moved}")
+        and not (root / "meta" / "pics" / f"{plain}.json").exists()
+    )
+    db = sqlite3.connect(str(root / "meta" / "pics" / ".index.sqlite"))
+    names = {row[0] for row in db.execute("SELECT name FROM files")}
+    db.close()
+    yield "migrate updated the index", names == {moved.partition("/")[2], blob_alternate_path(deduped)}
+    yield "migrate moved variants", (root / "variants" / "w64q80" / f"{moved}.webp").is_file() and not variant.exists()
+    record = read_json(cas_path) or {}
+    yield "migrate updated the dedup record", record.get("paths") == [blob_alternate_path(f"{folder}/{deduped}") for folder in ("pics", "other")]
+    rerun = run_tool(root, "tools/migrate_layout.py", "--pause", "0")
+    yield "migrate rerun moves nothing", rerun.returncode == 0 and "Done: moved 0 file(s)." in rerun.stdout
+
+
+def run_tool_checks(tmp: Path, overrides: dict, serving_profile: str) -> int:
+    blob_path = overrides.get("HALAL_BLOB_PATH", "blob")
+    failures = 0
+    for label, checks in (("fsck", fsck_checks), ("migrate", migrate_checks)):
+        root = tmp / f"tools-{label}"
+        deploy(root, "http://127.0.0.1", secrets.token_hex(32), overrides, serving_profile)
+        for step, ok in checks(root, blob_path):
+            failures += not ok
+            print(f"  [{'ok' if ok else 'FAIL'}] tools: {step}")
+    return failures
+
+
+def normalize(body: bytes, base_url: str) -> str:
+    text = body.decode("utf-8", "replace")
+    text = text.replace(base_url.replace("/", "\\/"), "{base}")
+    text = VOLATILE_FIELDS.sub(lambda m: f'"{m.group(1)}":"*"', text)
+    text = CURSOR_FIELD.sub('"next_cursor":"*"', text)
+    names = {}
+    return RANDOM_NAME.sub(lambda m: names.setdefault(m.group(), f"{{name{len(names) + 1}}}"), text)
+
+
+def error_code(body: bytes):
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        return None
+    error = payload.get("error") if isinstance(payload, dict) else None
+    return error.get("code") if isinstance(error, dict) else None
+
+
+def run_target(label: str, client: Client, steps=None) -> tuple:
+    results, failures = [], 0
+    for step, status, body, expected_status, expected_code in steps or scenario(client):
+        ok = status == expected_status and error_code(body) == expected_code
+        failures += not ok
+        results.append((step, normalize(body, client.base_url)))
+        print(f"  [{'ok' if ok else 'FAIL'}] {label}: {step} -> {status}" + ("" if ok else f" (expected {expected_status} {expected_code or ''}) {body[:200]!r}"))
+    return results, failures
+
+
+def compare(reference: tuple, other: tuple) -> int:
+    mismatches = 0
+    for (step, expected), (_, actual) in zip(reference[1], other[1]):
+        if expected != actual:
+            mismatches += 1
+            print(f"  [DIFF] {step}\n    {reference[0]}: {expected}\n    {other[0]}: {actual}")
+    if len(reference[1]) != len(other[1]):
+        mismatches += 1
+        print(f"  [DIFF] {reference[0]} ran {len(reference[1])} steps, {other[0]} ran {len(other[1])}")
+    return mismatches
+
+
+def run(overrides: dict, serving_profile: str = "standard", base_url: str = None, key: str = None) -> int:
+    blob_path = overrides.get("HALAL_BLOB_PATH", "blob")
+    targets = [("python", start_python)]
+    if shutil.which("php") is not None:
+        targets.insert(0, ("php", start_php))
+    else:
+        print("php CLI not found on PATH; checking the Python gateway only.")
+
+    outcomes, failures = [], 0
+    with tempfile.TemporaryDirectory(prefix="halal-blob-conformance-") as tmp:
+        for label, start in targets:
+            port = free_port()
+            target_url = f"http://127.0.0.1:{port}"
+            target_key = secrets.token_hex(32)
+            root = Path(tmp) / label
+            deploy(root, target_url, target_key, overrides, serving_profile)
+            proc = start(root, port)
+            try:
+                client = Client(target_url, target_key, blob_path)
+                results, failed = run_target(label, client)
+                if label == "php":
+                    imaging = subprocess.run(["php", "-r", "echo (extension_loaded('gd') || class_exists('Imagick')) ? 1 : 0;"], capture_output=True, text=True).stdout == "1"
+                    failed += run_target(label, client, php_scenario(client, imaging))[1]
+            finally:
+                proc.terminate()
+                proc.wait(timeout=10)
+            outcomes.append((label, results))
+            failures += failed
+        failures += run_tool_checks(Path(tmp), overrides, serving_profile)
+    if base_url:
+        print(f"External host {base_url} must be configured with HALAL_BLOB_MAX_MB={MAX_MB} and HALAL_BLOB_BATCH_MAX_MB={BATCH_MAX_MB}.")
+        client = Client(base_url.rstrip("/"), key or os.environ.get("HALAL_BLOB_KEY", ""), blob_path)
+        results, failed = run_target("external", client)
+        failed += run_target("external", client, php_scenario(client))[1]
+        outcomes.append(("external", results))
+        failures += failed
+
+    mismatches = sum(compare(outcomes[0], other) for other in outcomes[1:])
+    print(f"{failures} failed expectation(s), {mismatches} cross-target difference(s) across {', '.join(label for label, _ in outcomes)}.")
+    return 1 if failures or mismatches else 0
@@ -1,268 +1,1983 @@
 from pathlib import Path
+import hashlib
 
-def upload_php_content() -> str:
-    return r"""<?php
+def _layout_php_helpers() -> str:
+    return r"""
+function shard_prefix($filename) {
+    return substr($filename, 0, 2) . '/' . substr($filename, 2, 2);
+}
+
+function split_blob_path($relativePath) {
+    if (preg_match('#^(?:(.*)/)?([0-9a-f]{2})/([0-9a-f]{2})/(\2\3[^/]*)$#', $relativePath, $m)) {
+        return [$m[1], $m[2] . '/' . $m[3] . '/' . $m[4]];
+    }
+    $folder = dirname($relativePath);
+    return [$folder === '.' ? '' : $folder, basename($relativePath)];
+}
+
+function blob_alternate_path($relativePath) {
+    list($folder, $name) = split_blob_path($relativePath);
+    $base = basename($name);
+    if (!preg_match('/^[0-9a-f]{4}/', $base)) { return null; }
+    $alt = strpos($name, '/') !== false ? $base : (shard_prefix($base) . '/' . $base);
+    return ($folder ? ($folder . '/') : '') . $alt;
+}
+
+function blob_scan($blobDir) {
+    $names = [];
+    $handle = is_dir($blobDir) ? opendir($blobDir) : false;
+    while ($handle && ($name = readdir($handle)) !== false) {
+        if ($name === '' || $name[0] === '.') { continue; }
+        $full = $blobDir . '/' . $name;
+        if (is_file($full)) {
+            if (!preg_match('/\.(br|gz)$/', $name)) { $names[] = $name; }
+            continue;
+        }
+        if (!preg_match('/^[0-9a-f]{2}$/', $name) || !is_dir($full)) { continue; }
+        foreach (scandir($full) as $sub) {
+            if (!preg_match('/^[0-9a-f]{2}$/', $sub) || !is_dir($full . '/' . $sub)) { continue; }
+            foreach (scandir($full . '/' . $sub) as $file) {
+                if (strpos($file, $name . $sub) === 0 && !preg_match('/\.(br|gz)$/', $file) && is_file($full . '/' . $sub . '/' . $file)) {
+                    $names[] = $name . '/' . $sub . '/' . $file;
+                }
+            }
+        }
+    }
+    if ($handle) { closedir($handle); }
+    return $names;
+}
+
+function is_shard_dir($dir) {
+    if (!preg_match('/^[0-9a-f]{2}$/', basename($dir))) { return false; }
+    foreach ((array)@scandir($dir) as $sub) {
+        if ($sub !== '.' && $sub !== '..' && (!preg_match('/^[0-9a-f]{2}$/', $sub) || !is_dir($dir . '/' . $sub))) { return false; }
+    }
+    return true;
+}
+
+function blob_subfolders($blobDir, $folder, $metaDir = null) {
+    $stamp = @filemtime($blobDir);
+    $cachePath = $metaDir !== null ? ($metaDir . '/.folders.json') : null;
+    $names = null;
+    if ($cachePath !== null && $stamp !== false) {
+        $cached = json_decode((string)@file_get_contents($cachePath), true);
+        if (is_array($cached) && isset($cached['mtime'], $cached['names']) && $cached['mtime'] === $stamp && is_array($cached['names'])) {
+            $names = $cached['names'];
+        }
+    }
+    if ($names === null) {
+        $names = [];
+        foreach ((array)@scandir($blobDir) as $name) {
+            if (strpos($name, '.') !== false || !preg_match('/^[A-Za-z0-9_\-]+$/', $name)) { continue; }
+            $full = $blobDir . '/' . $name;
+            if (is_dir($full) && !is_shard_dir($full)) { $names[] = $name; }
+        }
+        if ($cachePath !== null && $stamp !== false && $stamp < time() && is_dir($metaDir)) {
+            $tmp = $cachePath . '.' . getmypid() . '.tmp';
+            if (@file_put_contents($tmp, json_encode(['mtime' => $stamp, 'names' => $names])) !== false) { @rename($tmp, $cachePath); }
+        }
+    }
+    $folders = [];
+    foreach ($names as $name) { $folders[] = ($folder ? ($folder . '/') : '') . $name; }
+    return $folders;
+}
+"""
+
+def _index_php_helpers() -> str:
+    return r"""
+function index_open($metaDir, $blobDir, $create = true) {
+    if (!class_exists('PDO') || !in_array('sqlite', PDO::getAvailableDrivers(), true)) { return null; }
+    $dbPath = $metaDir . '/.index.sqlite';
+    if (!is_file($dbPath)) {
+        if (!$create) { return null; }
+        if (!is_dir($metaDir) && !@mkdir($metaDir, 0755, true)) { return null; }
+    }
+    try {
+        $db = new PDO('sqlite:' . $dbPath);
+        $db->setAttribute(PDO::ATTR_ERRMODE, PDO::ERRMODE_EXCEPTION);
+        $db->exec('PRAGMA busy_timeout = 5000');
+        $db->exec('CREATE TABLE IF NOT EXISTS files (name TEXT PRIMARY KEY, meta TEXT) WITHOUT ROWID');
+        $db->exec('CREATE TABLE IF NOT EXISTS state (id INTEGER PRIMARY KEY CHECK (id = 1), total INTEGER NOT NULL)');
+        if ($db->query('SELECT total FROM state WHERE id = 1')->fetchColumn() === false) {
+            index_rebuild($db, $metaDir, $blobDir);
+        }
+        return $db;
+    } catch (Exception $e) {
+        return null;
+    }
+}
+
+function index_rebuild($db, $metaDir, $blobDir) {
+    $db->exec('BEGIN IMMEDIATE');
+    if ($db->query('SELECT total FROM state WHERE id = 1')->fetchColumn() !== false) {
+        $db->exec('COMMIT');
+        return;
+    }
+    $db->exec('DELETE FROM files');
+    $insert = $db->prepare('INSERT INTO files (name, meta) VALUES (?, ?)');
+    $total = 0;
+    foreach (blob_scan($blobDir) as $name) {
+        $meta = null;
+        $raw = @file_get_contents($metaDir . '/' . $name . '.json');
+        if ($raw !== false) {
+            $dec = json_decode($raw, true);
+            if (is_array($dec)) { $meta = $dec; }
+        }
+        $insert->execute([$name, $meta === null ? null : json_encode($meta)]);
+        $total++;
+    }
+    $db->prepare('INSERT INTO state (id, total) VALUES (1, ?)')->execute([$total]);
+    $db->exec('COMMIT');
+}
+
+function index_invalidate($db) {
+    try {
+        if ($db->inTransaction()) { $db->rollBack(); }
+        $db->exec('DELETE FROM state');
+    } catch (Exception $e) {
+    }
+}
+
+function index_put($db, $name, $meta) {
+    try {
+        $db->exec('BEGIN IMMEDIATE');
+        $json = $meta === null ? null : json_encode($meta);
+        $insert = $db->prepare('INSERT OR IGNORE INTO files (name, meta) VALUES (?, ?)');
+        $insert->execute([$name, $json]);
+        if ($insert->rowCount() > 0) {
+            $db->exec('UPDATE state SET total = total + 1 WHERE id = 1');
+        } else {
+            $db->prepare('UPDATE files SET meta = ? WHERE name = ?')->execute([$json, $name]);
+        }
+        $db->exec('COMMIT');
+    } catch (Exception $e) {
+        index_invalidate($db);
+    }
+}
+
+function index_remove($db, $name) {
+    try {
+        $db->exec('BEGIN IMMEDIATE');
+        $delete = $db->prepare('DELETE FROM files WHERE name = ?');
+        $delete->execute([$name]);
+        if ($delete->rowCount() > 0) {
+            $db->exec('UPDATE state SET total = total - 1 WHERE id = 1');
+        }
+        $db->exec('COMMIT');
+    } catch (Exception $e) {
+        index_invalidate($db);
+    }
+}
+"""
+
+def _cas_php_helpers() -> str:
+    return r"""
+function cas_lock($root, $sha) {
+    if (!preg_match('/^[0-9a-f]{64}$/', $sha)) { return null; }
+    $dir = $root . '/meta/.cas/' . substr($sha, 0, 2);
+    if (!is_dir($dir) && !@mkdir($dir, 0755, true)) { return null; }
+    $fh = @fopen($dir . '/' . $sha . '.json', 'c+');
+    if ($fh === false) { return null; }
+    if (!flock($fh, LOCK_EX)) {
+        fclose($fh);
+        return null;
+    }
+    $raw = stream_get_contents($fh);
+    $record = $raw ? json_decode($raw, true) : null;
+    if (!is_array($record) || !isset($record['paths']) || !is_array($record['paths'])) {
+        $record = ['sha256' => $sha, 'paths' => []];
+    }
+    return ['fh' => $fh, 'record' => $record];
+}
+
+function cas_release($lock, $record) {
+    $fh = $lock['fh'];
+    ftruncate($fh, 0);
+    rewind($fh);
+    if (!empty($record['paths'])) { fwrite($fh, json_encode($record)); }
+    fflush($fh);
+    flock($fh, LOCK_UN);
+    fclose($fh);
+}
+
+function cas_source($blobRoot, $record) {
+    foreach ($record['paths'] as $path) {
+        if (is_file($blobRoot . '/' . $path)) { return $path; }
+        $alt = blob_alternate_path($path);
+        if ($alt !== null && is_file($blobRoot . '/' . $alt)) { return $alt; }
+    }
+    return null;
+}
+"""
+
+def _usage_php_helpers() -> str:
+    return r"""
+function quota_for($cfg, $folder) {
+    if (isset($cfg['quotas'][$folder])) { return $cfg['quotas'][$folder]; }
+    return isset($cfg['quotas']['*']) ? $cfg['quotas']['*'] : null;
+}
+
+function usage_seed($cfg, $root, $folder) {
+    $suffix = $folder ? ('/' . $folder) : '';
+    $blobDir = $root . '/' . $cfg['blobPath'] . $suffix;
+    $usage = ['files' => 0, 'bytes' => 0, 'mime' => []];
+    foreach (blob_scan($blobDir) as $name) {
+        $raw = @file_get_contents($root . '/meta' . $suffix . '/' . $name . '.json');
+        $meta = $raw === false ? null : json_decode($raw, true);
+        $size = is_array($meta) && isset($meta['size_bytes']) ? (int)$meta['size_bytes'] : (int)@filesize($blobDir . '/' . $name);
+        $mime = is_array($meta) && isset($meta['mime_type']) ? (string)$meta['mime_type'] : 'application/octet-stream';
+        $usage = usage_add($usage, 1, $size, $mime);
+    }
+    return $usage;
+}
+
+function usage_add($usage, $files, $bytes, $mime) {
+    $usage['files'] = max(0, $usage['files'] + $files);
+    $usage['bytes'] = max(0, $usage['bytes'] + $bytes);
+    if ($mime !== null && ($files !== 0 || $bytes !== 0)) {
+        $entry = isset($usage['mime'][$mime]) ? $usage['mime'][$mime] : ['files' => 0, 'bytes' => 0];
+        $entry = ['files' => max(0, $entry['files'] + $files), 'bytes' => max(0, $entry['bytes'] + $bytes)];
+        if ($entry['files'] === 0) { unset($usage['mime'][$mime]); } else { $usage['mime'][$mime] = $entry; }
+    }
+    return $usage;
+}
+
+function usage_update($cfg, $root, $folder, $files, $bytes, $mime, $enforceQuota = false) {
+    $dir = $root . '/meta' . ($folder ? ('/' . $folder) : '');
+    if (!ensure_dir($dir)) { return null; }
+    $fh = @fopen($dir . '/.usage.json', 'c+');
+    if ($fh === false) { return null; }
+    if (!flock($fh, LOCK_EX)) {
+        fclose($fh);
+        return null;
+    }
+    $raw = stream_get_contents($fh);
+    $usage = $raw ? json_decode($raw, true) : null;
+    $seeded = false;
+    if (!is_array($usage) || !isset($usage['files'], $usage['bytes'], $usage['mime'])) {
+        $usage = usage_seed($cfg, $root, $folder);
+        $seeded = true;
+    }
+    $quota = quota_for($cfg, $folder);
+    $exceeded = $enforceQuota && $quota !== null && $bytes > 0 && $usage['bytes'] + $bytes > $quota;
+    if (!$exceeded) { $usage = usage_add($usage, $files, $bytes, $mime); }
+    if ($seeded || (!$exceeded && ($files !== 0 || $bytes !== 0))) {
+        ftruncate($fh, 0);
+        rewind($fh);
+        fwrite($fh, json_encode($usage));
+        fflush($fh);
+    }
+    flock($fh, LOCK_UN);
+    fclose($fh);
+    return $exceeded ? false : $usage;
+}
+
+function quota_error() {
+    return [413, ['success' => false, 'error' => ['code' => 'QUOTA_EXCEEDED', 'message' => 'Folder storage quota exceeded']]];
+}
+"""
+
+def _journal_php_helpers() -> str:
+    return r"""
+function journal_dir() {
+    return dirname(__DIR__, 2) . '/meta/.journal';
+}
+
+function journal_segments($dir) {
+    $segments = [];
+    foreach (@scandir($dir) ?: [] as $name) {
+        if (preg_match('/^(\d{12})\.ndjson$/', $name, $m)) { $segments[] = (int)$m[1]; }
+    }
+    sort($segments);
+    return $segments;
+}
+
+function journal_segment_path($dir, $start) {
+    return $dir . '/' . sprintf('%012d', $start) . '.ndjson';
+}
+
+function journal_last_seq($dir, $segments) {
+    if (!$segments) { return 0; }
+    $start = end($segments);
+    $seq = $start - 1;
+    $fh = @fopen(journal_segment_path($dir, $start), 'rb');
+    if ($fh === false) { return $seq; }
+    while (($line = fgets($fh)) !== false) {
+        $event = json_decode($line, true);
+        if (is_array($event) && isset($event['seq']) && is_int($event['seq'])) { $seq = max($seq, $event['seq']); }
+    }
+    fclose($fh);
+    return $seq;
+}
+
+function journal_head($dir) {
+    $fh = @fopen($dir . '/.head', 'rb');
+    if ($fh === false) { return journal_last_seq($dir, journal_segments($dir)); }
+    flock($fh, LOCK_SH);
+    $raw = trim(stream_get_contents($fh));
+    flock($fh, LOCK_UN);
+    fclose($fh);
+    return ctype_digit($raw) ? (int)$raw : journal_last_seq($dir, journal_segments($dir));
+}
+
+function journal_event($cfg, $op, $relativePath, $meta = null) {
+    $event = ['op' => $op, 'path' => $relativePath, 'url' => blob_url($cfg, $relativePath)];
+    if (is_array($meta)) {
+        foreach (['size_bytes', 'mime_type', 'sha256'] as $field) {
+            if (isset($meta[$field])) { $event[$field] = $meta[$field]; }
+        }
+    }
+    if (!empty($cfg['private'])) { $event['private'] = true; }
+    return $event;
+}
+
+function journal_compact($cfg, $dir, $segments) {
+    $closed = end($segments);
+    $lines = @file(journal_segment_path($dir, $closed));
+    if (is_array($lines)) {
+        $latest = [];
+        foreach ($lines as $i => $line) {
+            $event = json_decode($line, true);
+            if (is_array($event) && isset($event['path'])) { $latest[$event['path']] = $i; }
+        }
+        $keep = array_values($latest);
+        sort($keep);
+        $kept = '';
+        foreach ($keep as $i) { $kept .= $lines[$i]; }
+        $path = journal_segment_path($dir, $closed);
+        $tmp = $path . '.tmp';
+        if (@file_put_contents($tmp, $kept) === false || !@touch($tmp, (int)@filemtime($path)) || !@rename($tmp, $path)) { @unlink($tmp); }
+    }
+    if ($cfg['journalRetainDays'] <= 0) { return; }
+    $cutoff = time() - $cfg['journalRetainDays'] * 86400;
+    foreach ($segments as $start) {
+        if (@filemtime(journal_segment_path($dir, $start)) >= $cutoff) { break; }
+        @unlink(journal_segment_path($dir, $start));
+    }
+}
+
+function journal_append($cfg, $events) {
+    if (!$cfg['journal'] || !$events) { return; }
+    $dir = journal_dir();
+    if (!is_dir($dir)) {
+        if (!@mkdir($dir, 0755, true) && !is_dir($dir)) { return; }
+        @file_put_contents($dir . '/.htaccess', "Require all denied\n");
+    }
+    $fh = @fopen($dir . '/.head', 'c+');
+    if ($fh === false) { return; }
+    if (!flock($fh, LOCK_EX)) {
+        fclose($fh);
+        return;
+    }
+    $raw = trim(stream_get_contents($fh));
+    $segments = journal_segments($dir);
+    $seq = ctype_digit($raw) ? (int)$raw : journal_last_seq($dir, $segments);
+    $start = $segments ? end($segments) : $seq + 1;
+    if ($segments && @filesize(journal_segment_path($dir, $start)) >= $cfg['journalSegmentBytes']) {
+        journal_compact($cfg, $dir, $segments);
+        $start = $seq + 1;
+    }
+    $stamp = gmdate('c');
+    $lines = '';
+    foreach ($events as $event) { $lines .= json_encode(['seq' => ++$seq, 'ts' => $stamp] + $event) . "\n"; }
+    if (@file_put_contents(journal_segment_path($dir, $start), $lines, FILE_APPEND) !== false) {
+        ftruncate($fh, 0);
+        rewind($fh);
+        fwrite($fh, (string)$seq);
+        fflush($fh);
+    }
+    flock($fh, LOCK_UN);
+    fclose($fh);
+    timing_mark('journal');
+}
+"""
+
+def _chunked_php_helpers() -> str:
+    return r"""
+function uploads_root($root) {
+    $dir = $root . '/meta/.uploads';
+    if (!is_dir($dir)) {
+        @mkdir($dir, 0755, true);
+        @file_put_contents($dir . '/.htaccess', "Require all denied\n");
+    }
+    return $dir;
+}
+
+function load_upload_state($root, $uploadId) {
+    if (!is_string($uploadId) || !preg_match('/^[0-9a-f]{32}$/', $uploadId)) { return null; }
+    $dir = uploads_root($root) . '/' . $uploadId;
+    $raw = @file_get_contents($dir . '/state.json');
+    $state = $raw === false ? null : json_decode($raw, true);
+    if (!is_array($state)) { return null; }
+    $state['dir'] = $dir;
+    return $state;
+}
+
+function received_chunks($state) {
+    $received = [];
+    for ($i = 0; $i < $state['chunks']; $i++) {
+        if (is_file($state['dir'] . '/' . $i . '.ok')) { $received[] = $i; }
+    }
+    return $received;
+}
+
+function chunk_length($state, $index) {
+    $start = $index * $state['chunk_size'];
+    return min($state['chunk_size'], $state['size'] - $start);
+}
+
+function ini_bytes($value) {
+    $value = trim((string)$value);
+    if ($value === '') { return 0; }
+    $unit = strtolower(substr($value, -1));
+    $number = (float)$value;
+    if ($unit === 'g') { $number *= 1024 * 1024 * 1024; }
+    elseif ($unit === 'm') { $number *= 1024 * 1024; }
+    elseif ($unit === 'k') { $number *= 1024; }
+    return (int)$number;
+}
+
+function remove_upload_dir($dir) {
+    foreach (glob($dir . '/*') ?: [] as $file) { @unlink($file); }
+    @rmdir($dir);
+}
+
+function purge_stale_uploads($root, $maxAge) {
+    $base = uploads_root($root);
+    foreach (glob($base . '/*', GLOB_ONLYDIR) ?: [] as $dir) {
+        $stamp = @filemtime($dir);
+        if ($stamp !== false && $stamp < time() - $maxAge) { remove_upload_dir($dir); }
+    }
+}
+
+function upload_status_payload($state) {
+    $received = received_chunks($state);
+    $offset = 0;
+    foreach ($received as $i) {
+        if ($i * $state['chunk_size'] !== $offset) { break; }
+        $offset += chunk_length($state, $i);
+    }
+    return [
+        'success' => true,
+        'upload_id' => $state['id'],
+        'size' => $state['size'],
+        'chunk_size' => $state['chunk_size'],
+        'chunks' => $state['chunks'],
+        'received' => $received,
+        'offset' => $offset,
+    ];
+}
+"""
+
+def bootstrap_php_content() -> str:
+    php = r"""<?php
 header('Content-Type: application/json');
 
 $root = dirname(__DIR__, 2);
 $envPath = $root . '/.env';
+$GLOBALS['halal_timing'] = [
+    'start' => isset($_SERVER['REQUEST_TIME_FLOAT']) ? (float)$_SERVER['REQUEST_TIME_FLOAT'] : microtime(true),
+    'last' => microtime(true),
+    'phases' => [],
+    'header' => true,
+    'log' => false,
+    'root' => $root,
+];
 
 function respond_json($statusCode, $payload) {
+    $body = json_encode($payload);
+    timing_mark('encode');
+    respond_body($statusCode, $body);
+}
+
+function respond_body($statusCode, $body) {
     http_response_code($statusCode);
     header('Content-Type: application/json');
-    echo json_encode($payload);
+    timing_header();
+    echo $body;
+    if (function_exists('fastcgi_finish_request')) { fastcgi_finish_request(); }
+    timing_log($statusCode, strlen($body));
+    exit;
+}
+
+function respond_not_modified() {
+    http_response_code(304);
+    timing_header();
+    timing_log(304, 0);
     exit;
 }
 
+function etag_matches($header, $etag) {
+    if (trim($header) === '*') { return true; }
+    foreach (explode(',', $header) as $candidate) {
+        if (preg_replace('/^W\//', '', trim($candidate)) === $etag) { return true; }
+    }
+    return false;
+}
+
+function timing_mark($phase) {
+    $now = microtime(true);
+    $timing = &$GLOBALS['halal_timing'];
+    $previous = isset($timing['phases'][$phase]) ? $timing['phases'][$phase] : 0;
+    $timing['phases'][$phase] = $previous + ($now - $timing['last']) * 1000;
+    $timing['last'] = $now;
+}
+
+function timing_configure($cfg) {
+    $GLOBALS['halal_timing']['header'] = $cfg['serverTiming'];
+    $GLOBALS['halal_timing']['log'] = $cfg['accessLog'];
+    timing_mark('config');
+    return $cfg;
+}
+
+function timing_header() {
+    $timing = $GLOBALS['halal_timing'];
+    if (!$timing['header'] || headers_sent()) { return; }
+    $parts = [];
+    foreach ($timing['phases'] as $phase => $ms) { $parts[] = $phase . ';dur=' . round($ms, 2); }
+    $parts[] = 'total;dur=' . round((microtime(true) - $timing['start']) * 1000, 2);
+    header('Server-Timing: ' . implode(', ', $parts));
+}
+
+function timing_log($statusCode, $bytesOut) {
+    $timing = $GLOBALS['halal_timing'];
+    if (!$timing['log']) { return; }
+    $dir = $timing['root'] . '/meta/.logs';
+    if (!is_dir($dir)) {
+        if (!@mkdir($dir, 0755, true)) { return; }
+        @file_put_contents($dir . '/.htaccess', "Require all denied\n");
+    }
+    $entry = [
+        'ts' => gmdate('c'),
+        'endpoint' => basename($_SERVER['SCRIPT_NAME'], '.php'),
+        'method' => isset($_SERVER['REQUEST_METHOD']) ? $_SERVER['REQUEST_METHOD'] : '',
+        'status' => $statusCode,
+        'total_ms' => round((microtime(true) - $timing['start']) * 1000, 3),
+        'phases' => (object)array_map(function($ms) { return round($ms, 3); }, $timing['phases']),
+        'bytes_in' => isset($_SERVER['CONTENT_LENGTH']) ? (int)$_SERVER['CONTENT_LENGTH'] : 0,
+        'bytes_out' => $bytesOut,
+    ];
+    @file_put_contents($dir . '/access-' . gmdate('Ymd') . '.ndjson', json_encode($entry) . "\n", FILE_APPEND | LOCK_EX);
+}
+
 function load_config($envPath) {
+    $cachePath = __DIR__ . '/_config.cache.php';
+    $envStamp = @filemtime($envPath) . ':' . @filesize($envPath) . ':' . @hash_file('crc32b', $envPath) . ':__BOOTSTRAP_HASH__';
+    $cached = is_file($cachePath) ? (@include $cachePath) : null;
+    if (is_array($cached) && isset($cached['envStamp']) && $cached['envStamp'] === $envStamp) {
+        return timing_configure($cached);
+    }
+    $cfg = compile_config($envPath);
+    $cfg['envStamp'] = $envStamp;
+    $tmp = $cachePath . '.' . getmypid() . '.tmp';
+    if (@file_put_contents($tmp, "<?php\nreturn " . var_export($cfg, true) . ";\n") !== false && @chmod($tmp, 0640) && @rename($tmp, $cachePath)) {
+        if (function_exists('opcache_invalidate')) { @opcache_invalidate($cachePath, true); }
+    } else {
+        @unlink($tmp);
+    }
+    return timing_configure($cfg);
+}
+
+function compile_config($envPath) {
     $defaultMaxMB = 5;
+    $defaultChunkedMaxMB = 512;
+    $defaultChunkMB = 5;
+    $defaultBatchMaxMB = 20;
+    $defaultBatchMaxFiles = 20;
+    $defaultDeleteBudgetMs = 5000;
     $defaultExts = 'jpg,jpeg,png,webp,gif';
     $defaultPath = 'blob';
+    $defaultPresets = '320x75,640x80,1280x80';
+    $defaultPrivatePath = 'private';
+    $defaultJournalSegmentKB = 1024;
+    $defaultJournalRetainDays = 30;
+    $defaultListCacheSeconds = 30;
     $env = @parse_ini_file($envPath);
     $key = ($env && isset($env['HALAL_BLOB_KEY'])) ? trim($env['HALAL_BLOB_KEY']) : '';
     $baseUrl = ($env && isset($env['HALAL_BLOB_BASE_URL'])) ? rtrim(trim($env['HALAL_BLOB_BASE_URL']), '/') : '';
     $maxMB = ($env && isset($env['HALAL_BLOB_MAX_MB']) && is_numeric($env['HALAL_BLOB_MAX_MB'])) ? (float)$env['HALAL_BLOB_MAX_MB'] : $defaultMaxMB;
     $maxBytes = (int)round($maxMB * 1024 * 1024);
+    $chunkedMaxMB = ($env && isset($env['HALAL_BLOB_CHUNKED_MAX_MB']) && is_numeric($env['HALAL_BLOB_CHUNKED_MAX_MB'])) ? (float)$env['HALAL_BLOB_CHUNKED_MAX_MB'] : $defaultChunkedMaxMB;
+    $chunkedMaxBytes = (int)round($chunkedMaxMB * 1024 * 1024);
+    $chunkMB = ($env && isset($env['HALAL_BLOB_CHUNK_MB']) && is_numeric($env['HALAL_BLOB_CHUNK_MB'])) ? (float)$env['HALAL_BLOB_CHUNK_MB'] : $defaultChunkMB;
+    $chunkBytes = (int)round($chunkMB * 1024 * 1024);
     $allowedExt = ($env && isset($env['HALAL_BLOB_ALLOWED_EXT']) && is_string($env['HALAL_BLOB_ALLOWED_EXT']) && strlen($env['HALAL_BLOB_ALLOWED_EXT']) > 0) ? $env['HALAL_BLOB_ALLOWED_EXT'] : $defaultExts;
     $allowedExts = array_map('strtolower', array_filter(array_map('trim', explode(',', $allowedExt))));
     
     $blobPath = ($env && isset($env['HALAL_BLOB_PATH'])) ? trim($env['HALAL_BLOB_PATH'], " \t\n\r\0\x0B/") : $defaultPath;
     if ($blobPath === '' || !preg_match('/^[A-Za-z0-9_\-]+$/', $blobPath)) { $blobPath = $defaultPath; }
+    $layout = ($env && isset($env['HALAL_BLOB_LAYOUT']) && strtolower(trim($env['HALAL_BLOB_LAYOUT'])) === 'sharded') ? 'sharded' : 'flat';
+    $dedup = ($env && isset($env['HALAL_BLOB_DEDUP'])) ? filter_var($env['HALAL_BLOB_DEDUP'], FILTER_VALIDATE_BOOLEAN) : false;
+    $presets = ($env && isset($env['HALAL_BLOB_VARIANT_PRESETS']) && is_string($env['HALAL_BLOB_VARIANT_PRESETS'])) ? $env['HALAL_BLOB_VARIANT_PRESETS'] : $defaultPresets;
+    $precompress = ($env && isset($env['HALAL_BLOB_PRECOMPRESS'])) ? filter_var($env['HALAL_BLOB_PRECOMPRESS'], FILTER_VALIDATE_BOOLEAN) : false;
+    $serverTiming = ($env && isset($env['HALAL_BLOB_SERVER_TIMING'])) ? filter_var($env['HALAL_BLOB_SERVER_TIMING'], FILTER_VALIDATE_BOOLEAN) : true;
+    $accessLog = ($env && isset($env['HALAL_BLOB_ACCESS_LOG'])) ? filter_var($env['HALAL_BLOB_ACCESS_LOG'], FILTER_VALIDATE_BOOLEAN) : false;
+    $batchMaxMB = ($env && isset($env['HALAL_BLOB_BATCH_MAX_MB']) && is_numeric($env['HALAL_BLOB_BATCH_MAX_MB'])) ? (float)$env['HALAL_BLOB_BATCH_MAX_MB'] : $defaultBatchMaxMB;
+    $batchMaxBytes = (int)round($batchMaxMB * 1024 * 1024);
+    $batchMaxFiles = ($env && isset($env['HALAL_BLOB_BATCH_MAX_FILES']) && is_numeric($env['HALAL_BLOB_BATCH_MAX_FILES'])) ? max(1, (int)$env['HALAL_BLOB_BATCH_MAX_FILES']) : $defaultBatchMaxFiles;
+    $corsOrigins = ($env && isset($env['HALAL_BLOB_CORS_ORIGINS']) && is_string($env['HALAL_BLOB_CORS_ORIGINS'])) ? array_values(array_filter(array_map(function($o) { return rtrim(trim($o), '/'); }, explode(',', $env['HALAL_BLOB_CORS_ORIGINS'])))) : [];
+    $deleteBudgetMs = ($env && isset($env['HALAL_BLOB_DELETE_BUDGET_MS']) && is_numeric($env['HALAL_BLOB_DELETE_BUDGET_MS'])) ? max(100, (int)$env['HALAL_BLOB_DELETE_BUDGET_MS']) : $defaultDeleteBudgetMs;
+    $privatePath = ($env && isset($env['HALAL_BLOB_PRIVATE_PATH']) && is_string($env['HALAL_BLOB_PRIVATE_PATH'])) ? rtrim(trim($env['HALAL_BLOB_PRIVATE_PATH']), '/') : $defaultPrivatePath;
+    if ($privatePath === '' || ($privatePath[0] !== '/' && (!preg_match('/^[A-Za-z0-9_\-]+$/', $privatePath) || in_array($privatePath, [$blobPath, 'api', 'meta', 'variants', 'tools'], true)))) { $privatePath = $defaultPrivatePath; }
+    $sendfile = ($env && isset($env['HALAL_BLOB_SENDFILE'])) ? strtolower(trim($env['HALAL_BLOB_SENDFILE'])) : 'auto';
+    if (!in_array($sendfile, ['auto', 'apache', 'nginx', 'off'], true)) { $sendfile = 'auto'; }
+    $accelPrefix = ($env && isset($env['HALAL_BLOB_ACCEL_PREFIX']) && trim($env['HALAL_BLOB_ACCEL_PREFIX']) !== '') ? '/' . trim(trim($env['HALAL_BLOB_ACCEL_PREFIX']), '/') : '/_halal_private';
+    $journal = ($env && isset($env['HALAL_BLOB_JOURNAL'])) ? filter_var($env['HALAL_BLOB_JOURNAL'], FILTER_VALIDATE_BOOLEAN) : true;
+    $journalSegmentKB = ($env && isset($env['HALAL_BLOB_JOURNAL_SEGMENT_KB']) && is_numeric($env['HALAL_BLOB_JOURNAL_SEGMENT_KB'])) ? max(1, (int)$env['HALAL_BLOB_JOURNAL_SEGMENT_KB']) : $defaultJournalSegmentKB;
+    $journalRetainDays = ($env && isset($env['HALAL_BLOB_JOURNAL_RETAIN_DAYS']) && is_numeric($env['HALAL_BLOB_JOURNAL_RETAIN_DAYS'])) ? max(0, (float)$env['HALAL_BLOB_JOURNAL_RETAIN_DAYS']) : $defaultJournalRetainDays;
+    $listCacheSeconds = ($env && isset($env['HALAL_BLOB_LIST_CACHE_SECONDS']) && is_numeric($env['HALAL_BLOB_LIST_CACHE_SECONDS'])) ? max(0, (int)$env['HALAL_BLOB_LIST_CACHE_SECONDS']) : $defaultListCacheSeconds;
+    $variantPresets = array_values(array_filter(array_map('trim', explode(',', strtolower($presets))), function($p) { return preg_match('/^\d{1,4}x\d{1,3}$/', $p); }));
+    $quotas = [];
+    $quotaSpec = ($env && isset($env['HALAL_BLOB_QUOTAS']) && is_string($env['HALAL_BLOB_QUOTAS'])) ? $env['HALAL_BLOB_QUOTAS'] : '';
+    foreach (array_filter(array_map('trim', explode(',', $quotaSpec))) as $entry) {
+        $parts = array_map('trim', explode('=', $entry, 2));
+        if (count($parts) !== 2 || !is_numeric($parts[1])) { continue; }
+        $quotaFolder = $parts[0] === '*' ? '*' : clean_folder($parts[0]);
+        if ($quotaFolder !== null) { $quotas[$quotaFolder] = (int)round((float)$parts[1] * 1024 * 1024); }
+    }
     
     return [
         'key' => $key, 
         'baseUrl' => $baseUrl, 
         'maxBytes' => $maxBytes, 
+        'chunkedMaxBytes' => $chunkedMaxBytes,
+        'chunkBytes' => $chunkBytes,
         'allowedExts' => $allowedExts,
-        'blobPath' => $blobPath
+        'blobPath' => $blobPath,
+        'layout' => $layout,
+        'dedup' => $dedup,
+        'variantPresets' => $variantPresets,
+        'precompress' => $precompress,
+        'quotas' => $quotas,
+        'serverTiming' => $serverTiming,
+        'accessLog' => $accessLog,
+        'batchMaxBytes' => $batchMaxBytes,
+        'batchMaxFiles' => $batchMaxFiles,
+        'deleteBudgetMs' => $deleteBudgetMs,
+        'corsOrigins' => $corsOrigins,
+        'privatePath' => $privatePath,
+        'sendfile' => $sendfile,
+        'accelPrefix' => $accelPrefix,
+        'journal' => $journal,
+        'journalSegmentBytes' => $journalSegmentKB * 1024,
+        'journalRetainDays' => $journalRetainDays,
+        'listCacheSeconds' => $listCacheSeconds
     ];
 }
 
-function require_auth($expectedKey) {
-    $headerKey = isset($_SERVER['HTTP_X_HALAL_BLOB_KEY']) ? trim($_SERVER['HTTP_X_HALAL_BLOB_KEY']) : '';
-    $getKey = isset($_GET['key']) ? $_GET['key'] : '';
-    $key = $headerKey !== '' ? $headerKey : $getKey;
-    if ($expectedKey === '' || $key === '' || $key !== $expectedKey) {
-        respond_json(403, ['success' => false, 'error' => ['code' => 'INVALID_KEY', 'message' => 'Forbidden']]);
+function request_key() {
+    $headerKey = isset($_SERVER['HTTP_X_HALAL_BLOB_KEY']) ? trim($_SERVER['HTTP_X_HALAL_BLOB_KEY']) : '';
+    $getKey = isset($_GET['key']) ? $_GET['key'] : '';
+    return $headerKey !== '' ? $headerKey : $getKey;
+}
+
+function require_auth($expectedKey) {
+    $key = request_key();
+    if ($expectedKey === '' || $key === '' || $key !== $expectedKey) {
+        respond_json(403, ['success' => false, 'error' => ['code' => 'INVALID_KEY', 'message' => 'Forbidden']]);
+    }
+    timing_mark('auth');
+}
+
+function token_signature($key, $body) {
+    return rtrim(strtr(base64_encode(hash_hmac('sha256', $body, $key, true)), '+/', '-_'), '=');
+}
+
+function token_verify($key, $token, $scope, &$claims) {
+    $invalid = [403, ['success' => false, 'error' => ['code' => 'TOKEN_INVALID', 'message' => 'Invalid token']]];
+    $parts = explode('.', (string)$token);
+    if ($key === '' || count($parts) !== 2 || !hash_equals(token_signature($key, $parts[0]), $parts[1])) { return $invalid; }
+    $claims = json_decode((string)base64_decode(strtr($parts[0], '-_', '+/'), true), true);
+    if (!is_array($claims) || !isset($claims['scope'], $claims['exp']) || $claims['scope'] !== $scope || !is_int($claims['exp'])) { return $invalid; }
+    if ($claims['exp'] < time()) {
+        return [403, ['success' => false, 'error' => ['code' => 'TOKEN_EXPIRED', 'message' => 'Token expired']]];
+    }
+    return null;
+}
+
+function require_upload_auth($cfg) {
+    $token = isset($_SERVER['HTTP_X_HALAL_BLOB_TOKEN']) ? trim($_SERVER['HTTP_X_HALAL_BLOB_TOKEN']) : '';
+    if ($token === '' && isset($_GET['token']) && is_string($_GET['token'])) { $token = $_GET['token']; }
+    if ($token === '' || request_key() !== '') {
+        require_auth($cfg['key']);
+        return $cfg;
+    }
+    $claims = null;
+    $error = token_verify($cfg['key'], $token, 'upload', $claims);
+    $folder = isset($claims['folder']) && is_string($claims['folder']) ? clean_folder($claims['folder']) : null;
+    if (!$error && ($folder === null || (isset($claims['max_bytes']) && !is_int($claims['max_bytes'])) || (isset($claims['types']) && !is_array($claims['types'])) || (isset($claims['private']) && !is_bool($claims['private'])))) {
+        $error = [403, ['success' => false, 'error' => ['code' => 'TOKEN_INVALID', 'message' => 'Invalid token']]];
+    }
+    if ($error) {
+        respond_json($error[0], $error[1]);
+    }
+    $cfg['tokenFolder'] = $folder;
+    $cfg['tokenPrivate'] = !empty($claims['private']);
+    if (isset($claims['max_bytes'])) { $cfg['maxBytes'] = min($cfg['maxBytes'], $claims['max_bytes']); }
+    if (isset($claims['types'])) {
+        $types = array_map('strtolower', array_filter($claims['types'], 'is_string'));
+        $cfg['allowedExts'] = array_values(array_intersect($cfg['allowedExts'], $types));
+    }
+    timing_mark('auth');
+    return $cfg;
+}
+
+function send_cors($cfg) {
+    $origin = isset($_SERVER['HTTP_ORIGIN']) ? rtrim($_SERVER['HTTP_ORIGIN'], '/') : '';
+    if ($origin === '' || (!in_array('*', $cfg['corsOrigins'], true) && !in_array($origin, $cfg['corsOrigins'], true))) { return; }
+    header('Access-Control-Allow-Origin: ' . $origin);
+    header('Vary: Origin');
+    if (isset($_SERVER['REQUEST_METHOD']) && $_SERVER['REQUEST_METHOD'] === 'OPTIONS') {
+        header('Access-Control-Allow-Methods: POST, OPTIONS');
+        header('Access-Control-Allow-Headers: Content-Type, X-Halal-Blob-Token');
+        header('Access-Control-Max-Age: 600');
+        http_response_code(204);
+        exit;
+    }
+}
+
+function is_allowed_type($cfg, $ext, $realMime) {
+    $mimeMap = [
+        'jpg' => 'image/jpeg',
+        'jpeg' => 'image/jpeg',
+        'png' => 'image/png',
+        'webp' => 'image/webp',
+        'gif' => 'image/gif',
+        'mp4' => 'video/mp4',
+        'webm' => 'video/webm',
+        'mov' => 'video/quicktime',
+        'mp3' => 'audio/mpeg',
+        'pdf' => 'application/pdf',
+        'json' => ['application/json', 'text/plain'],
+        'txt' => 'text/plain',
+        'csv' => ['text/csv', 'text/plain', 'application/csv'],
+    ];
+    $allowedMimes = [];
+    foreach ($cfg['allowedExts'] as $e) {
+        if (isset($mimeMap[$e])) { $allowedMimes = array_merge($allowedMimes, (array)$mimeMap[$e]); }
+    }
+    return in_array($ext, $cfg['allowedExts'], true) && in_array($realMime, $allowedMimes, true);
+}
+
+function ensure_dir($dir) {
+    static $ready = [];
+    if (isset($ready[$dir])) { return true; }
+    if (!is_dir($dir) && !@mkdir($dir, 0755, true) && !is_dir($dir)) { return false; }
+    $ready[$dir] = true;
+    return true;
+}
+
+function upload_error($cfg, $ext, $realMime, $sizeBytes) {
+    if (!is_allowed_type($cfg, $ext, $realMime)) {
+        return [400, ['success' => false, 'error' => ['code' => 'INVALID_TYPE', 'message' => 'Unsupported file type']]];
+    }
+    if ($sizeBytes > $cfg['maxBytes']) {
+        return [400, ['success' => false, 'error' => ['code' => 'FILE_TOO_LARGE', 'message' => 'File exceeds maximum allowed size']]];
+    }
+    return null;
+}
+
+function clean_folder($folder) {
+    $folder = trim((string)$folder);
+    if ($folder !== '' && !preg_match('/^[A-Za-z0-9_\-\/]*$/', $folder)) { return null; }
+    return trim($folder, '/');
+}
+
+function precompress_blob($cfg, $path, $mime) {
+    $compressible = ['application/json', 'text/plain', 'text/csv'];
+    if (!$cfg['precompress'] || !in_array($mime, $compressible, true)) { return; }
+    if (!is_file($path . '.gz')) {
+        $in = @fopen($path, 'rb');
+        $out = @gzopen($path . '.gz.tmp', 'wb9');
+        if ($in && $out) {
+            while (!feof($in)) { gzwrite($out, fread($in, 1048576)); }
+        }
+        if ($in) { fclose($in); }
+        if ($out) { gzclose($out); }
+        if ($in && $out && filesize($path . '.gz.tmp') < filesize($path)) { @rename($path . '.gz.tmp', $path . '.gz'); }
+        @unlink($path . '.gz.tmp');
+    }
+    if (function_exists('brotli_compress') && !is_file($path . '.br') && filesize($path) <= 8 * 1024 * 1024) {
+        $data = @file_get_contents($path);
+        $compressed = $data === false ? false : brotli_compress($data, 11);
+        if ($compressed !== false && strlen($compressed) < strlen($data)) { @file_put_contents($path . '.br', $compressed); }
+    }
+}
+
+function remove_blob_siblings($path) {
+    foreach (['.br', '.gz'] as $suffix) {
+        if (is_file($path . $suffix)) { @unlink($path . $suffix); }
+    }
+}
+
+function purge_variants($root, $relativePath) {
+    foreach (array_filter([$relativePath, blob_alternate_path($relativePath)]) as $path) {
+        foreach (glob($root . '/variants/w*q*/' . $path . '.*', GLOB_NOSORT) ?: [] as $file) { @unlink($file); }
+    }
+}
+
+function cursor_encode($name) {
+    return rtrim(strtr(base64_encode($name), '+/', '-_'), '=');
+}
+
+function cursor_decode($cursor) {
+    $name = base64_decode(strtr($cursor, '-_', '+/'), true);
+    if ($name === false || !preg_match('/^[A-Za-z0-9_\-\.\/]+$/', $name)) { return null; }
+    return $name;
+}
+
+function remove_tree($dir) {
+    if (!is_dir($dir)) { return; }
+    $items = new RecursiveIteratorIterator(new RecursiveDirectoryIterator($dir, FilesystemIterator::SKIP_DOTS), RecursiveIteratorIterator::CHILD_FIRST);
+    foreach ($items as $item) {
+        if ($item->isDir() && !$item->isLink()) { @rmdir($item->getPathname()); } else { @unlink($item->getPathname()); }
+    }
+    @rmdir($dir);
+}
+
+function clean_path($path) {
+    $path = trim(preg_replace('/[^A-Za-z0-9_\-\.\/]/', '', (string)$path), '/');
+    foreach (explode('/', $path) as $segment) {
+        if ($segment === '' || $segment === '.' || $segment === '..') { return null; }
+    }
+    return $path;
+}
+
+function stored_name($cfg, $basename, $ext) {
+    $filename = $basename . ($ext ? ('.' . $ext) : '');
+    return $cfg['layout'] === 'sharded' ? (shard_prefix($basename) . '/' . $filename) : $filename;
+}
+
+function private_root($cfg, $root) {
+    return $cfg['privatePath'][0] === '/' ? $cfg['privatePath'] : ($root . '/' . $cfg['privatePath']);
+}
+
+function private_requested($cfg) {
+    return !empty($cfg['tokenPrivate']) || (isset($_GET['private']) && filter_var($_GET['private'], FILTER_VALIDATE_BOOLEAN));
+}
+
+function select_storage($cfg, $root, $private = null) {
+    if ($private === null) { $private = private_requested($cfg); }
+    if (!$private) { return [$cfg, $root]; }
+    $dir = private_root($cfg, $root);
+    if (!is_dir($dir)) {
+        if (!ensure_dir($dir)) {
+            respond_json(500, ['success' => false, 'error' => ['code' => 'SERVER_ERROR', 'message' => 'Failed to create private storage']]);
+        }
+        @file_put_contents($dir . '/.htaccess', "Require all denied\n");
+    }
+    $cfg['private'] = true;
+    return [$cfg, $dir];
+}
+
+function blob_url($cfg, $relativePath) {
+    $baseUrl = $cfg['baseUrl'] ?: ('https://' . $_SERVER['HTTP_HOST']);
+    if (!empty($cfg['private'])) { return $baseUrl . '/api/' . $cfg['blobPath'] . '/download.php?path=' . $relativePath; }
+    return $baseUrl . '/' . $cfg['blobPath'] . '/' . $relativePath;
+}
+
+function build_meta($cfg, $folder, $storedName, $originalName, $sizeBytes, $realMime) {
+    $relativePath = ($folder ? ($folder . '/') : '') . $storedName;
+    return [
+        'path' => $relativePath,
+        'url' => blob_url($cfg, $relativePath),
+        'size_bytes' => $sizeBytes,
+        'mime_type' => $realMime,
+        'original_name' => $originalName,
+        'uploaded_at' => gmdate('c'),
+        'client_ip' => isset($_SERVER['REMOTE_ADDR']) ? $_SERVER['REMOTE_ADDR'] : '',
+        'folder' => $folder,
+    ];
+}
+
+function save_meta($root, $folder, $storedName, $meta) {
+    $metaDir = $root . '/meta' . ($folder ? ('/' . $folder) : '');
+    $metaPath = $metaDir . '/' . $storedName . '.json';
+    ensure_dir(dirname($metaPath));
+    return @file_put_contents($metaPath, json_encode($meta, JSON_PRETTY_PRINT)) !== false;
+}
+
+function index_handle($cfg, $root, $folder) {
+    static $handles = [];
+    $suffix = $folder ? ('/' . $folder) : '';
+    if (!array_key_exists($suffix, $handles)) {
+        $handles[$suffix] = index_open($root . '/meta' . $suffix, $root . '/' . $cfg['blobPath'] . $suffix);
+    }
+    return $handles[$suffix];
+}
+
+function index_meta($cfg, $root, $folder, $storedName, $meta) {
+    $index = index_handle($cfg, $root, $folder);
+    if ($index) { index_put($index, $storedName, $meta); }
+}
+
+function blob_response($meta, $deduplicated = false) {
+    $payload = [
+        'success' => true,
+        'url' => $meta['url'],
+        'filename' => basename($meta['path']),
+        'path' => $meta['path'],
+        'meta' => [
+            'size_bytes' => $meta['size_bytes'],
+            'mime_type' => $meta['mime_type'],
+            'uploaded_at' => $meta['uploaded_at'],
+            'folder' => $meta['folder'],
+            'original_name' => $meta['original_name'],
+            'client_ip' => $meta['client_ip'],
+        ],
+    ];
+    if (isset($meta['sha256'])) {
+        $payload['meta']['sha256'] = $meta['sha256'];
+        $payload['meta']['ref_count'] = $meta['ref_count'];
+        $payload['deduplicated'] = $deduplicated;
+    }
+    return [200, $payload];
+}
+
+function store_blob($cfg, $root, $folder, $sourcePath, $uploaded, $originalName, $ext, $sizeBytes, $realMime) {
+    if ($cfg['dedup']) {
+        $sha = hash_file('sha256', $sourcePath);
+        timing_mark('hash');
+        return claim_blob($cfg, $root, $folder, $sha, $ext, $sourcePath, $uploaded, $originalName, $sizeBytes, $realMime);
+    }
+
+    $storedName = stored_name($cfg, bin2hex(random_bytes(16)), $ext);
+    $targetPath = $root . '/' . $cfg['blobPath'] . ($folder ? ('/' . $folder) : '') . '/' . $storedName;
+
+    if (!ensure_dir(dirname($targetPath))) {
+        return [500, ['success' => false, 'error' => ['code' => 'SERVER_ERROR', 'message' => 'Failed to create target directory']]];
+    }
+    timing_mark('mkdir');
+
+    if (usage_update($cfg, $root, $folder, 1, $sizeBytes, $realMime, true) === false) {
+        return quota_error();
+    }
+    timing_mark('usage');
+    $moved = $uploaded ? move_uploaded_file($sourcePath, $targetPath) : rename($sourcePath, $targetPath);
+    if (!$moved) {
+        usage_update($cfg, $root, $folder, -1, -$sizeBytes, $realMime);
+        return [500, ['success' => false, 'error' => ['code' => 'SERVER_ERROR', 'message' => 'Failed to save file']]];
+    }
+    timing_mark('move');
+
+    precompress_blob($cfg, $targetPath, $realMime);
+    timing_mark('precompress');
+
+    $meta = build_meta($cfg, $folder, $storedName, $originalName, $sizeBytes, $realMime);
+    if (!save_meta($root, $folder, $storedName, $meta)) {
+        return [500, ['success' => false, 'error' => ['code' => 'SERVER_ERROR', 'message' => 'Failed to write metadata']]];
+    }
+    timing_mark('meta');
+    index_meta($cfg, $root, $folder, $storedName, $meta);
+    timing_mark('index');
+    journal_append($cfg, [journal_event($cfg, 'put', $meta['path'], $meta)]);
+
+    return blob_response($meta);
+}
+
+function claim_blob($cfg, $root, $folder, $sha, $ext, $sourcePath, $uploaded, $originalName, $sizeBytes, $realMime) {
+    $lock = cas_lock($root, $sha);
+    if ($lock === null) {
+        return [500, ['success' => false, 'error' => ['code' => 'SERVER_ERROR', 'message' => 'Failed to lock content record']]];
+    }
+    timing_mark('cas');
+    $record = $lock['record'];
+    $blobRoot = $root . '/' . $cfg['blobPath'];
+    $storedName = stored_name($cfg, $sha, $ext);
+    $relativePath = ($folder ? ($folder . '/') : '') . $storedName;
+    $targetPath = $blobRoot . '/' . $relativePath;
+    $discardSource = function() use ($sourcePath, $uploaded) {
+        if ($sourcePath !== null && !$uploaded) { @unlink($sourcePath); }
+    };
+
+    if (is_file($targetPath)) {
+        $raw = @file_get_contents($root . '/meta/' . $relativePath . '.json');
+        $meta = $raw === false ? null : json_decode($raw, true);
+        if (!is_array($meta)) {
+            $meta = build_meta($cfg, $folder, $storedName, $originalName, filesize($targetPath), isset($record['mime_type']) ? $record['mime_type'] : $realMime);
+            $meta['ref_count'] = 0;
+        }
+        $meta['sha256'] = $sha;
+        $meta['ref_count'] = (isset($meta['ref_count']) ? (int)$meta['ref_count'] : 1) + 1;
+        $discardSource();
+        if (!save_meta($root, $folder, $storedName, $meta)) {
+            cas_release($lock, $record);
+            return [500, ['success' => false, 'error' => ['code' => 'SERVER_ERROR', 'message' => 'Failed to write metadata']]];
+        }
+        if (!in_array($relativePath, $record['paths'], true)) { $record['paths'][] = $relativePath; }
+        cas_release($lock, $record);
+        index_meta($cfg, $root, $folder, $storedName, $meta);
+        journal_append($cfg, [journal_event($cfg, 'put', $relativePath, $meta)]);
+        return blob_response($meta, true);
+    }
+
+    $existing = cas_source($blobRoot, $record);
+    if ($existing === null && $sourcePath === null) {
+        cas_release($lock, $record);
+        return null;
+    }
+    if ($existing !== null) {
+        $sizeBytes = filesize($blobRoot . '/' . $existing);
+        $realMime = isset($record['mime_type']) ? $record['mime_type'] : $realMime;
+    }
+
+    if (!ensure_dir(dirname($targetPath))) {
+        cas_release($lock, $record);
+        return [500, ['success' => false, 'error' => ['code' => 'SERVER_ERROR', 'message' => 'Failed to create target directory']]];
+    }
+
+    if (usage_update($cfg, $root, $folder, 1, $sizeBytes, $realMime, true) === false) {
+        cas_release($lock, $record);
+        $discardSource();
+        return quota_error();
+    }
+    if ($existing !== null) {
+        $saved = @link($blobRoot . '/' . $existing, $targetPath) || @copy($blobRoot . '/' . $existing, $targetPath);
+        $discardSource();
+    } else {
+        $saved = $uploaded ? move_uploaded_file($sourcePath, $targetPath) : rename($sourcePath, $targetPath);
+    }
+    if (!$saved) {
+        usage_update($cfg, $root, $folder, -1, -$sizeBytes, $realMime);
+        cas_release($lock, $record);
+        return [500, ['success' => false, 'error' => ['code' => 'SERVER_ERROR', 'message' => 'Failed to save file']]];
+    }
+    timing_mark('move');
+    precompress_blob($cfg, $targetPath, $realMime);
+    timing_mark('precompress');
+
+    $meta = build_meta($cfg, $folder, $storedName, $originalName, $sizeBytes, $realMime);
+    $meta['sha256'] = $sha;
+    $meta['ref_count'] = 1;
+    if (!save_meta($root, $folder, $storedName, $meta)) {
+        cas_release($lock, $record);
+        return [500, ['success' => false, 'error' => ['code' => 'SERVER_ERROR', 'message' => 'Failed to write metadata']]];
+    }
+    $record['size_bytes'] = $sizeBytes;
+    $record['mime_type'] = $realMime;
+    $record['paths'][] = $relativePath;
+    cas_release($lock, $record);
+    timing_mark('meta');
+    index_meta($cfg, $root, $folder, $storedName, $meta);
+    timing_mark('index');
+    journal_append($cfg, [journal_event($cfg, 'put', $relativePath, $meta)]);
+
+    return blob_response($meta, $existing !== null);
+}
+
+function delete_path($cfg, $root, $relativePath) {
+    static $indexes = [];
+    $blobRoot = $root . '/' . $cfg['blobPath'];
+    $metaRoot = $root . '/meta';
+
+    $fullPath = $blobRoot . '/' . $relativePath;
+    if (!is_file($fullPath)) {
+        $altPath = blob_alternate_path($relativePath);
+        if ($altPath !== null && is_file($blobRoot . '/' . $altPath)) {
+            $relativePath = $altPath;
+            $fullPath = $blobRoot . '/' . $relativePath;
+        }
+    }
+    if (!is_file($fullPath)) {
+        return [404, ['success' => false, 'error' => ['code' => 'FILE_NOT_FOUND', 'message' => 'File not found']]];
+    }
+
+    list($folder, $name) = split_blob_path($relativePath);
+    $suffix = $folder ? ('/' . $folder) : '';
+    if (!array_key_exists($suffix, $indexes)) {
+        $indexes[$suffix] = index_open($metaRoot . $suffix, $blobRoot . $suffix, false);
+    }
+    $index = $indexes[$suffix];
+
+    $metaFull = $metaRoot . '/' . $relativePath . '.json';
+    $raw = @file_get_contents($metaFull);
+    $meta = $raw === false ? null : json_decode($raw, true);
+    $lock = null;
+    if (is_array($meta) && isset($meta['sha256']) && is_string($meta['sha256'])) {
+        $lock = cas_lock($root, $meta['sha256']);
+        $raw = @file_get_contents($metaFull);
+        $meta = $raw === false ? null : json_decode($raw, true);
+        if ($lock && is_array($meta) && isset($meta['ref_count']) && (int)$meta['ref_count'] > 1) {
+            $meta['ref_count'] = (int)$meta['ref_count'] - 1;
+            $saved = @file_put_contents($metaFull, json_encode($meta, JSON_PRETTY_PRINT)) !== false;
+            cas_release($lock, $lock['record']);
+            if (!$saved) {
+                return [500, ['success' => false, 'error' => ['code' => 'DELETE_FAILED', 'message' => 'Failed to update metadata']]];
+            }
+            if ($index) { index_put($index, $name, $meta); }
+            return [200, ['success' => true, 'ref_count' => $meta['ref_count']]];
+        }
+    }
+
+    $sizeBytes = is_array($meta) && isset($meta['size_bytes']) ? (int)$meta['size_bytes'] : (int)filesize($fullPath);
+    $mime = is_array($meta) && isset($meta['mime_type']) ? (string)$meta['mime_type'] : 'application/octet-stream';
+    usage_update($cfg, $root, $folder, -1, -$sizeBytes, $mime);
+    if (!unlink($fullPath)) {
+        usage_update($cfg, $root, $folder, 1, $sizeBytes, $mime);
+        if ($lock) { cas_release($lock, $lock['record']); }
+        return [500, ['success' => false, 'error' => ['code' => 'DELETE_FAILED', 'message' => 'Failed to delete file']]];
+    }
+    timing_mark('unlink');
+
+    if (is_file($metaFull)) { @unlink($metaFull); }
+    remove_blob_siblings($fullPath);
+    purge_variants($root, $relativePath);
+    timing_mark('cleanup');
+
+    if ($lock) {
+        $record = $lock['record'];
+        $record['paths'] = array_values(array_filter($record['paths'], function($p) use ($relativePath) {
+            return $p !== $relativePath && $p !== blob_alternate_path($relativePath);
+        }));
+        cas_release($lock, $record);
+    }
+
+    if ($index) { index_remove($index, $name); }
+    timing_mark('index');
+    journal_append($cfg, [journal_event($cfg, 'delete', $relativePath, $meta)]);
+
+    return [200, ['success' => true]];
+}
+""" + _layout_php_helpers() + _index_php_helpers() + _cas_php_helpers() + _usage_php_helpers() + _chunked_php_helpers() + _journal_php_helpers()
+    return php.replace("__BOOTSTRAP_HASH__", hashlib.sha256(php.encode("utf-8")).hexdigest()[:16])
+
+def upload_php_content() -> str:
+    return r"""<?php
+require __DIR__ . '/_bootstrap.php';
+
+$cfg = load_config($envPath);
+send_cors($cfg);
+$cfg = require_upload_auth($cfg);
+list($cfg, $root) = select_storage($cfg, $root);
+
+$batch = isset($_FILES['file']['name']) && is_array($_FILES['file']['name']);
+if (!isset($_FILES['file']) || (!$batch && $_FILES['file']['error'] !== UPLOAD_ERR_OK)) {
+    respond_json(400, ['success' => false, 'error' => ['code' => 'NO_FILE', 'message' => 'No file uploaded']]);
+}
+
+$folder = clean_folder(isset($_POST['folder']) ? $_POST['folder'] : '');
+if ($folder === null) {
+    respond_json(400, ['success' => false, 'error' => ['code' => 'FOLDER_INVALID', 'message' => 'Folder contains invalid characters']]);
+}
+if (isset($cfg['tokenFolder'])) {
+    if ($folder !== '' && $folder !== $cfg['tokenFolder']) {
+        respond_json(403, ['success' => false, 'error' => ['code' => 'TOKEN_SCOPE', 'message' => 'Folder not allowed by upload token']]);
+    }
+    $folder = $cfg['tokenFolder'];
+}
+
+if ($batch) {
+    $files = $_FILES['file'];
+    $count = count($files['name']);
+    if ($count > $cfg['batchMaxFiles']) {
+        respond_json(400, ['success' => false, 'error' => ['code' => 'BATCH_TOO_LARGE', 'message' => 'Batch exceeds maximum file count']]);
+    }
+    if (array_sum(array_map('intval', $files['size'])) > $cfg['batchMaxBytes']) {
+        respond_json(400, ['success' => false, 'error' => ['code' => 'BATCH_TOO_LARGE', 'message' => 'Batch exceeds maximum allowed size']]);
+    }
+
+    $finfo = finfo_open(FILEINFO_MIME_TYPE);
+    $results = [];
+    $uploaded = 0;
+    for ($i = 0; $i < $count; $i++) {
+        if ($files['error'][$i] !== UPLOAD_ERR_OK) {
+            $results[] = ['index' => $i, 'success' => false, 'error' => ['code' => 'NO_FILE', 'message' => 'No file uploaded']];
+            continue;
+        }
+        $ext = strtolower(pathinfo($files['name'][$i], PATHINFO_EXTENSION));
+        $sizeBytes = (int)$files['size'][$i];
+        $realMime = finfo_file($finfo, $files['tmp_name'][$i]);
+        timing_mark('sniff');
+        $error = upload_error($cfg, $ext, $realMime, $sizeBytes);
+        list($status, $payload) = $error ?: store_blob($cfg, $root, $folder, $files['tmp_name'][$i], true, $files['name'][$i], $ext, $sizeBytes, $realMime);
+        if ($status === 200) { $uploaded++; }
+        $results[] = ['index' => $i] + $payload;
+    }
+    finfo_close($finfo);
+
+    respond_json(200, ['success' => $uploaded === $count, 'uploaded' => $uploaded, 'failed' => $count - $uploaded, 'results' => $results]);
+}
+
+$originalName = $_FILES['file']['name'];
+$ext = strtolower(pathinfo($originalName, PATHINFO_EXTENSION));
+$sizeBytes = isset($_FILES['file']['size']) ? (int)$_FILES['file']['size'] : 0;
+$tmpPath = $_FILES['file']['tmp_name'];
+
+$finfo = finfo_open(FILEINFO_MIME_TYPE);
+$realMime = finfo_file($finfo, $tmpPath);
+finfo_close($finfo);
+timing_mark('sniff');
+
+$error = upload_error($cfg, $ext, $realMime, $sizeBytes);
+if ($error) {
+    respond_json($error[0], $error[1]);
+}
+
+list($status, $payload) = store_blob($cfg, $root, $folder, $tmpPath, true, $originalName, $ext, $sizeBytes, $realMime);
+respond_json($status, $payload);
+"""
+
+def upload_init_php_content() -> str:
+    return r"""<?php
+require __DIR__ . '/_bootstrap.php';
+
+$cfg = load_config($envPath);
+require_auth($cfg['key']);
+
+$data = json_decode(file_get_contents('php://input'), true);
+if (!is_array($data)) {
+    respond_json(400, ['success' => false, 'error' => ['code' => 'SERVER_ERROR', 'message' => 'Invalid JSON']]);
+}
+
+if (isset($data['upload_id'])) {
+    $state = load_upload_state($root, $data['upload_id']);
+    if ($state === null) {
+        respond_json(404, ['success' => false, 'error' => ['code' => 'UPLOAD_NOT_FOUND', 'message' => 'Upload session not found']]);
+    }
+    respond_json(200, upload_status_payload($state));
+}
+
+purge_stale_uploads($root, 86400);
+
+$folder = clean_folder(isset($data['folder']) ? $data['folder'] : '');
+if ($folder === null) {
+    respond_json(400, ['success' => false, 'error' => ['code' => 'FOLDER_INVALID', 'message' => 'Folder contains invalid characters']]);
+}
+
+$originalName = isset($data['filename']) && is_string($data['filename']) ? basename($data['filename']) : '';
+$ext = strtolower(pathinfo($originalName, PATHINFO_EXTENSION));
+if ($originalName === '' || !in_array($ext, $cfg['allowedExts'], true)) {
+    respond_json(400, ['success' => false, 'error' => ['code' => 'INVALID_TYPE', 'message' => 'Unsupported file type']]);
+}
+
+$sizeBytes = isset($data['size']) ? (int)$data['size'] : 0;
+if ($sizeBytes < 1) {
+    respond_json(400, ['success' => false, 'error' => ['code' => 'NO_FILE', 'message' => 'Missing file size']]);
+}
+if ($sizeBytes > $cfg['chunkedMaxBytes']) {
+    respond_json(400, ['success' => false, 'error' => ['code' => 'FILE_TOO_LARGE', 'message' => 'File exceeds maximum allowed size']]);
+}
+
+$chunkSize = isset($data['chunk_size']) ? (int)$data['chunk_size'] : $cfg['chunkBytes'];
+$postMax = ini_bytes(ini_get('post_max_size'));
+if ($postMax > 0) { $chunkSize = min($chunkSize, $postMax - 65536); }
+$chunkSize = max(262144, min($chunkSize, 64 * 1024 * 1024));
+
+$uploadId = bin2hex(random_bytes(16));
+$dir = uploads_root($root) . '/' . $uploadId;
+if (!mkdir($dir, 0755, true)) {
+    respond_json(500, ['success' => false, 'error' => ['code' => 'SERVER_ERROR', 'message' => 'Failed to create upload session']]);
+}
+
+$state = [
+    'id' => $uploadId,
+    'folder' => $folder,
+    'original_name' => $originalName,
+    'ext' => $ext,
+    'size' => $sizeBytes,
+    'chunk_size' => $chunkSize,
+    'chunks' => (int)ceil($sizeBytes / $chunkSize),
+    'private' => private_requested($cfg),
+    'created_at' => gmdate('c'),
+];
+
+$fh = fopen($dir . '/data.part', 'c+b');
+if ($fh === false || !ftruncate($fh, $sizeBytes) || @file_put_contents($dir . '/state.json', json_encode($state)) === false) {
+    if ($fh) { fclose($fh); }
+    remove_upload_dir($dir);
+    respond_json(500, ['success' => false, 'error' => ['code' => 'SERVER_ERROR', 'message' => 'Failed to create upload session']]);
+}
+fclose($fh);
+
+$state['dir'] = $dir;
+respond_json(200, upload_status_payload($state));
+"""
+
+def upload_chunk_php_content() -> str:
+    return r"""<?php
+require __DIR__ . '/_bootstrap.php';
+
+$cfg = load_config($envPath);
+require_auth($cfg['key']);
+
+$state = load_upload_state($root, isset($_GET['upload_id']) ? $_GET['upload_id'] : '');
+if ($state === null) {
+    respond_json(404, ['success' => false, 'error' => ['code' => 'UPLOAD_NOT_FOUND', 'message' => 'Upload session not found']]);
+}
+
+$index = isset($_GET['index']) && is_numeric($_GET['index']) ? (int)$_GET['index'] : -1;
+if ($index < 0 || $index >= $state['chunks']) {
+    respond_json(400, ['success' => false, 'error' => ['code' => 'CHUNK_INVALID', 'message' => 'Chunk index out of range']]);
+}
+
+$expected = chunk_length($state, $index);
+$in = fopen('php://input', 'rb');
+$out = fopen($state['dir'] . '/data.part', 'c+b');
+if ($in === false || $out === false || fseek($out, $index * $state['chunk_size']) !== 0) {
+    respond_json(500, ['success' => false, 'error' => ['code' => 'SERVER_ERROR', 'message' => 'Failed to open upload session']]);
+}
+$written = stream_copy_to_stream($in, $out, $expected);
+$overflow = fread($in, 1);
+fclose($in);
+fclose($out);
+timing_mark('write');
+
+if ($written !== $expected || ($overflow !== false && $overflow !== '')) {
+    respond_json(400, ['success' => false, 'error' => ['code' => 'CHUNK_INVALID', 'message' => 'Chunk length mismatch']]);
+}
+
+touch($state['dir'] . '/' . $index . '.ok');
+touch($state['dir']);
+
+respond_json(200, ['success' => true, 'upload_id' => $state['id'], 'index' => $index, 'size' => $written]);
+"""
+
+def upload_complete_php_content() -> str:
+    return r"""<?php
+require __DIR__ . '/_bootstrap.php';
+
+$cfg = load_config($envPath);
+require_auth($cfg['key']);
+
+$data = json_decode(file_get_contents('php://input'), true);
+$state = load_upload_state($root, is_array($data) && isset($data['upload_id']) ? $data['upload_id'] : '');
+if ($state === null) {
+    respond_json(404, ['success' => false, 'error' => ['code' => 'UPLOAD_NOT_FOUND', 'message' => 'Upload session not found']]);
+}
+
+$received = received_chunks($state);
+if (count($received) !== $state['chunks']) {
+    $status = upload_status_payload($state);
+    respond_json(409, ['success' => false, 'error' => ['code' => 'UPLOAD_INCOMPLETE', 'message' => 'Missing ' . ($state['chunks'] - count($received)) . ' chunk(s)'], 'received' => $status['received']]);
+}
+
+$partPath = $state['dir'] . '/data.part';
+clearstatcache(true, $partPath);
+if (filesize($partPath) !== $state['size']) {
+    respond_json(409, ['success' => false, 'error' => ['code' => 'UPLOAD_INCOMPLETE', 'message' => 'Assembled size mismatch']]);
+}
+
+$finfo = finfo_open(FILEINFO_MIME_TYPE);
+$realMime = finfo_file($finfo, $partPath);
+finfo_close($finfo);
+timing_mark('sniff');
+
+if (!is_allowed_type($cfg, $state['ext'], $realMime)) {
+    remove_upload_dir($state['dir']);
+    respond_json(400, ['success' => false, 'error' => ['code' => 'INVALID_TYPE', 'message' => 'Unsupported file type']]);
+}
+
+list($cfg, $storageRoot) = select_storage($cfg, $root, !empty($state['private']));
+list($status, $payload) = store_blob($cfg, $storageRoot, $state['folder'], $partPath, false, $state['original_name'], $state['ext'], $state['size'], $realMime);
+if ($status === 200) { remove_upload_dir($state['dir']); }
+respond_json($status, $payload);
+"""
+
+def exists_php_content() -> str:
+    return r"""<?php
+require __DIR__ . '/_bootstrap.php';
+
+$cfg = load_config($envPath);
+require_auth($cfg['key']);
+list($cfg, $root) = select_storage($cfg, $root);
+
+$data = json_decode(file_get_contents('php://input'), true);
+if (!is_array($data)) {
+    respond_json(400, ['success' => false, 'error' => ['code' => 'SERVER_ERROR', 'message' => 'Invalid JSON']]);
+}
+
+$sha = isset($data['sha256']) && is_string($data['sha256']) ? strtolower($data['sha256']) : '';
+if (!preg_match('/^[0-9a-f]{64}$/', $sha)) {
+    respond_json(400, ['success' => false, 'error' => ['code' => 'HASH_INVALID', 'message' => 'Invalid sha256']]);
+}
+
+if (!$cfg['dedup']) {
+    respond_json(200, ['success' => true, 'exists' => false]);
+}
+
+$folder = clean_folder(isset($data['folder']) ? $data['folder'] : '');
+if ($folder === null) {
+    respond_json(400, ['success' => false, 'error' => ['code' => 'FOLDER_INVALID', 'message' => 'Folder contains invalid characters']]);
+}
+
+$recordPath = $root . '/meta/.cas/' . substr($sha, 0, 2) . '/' . $sha . '.json';
+$raw = @file_get_contents($recordPath);
+$record = $raw ? json_decode($raw, true) : null;
+if (!is_array($record) || empty($record['paths']) || !isset($record['mime_type'])) {
+    respond_json(200, ['success' => true, 'exists' => false]);
+}
+
+$originalName = isset($data['filename']) && is_string($data['filename']) ? basename($data['filename']) : '';
+$ext = strtolower(pathinfo($originalName, PATHINFO_EXTENSION));
+if (!is_allowed_type($cfg, $ext, $record['mime_type'])) {
+    respond_json(400, ['success' => false, 'error' => ['code' => 'INVALID_TYPE', 'message' => 'Unsupported file type']]);
+}
+
+$result = claim_blob($cfg, $root, $folder, $sha, $ext, null, false, $originalName, 0, $record['mime_type']);
+if ($result === null) {
+    respond_json(200, ['success' => true, 'exists' => false]);
+}
+list($status, $payload) = $result;
+if ($status === 200) { $payload['exists'] = true; }
+respond_json($status, $payload);
+"""
+
+def variant_php_content() -> str:
+    return r"""<?php
+require __DIR__ . '/_bootstrap.php';
+
+function render_variant($source, $target, $width, $quality, $format) {
+    $tmp = $target . '.' . getmypid() . '.tmp';
+    if (extension_loaded('gd')) {
+        $data = @file_get_contents($source);
+        $img = $data === false ? false : @imagecreatefromstring($data);
+        if ($img === false) { return false; }
+        if (imagesx($img) > $width) {
+            $scaled = imagescale($img, $width, -1, IMG_BICUBIC);
+            imagedestroy($img);
+            if ($scaled === false) { return false; }
+            $img = $scaled;
+        }
+        imagealphablending($img, false);
+        imagesavealpha($img, true);
+        if ($format === 'jpg') { $ok = imagejpeg($img, $tmp, $quality); }
+        elseif ($format === 'png') { $ok = imagepng($img, $tmp, (int)round((100 - $quality) / 11)); }
+        elseif ($format === 'webp') { $ok = function_exists('imagewebp') && imagewebp($img, $tmp, $quality); }
+        else { $ok = imagegif($img, $tmp); }
+        imagedestroy($img);
+    } elseif (class_exists('Imagick')) {
+        try {
+            $img = new Imagick($source);
+            if ($img->getImageWidth() > $width) { $img->thumbnailImage($width, 0); }
+            $img->setImageFormat($format === 'jpg' ? 'jpeg' : $format);
+            $img->setImageCompressionQuality($quality);
+            $ok = $img->writeImage($tmp);
+            $img->clear();
+        } catch (Exception $e) {
+            $ok = false;
+        }
+    } else {
+        return false;
+    }
+    if (!$ok || !@rename($tmp, $target)) {
+        @unlink($tmp);
+        return false;
+    }
+    return true;
+}
+
+$cfg = load_config($envPath);
+
+$spec = isset($_GET['v']) ? (string)$_GET['v'] : '';
+if (!preg_match('#^w(\d{1,4})q(\d{1,3})/(.+)\.(jpg|jpeg|png|webp|gif)$#', $spec, $m)) {
+    respond_json(404, ['success' => false, 'error' => ['code' => 'VARIANT_INVALID', 'message' => 'Invalid variant']]);
+}
+$width = (int)$m[1];
+$quality = (int)$m[2];
+$format = $m[4] === 'jpeg' ? 'jpg' : $m[4];
+if (!in_array($width . 'x' . $quality, $cfg['variantPresets'], true)) {
+    respond_json(404, ['success' => false, 'error' => ['code' => 'VARIANT_NOT_ALLOWED', 'message' => 'Variant preset not allowed']]);
+}
+
+$requestedPath = clean_path($m[3]);
+$relativePath = $requestedPath;
+$blobRoot = $root . '/' . $cfg['blobPath'];
+if ($relativePath !== null && !is_file($blobRoot . '/' . $relativePath)) {
+    $altPath = blob_alternate_path($relativePath);
+    $relativePath = ($altPath !== null && is_file($blobRoot . '/' . $altPath)) ? $altPath : null;
+}
+if ($relativePath === null) {
+    respond_json(404, ['success' => false, 'error' => ['code' => 'FILE_NOT_FOUND', 'message' => 'File not found']]);
+}
+
+$source = $blobRoot . '/' . $relativePath;
+$finfo = finfo_open(FILEINFO_MIME_TYPE);
+$sourceMime = finfo_file($finfo, $source);
+finfo_close($finfo);
+if (!in_array($sourceMime, ['image/jpeg', 'image/png', 'image/webp', 'image/gif'], true)) {
+    respond_json(415, ['success' => false, 'error' => ['code' => 'INVALID_TYPE', 'message' => 'Source is not an image']]);
+}
+
+$target = $root . '/variants/w' . $width . 'q' . $quality . '/' . $requestedPath . '.' . $m[4];
+if (!is_file($target)) {
+    if (!is_dir(dirname($target)) && !@mkdir(dirname($target), 0755, true)) {
+        respond_json(500, ['success' => false, 'error' => ['code' => 'SERVER_ERROR', 'message' => 'Failed to create variant directory']]);
+    }
+    if (!render_variant($source, $target, $width, $quality, $format)) {
+        respond_json(500, ['success' => false, 'error' => ['code' => 'VARIANT_FAILED', 'message' => 'Failed to render variant']]);
+    }
+    timing_mark('render');
+}
+
+$mimes = ['jpg' => 'image/jpeg', 'png' => 'image/png', 'webp' => 'image/webp', 'gif' => 'image/gif'];
+header('Content-Type: ' . $mimes[$format]);
+header('Content-Length: ' . filesize($target));
+header('Cache-Control: ' . (preg_match('/^[0-9a-f]{32}([0-9a-f]{32})?(\.[A-Za-z0-9]+)*$/', basename($target)) ? 'public, max-age=31536000, immutable' : 'public, no-cache'));
+timing_header();
+readfile($target);
+timing_log(200, filesize($target));
+"""
+
+def delete_php_content() -> str:
+    return r"""<?php
+require __DIR__ . '/_bootstrap.php';
+
+function purge_file($cfg, $root, $blobRoot, $relativePath, &$state) {
+    $fullPath = $blobRoot . '/' . $relativePath;
+    $base = basename($relativePath);
+    if ($base[0] === '.' || preg_match('/\.(br|gz)$/', $base)) {
+        @unlink($fullPath);
+        return;
+    }
+    $metaFull = $root . '/meta/' . $relativePath . '.json';
+    $raw = @file_get_contents($metaFull);
+    $meta = $raw === false ? null : json_decode($raw, true);
+    $sizeBytes = is_array($meta) && isset($meta['size_bytes']) ? (int)$meta['size_bytes'] : (int)@filesize($fullPath);
+    $mime = is_array($meta) && isset($meta['mime_type']) ? (string)$meta['mime_type'] : 'application/octet-stream';
+    list($folder) = split_blob_path($relativePath);
+    usage_update($cfg, $root, $folder, -1, -$sizeBytes, $mime);
+    if (!@unlink($fullPath)) {
+        usage_update($cfg, $root, $folder, 1, $sizeBytes, $mime);
+        $state['failed']++;
+        return;
+    }
+    @unlink($metaFull);
+    remove_blob_siblings($fullPath);
+    if (is_array($meta) && isset($meta['sha256']) && is_string($meta['sha256'])) {
+        $lock = cas_lock($root, $meta['sha256']);
+        if ($lock) {
+            $record = $lock['record'];
+            $record['paths'] = array_values(array_filter($record['paths'], function($p) use ($relativePath) {
+                return $p !== $relativePath && $p !== blob_alternate_path($relativePath);
+            }));
+            cas_release($lock, $record);
+        }
+    }
+    $state['folders'][$folder] = true;
+    $state['deleted']++;
+    $state['bytes'] += $sizeBytes;
+    $state['events'][] = journal_event($cfg, 'delete', $relativePath, $meta);
+}
+
+function purge_walk($cfg, $root, $blobRoot, $dir, $after, $deadline, &$state) {
+    $entries = [];
+    foreach (@scandir($blobRoot . '/' . $dir) ?: [] as $name) {
+        if ($name === '.' || $name === '..') { continue; }
+        $entries[] = is_dir($blobRoot . '/' . $dir . '/' . $name) ? ($name . '/') : $name;
+    }
+    sort($entries, SORT_STRING);
+    foreach ($entries as $entry) {
+        $path = $dir . '/' . rtrim($entry, '/');
+        if (substr($entry, -1) === '/') {
+            if ($after === null || strcmp($path . '/', $after) > 0 || strpos($after, $path . '/') === 0) {
+                purge_walk($cfg, $root, $blobRoot, $path, $after, $deadline, $state);
+                if (!$state['done']) { return; }
+            }
+            @rmdir($blobRoot . '/' . $path);
+            continue;
+        }
+        if ($after !== null && strcmp($path, $after) <= 0) { continue; }
+        purge_file($cfg, $root, $blobRoot, $path, $state);
+        $state['last'] = $path;
+        if (microtime(true) >= $deadline) {
+            $state['done'] = false;
+            return;
+        }
     }
 }
 
 $cfg = load_config($envPath);
 require_auth($cfg['key']);
+list($cfg, $root) = select_storage($cfg, $root);
 
-$blobRoot = $root . '/' . $cfg['blobPath'];
-$metaRoot = $root . '/meta';
-
-if (!isset($_FILES['file']) || $_FILES['file']['error'] !== UPLOAD_ERR_OK) {
-    respond_json(400, ['success' => false, 'error' => ['code' => 'NO_FILE', 'message' => 'No file uploaded']]);
-}
-
-$folder = isset($_POST['folder']) ? $_POST['folder'] : '';
-$folder = trim($folder);
-if ($folder !== '' && !preg_match('/^[A-Za-z0-9_\-\/]*$/', $folder)) {
-    respond_json(400, ['success' => false, 'error' => ['code' => 'FOLDER_INVALID', 'message' => 'Folder contains invalid characters']]);
+$raw = file_get_contents('php://input');
+$data = json_decode($raw, true);
+if (!is_array($data)) {
+    respond_json(400, ['success' => false, 'error' => ['code' => 'SERVER_ERROR', 'message' => 'Invalid JSON']]);
 }
-$folder = trim($folder, '/');
 
-$targetDir = $blobRoot . ($folder ? ('/' . $folder) : '');
-if (!is_dir($targetDir)) {
-    if (!mkdir($targetDir, 0755, true)) {
-        respond_json(500, ['success' => false, 'error' => ['code' => 'SERVER_ERROR', 'message' => 'Failed to create target directory']]);
+if (isset($data['paths']) && is_array($data['paths'])) {
+    if (count($data['paths']) > 1000) {
+        respond_json(400, ['success' => false, 'error' => ['code' => 'BATCH_TOO_LARGE', 'message' => 'Batch exceeds maximum path count']]);
     }
+    $results = [];
+    $deleted = 0;
+    foreach (array_values($data['paths']) as $path) {
+        $relativePath = is_string($path) ? clean_path($path) : null;
+        list($status, $payload) = $relativePath === null
+            ? [400, ['success' => false, 'error' => ['code' => 'PATH_INVALID', 'message' => 'Invalid path']]]
+            : delete_path($cfg, $root, $relativePath);
+        if ($status === 200) { $deleted++; }
+        $results[] = ['path' => is_string($path) ? $path : null] + $payload;
+    }
+    respond_json(200, ['success' => $deleted === count($results), 'deleted' => $deleted, 'failed' => count($results) - $deleted, 'results' => $results]);
 }
 
-$originalName = $_FILES['file']['name'];
-$ext = strtolower(pathinfo($originalName, PATHINFO_EXTENSION));
-$sizeBytes = isset($_FILES['file']['size']) ? (int)$_FILES['file']['size'] : 0;
-$tmpPath = $_FILES['file']['tmp_name'];
-
-$finfo = finfo_open(FILEINFO_MIME_TYPE);
-$realMime = finfo_file($finfo, $tmpPath);
-finfo_close($finfo);
+if (isset($data['folder'])) {
+    $folder = is_string($data['folder']) ? clean_folder($data['folder']) : null;
+    if ($folder === null || $folder === '') {
+        respond_json(400, ['success' => false, 'error' => ['code' => 'FOLDER_INVALID', 'message' => 'Invalid folder']]);
+    }
+    $blobRoot = $root . '/' . $cfg['blobPath'];
+    if (!is_dir($blobRoot . '/' . $folder)) {
+        respond_json(400, ['success' => false, 'error' => ['code' => 'FOLDER_INVALID', 'message' => 'Folder not found']]);
+    }
+    $after = null;
+    if (isset($data['cursor']) && $data['cursor'] !== '' && $data['cursor'] !== null) {
+        $after = is_string($data['cursor']) ? cursor_decode($data['cursor']) : null;
+        if ($after === null || strpos($after, $folder . '/') !== 0) {
+            respond_json(400, ['success' => false, 'error' => ['code' => 'CURSOR_INVALID', 'message' => 'Invalid cursor']]);
+        }
+    }
 
-$mimeMap = [
-    'jpg' => 'image/jpeg',
-    'jpeg' => 'image/jpeg',
-    'png' => 'image/png',
-    'webp' => 'image/webp',
-    'gif' => 'image/gif',
-];
+    $state = ['deleted' => 0, 'failed' => 0, 'bytes' => 0, 'last' => $after, 'done' => true, 'folders' => [], 'events' => []];
+    purge_walk($cfg, $root, $blobRoot, $folder, $after, microtime(true) + $cfg['deleteBudgetMs'] / 1000, $state);
+    timing_mark('unlink');
+    journal_append($cfg, $state['events']);
+    foreach (array_keys($state['folders']) as $touched) {
+        $suffix = $touched ? ('/' . $touched) : '';
+        $index = index_open($root . '/meta' . $suffix, $blobRoot . $suffix, false);
+        if ($index) { index_invalidate($index); }
+    }
+    if ($state['done'] && @rmdir($blobRoot . '/' . $folder)) {
+        remove_tree($root . '/meta/' . $folder);
+        foreach (glob($root . '/variants/w*q*/' . $folder, GLOB_ONLYDIR | GLOB_NOSORT) ?: [] as $dir) { remove_tree($dir); }
+    }
+    timing_mark('cleanup');
 
-$allowedMimes = [];
-foreach ($cfg['allowedExts'] as $e) {
-    if (isset($mimeMap[$e])) { $allowedMimes[] = $mimeMap[$e]; }
+    respond_json(200, [
+        'success' => $state['failed'] === 0,
+        'folder' => $folder,
+        'deleted' => $state['deleted'],
+        'failed' => $state['failed'],
+        'bytes' => $state['bytes'],
+        'done' => $state['done'],
+        'cursor' => $state['done'] ? null : cursor_encode($state['last']),
+    ]);
 }
 
-if (!in_array($ext, $cfg['allowedExts'], true) || !in_array($realMime, $allowedMimes, true)) {
-    respond_json(400, ['success' => false, 'error' => ['code' => 'INVALID_TYPE', 'message' => 'Unsupported file type']]);
+$relativePath = '';
+if (isset($data['path']) && is_string($data['path'])) {
+    $relativePath = $data['path'];
+} elseif (isset($data['filename']) && is_string($data['filename'])) {
+    $relativePath = $data['filename'];
+} else {
+    respond_json(400, ['success' => false, 'error' => ['code' => 'SERVER_ERROR', 'message' => 'Missing path or filename']]);
 }
 
-if ($sizeBytes > $cfg['maxBytes']) {
-    respond_json(400, ['success' => false, 'error' => ['code' => 'FILE_TOO_LARGE', 'message' => 'File exceeds maximum allowed size']]);
+$relativePath = clean_path($relativePath);
+if ($relativePath === null) {
+    respond_json(400, ['success' => false, 'error' => ['code' => 'PATH_INVALID', 'message' => 'Invalid path']]);
 }
 
-$basename = bin2hex(random_bytes(16));
-$filename = $basename . ($ext ? ('.' . $ext) : '');
-$targetPath = $targetDir . '/' . $filename;
-
-if (!move_uploaded_file($_FILES['file']['tmp_name'], $targetPath)) {
-    respond_json(500, ['success' => false, 'error' => ['code' => 'SERVER_ERROR', 'message' => 'Failed to save file']]);
-}
+list($status, $payload) = delete_path($cfg, $root, $relativePath);
+respond_json($status, $payload);
+"""
 
-$relativePath = ($folder ? ($folder . '/') : '') . $filename;
-$baseUrl = $cfg['baseUrl'] ?: ('https://' . $_SERVER['HTTP_HOST']);
-$url = $baseUrl . '/' . $cfg['blobPath'] . '/' . $relativePath;
+def copy_php_content() -> str:
+    return r"""<?php
+require __DIR__ . '/_bootstrap.php';
 
-$meta = [
-    'path' => $relativePath,
-    'url' => $url,
-    'size_bytes' => $sizeBytes,
-    'mime_type' => $realMime,
-    'original_name' => $originalName,
-    'uploaded_at' => gmdate('c'),
-    'client_ip' => isset($_SERVER['REMOTE_ADDR']) ? $_SERVER['REMOTE_ADDR'] : '',
-    'folder' => $folder,
-];
+function transfer_blob($cfg, $root, $from, $folder, $filename, $move) {
+    $blobRoot = $root . '/' . $cfg['blobPath'];
+    if (!is_file($blobRoot . '/' . $from)) {
+        $alt = blob_alternate_path($from);
+        if ($alt !== null && is_file($blobRoot . '/' . $alt)) { $from = $alt; }
+    }
+    list($fromFolder, $fromName) = split_blob_path($from);
+    $base = basename($fromName);
+    if (!is_file($blobRoot . '/' . $from) || $base[0] === '.' || preg_match('/\.(br|gz)$/', $base)) {
+        return [404, ['success' => false, 'error' => ['code' => 'FILE_NOT_FOUND', 'message' => 'File not found']]];
+    }
+    $sourcePath = $blobRoot . '/' . $from;
+    $ext = strtolower(pathinfo($base, PATHINFO_EXTENSION));
+    $raw = @file_get_contents($root . '/meta/' . $from . '.json');
+    $meta = $raw === false ? null : json_decode($raw, true);
+    if (!is_array($meta)) {
+        $finfo = finfo_open(FILEINFO_MIME_TYPE);
+        $meta = build_meta($cfg, $fromFolder, $fromName, $base, filesize($sourcePath), finfo_file($finfo, $sourcePath));
+        finfo_close($finfo);
+    }
+    $sizeBytes = isset($meta['size_bytes']) ? (int)$meta['size_bytes'] : (int)filesize($sourcePath);
+    $mime = isset($meta['mime_type']) ? (string)$meta['mime_type'] : 'application/octet-stream';
+    $sha = isset($meta['sha256']) && is_string($meta['sha256']) ? $meta['sha256'] : null;
+    $folder = $folder === null ? $fromFolder : $folder;
 
-$metaDir = $metaRoot . ($folder ? ('/' . $folder) : '');
-if (!is_dir($metaDir)) { mkdir($metaDir, 0755, true); }
-$metaPath = $metaDir . '/' . $filename . '.json';
-if (@file_put_contents($metaPath, json_encode($meta, JSON_PRETTY_PRINT)) === false) {
-    respond_json(500, ['success' => false, 'error' => ['code' => 'SERVER_ERROR', 'message' => 'Failed to write metadata']]);
-}
+    if ($filename !== null) {
+        if ($sha !== null) {
+            return [400, ['success' => false, 'error' => ['code' => 'NAME_INVALID', 'message' => 'Deduplicated files keep their content name']]];
+        }
+        if (!preg_match('/^[A-Za-z0-9_\-][A-Za-z0-9_\-\.]*$/', $filename) || preg_match('/\.(br|gz)$/', $filename) || strtolower(pathinfo($filename, PATHINFO_EXTENSION)) !== $ext) {
+            return [400, ['success' => false, 'error' => ['code' => 'NAME_INVALID', 'message' => 'Target filename is invalid or changes the extension']]];
+        }
+    }
+    $name = $filename !== null ? $filename : $base;
+    $storedName = ($cfg['layout'] === 'sharded' && preg_match('/^[0-9a-f]{4}/', $name)) ? (shard_prefix($name) . '/' . $name) : $name;
+    $target = ($folder ? ($folder . '/') : '') . $storedName;
+    if ($target === $from || $target === blob_alternate_path($from)) {
+        return [400, ['success' => false, 'error' => ['code' => 'PATH_INVALID', 'message' => 'Source and target are the same']]];
+    }
 
-respond_json(200, [
-    'success' => true,
-    'url' => $url,
-    'filename' => $filename,
-    'path' => $relativePath,
-    'meta' => [
-        'size_bytes' => $sizeBytes,
-        'mime_type' => $realMime,
-        'uploaded_at' => $meta['uploaded_at'],
-        'folder' => $folder,
-        'original_name' => $originalName,
-        'client_ip' => $meta['client_ip'],
-    ],
-]);
-"""
+    if ($sha !== null) {
+        $result = claim_blob($cfg, $root, $folder, $sha, $ext, null, false, isset($meta['original_name']) ? $meta['original_name'] : $base, $sizeBytes, $mime);
+        if ($result === null) {
+            return [500, ['success' => false, 'error' => ['code' => 'SERVER_ERROR', 'message' => 'Content record is missing']]];
+        }
+        if ($move && $result[0] === 200) { delete_path($cfg, $root, $from); }
+        return $result;
+    }
 
-def delete_php_content() -> str:
-    return r"""<?php
-header('Content-Type: application/json');
+    $targetPath = $blobRoot . '/' . $target;
+    $targetAlt = blob_alternate_path($target);
+    if (file_exists($targetPath) || ($targetAlt !== null && file_exists($blobRoot . '/' . $targetAlt))) {
+        return [409, ['success' => false, 'error' => ['code' => 'TARGET_EXISTS', 'message' => 'Target already exists']]];
+    }
+    if (!ensure_dir(dirname($targetPath))) {
+        return [500, ['success' => false, 'error' => ['code' => 'SERVER_ERROR', 'message' => 'Failed to create target directory']]];
+    }
+    timing_mark('mkdir');
 
-$root = dirname(__DIR__, 2);
-$envPath = $root . '/.env';
+    $counted = !$move || $folder !== $fromFolder;
+    if ($counted && usage_update($cfg, $root, $folder, 1, $sizeBytes, $mime, true) === false) {
+        return quota_error();
+    }
+    timing_mark('usage');
+    $saved = $move ? @rename($sourcePath, $targetPath) : (@link($sourcePath, $targetPath) || @copy($sourcePath, $targetPath));
+    if (!$saved) {
+        if ($counted) { usage_update($cfg, $root, $folder, -1, -$sizeBytes, $mime); }
+        return [500, ['success' => false, 'error' => ['code' => 'SERVER_ERROR', 'message' => 'Failed to save file']]];
+    }
+    if ($move && $counted) { usage_update($cfg, $root, $fromFolder, -1, -$sizeBytes, $mime); }
+    foreach (['.br', '.gz'] as $suffix) {
+        if (!is_file($sourcePath . $suffix)) { continue; }
+        if ($move) { @rename($sourcePath . $suffix, $targetPath . $suffix); }
+        elseif (!@link($sourcePath . $suffix, $targetPath . $suffix)) { @copy($sourcePath . $suffix, $targetPath . $suffix); }
+    }
+    if ($move) { purge_variants($root, $from); }
+    timing_mark('move');
 
-function respond_json($statusCode, $payload) {
-    http_response_code($statusCode);
-    header('Content-Type: application/json');
-    echo json_encode($payload);
-    exit;
-}
+    $meta = array_merge($meta, ['path' => $target, 'url' => blob_url($cfg, $target), 'folder' => $folder]);
+    if (!save_meta($root, $folder, $storedName, $meta)) {
+        return [500, ['success' => false, 'error' => ['code' => 'SERVER_ERROR', 'message' => 'Failed to write metadata']]];
+    }
+    if ($move) { @unlink($root . '/meta/' . $from . '.json'); }
+    timing_mark('meta');
+    index_meta($cfg, $root, $folder, $storedName, $meta);
+    $sourceIndex = $move ? index_handle($cfg, $root, $fromFolder) : null;
+    if ($sourceIndex) { index_remove($sourceIndex, $fromName); }
+    timing_mark('index');
+    $events = $move ? [journal_event($cfg, 'delete', $from, $meta)] : [];
+    $events[] = journal_event($cfg, 'put', $target, $meta);
+    journal_append($cfg, $events);
 
-function load_config($envPath) {
-    $defaultPath = 'blob';
-    $env = @parse_ini_file($envPath);
-    $key = ($env && isset($env['HALAL_BLOB_KEY'])) ? trim($env['HALAL_BLOB_KEY']) : '';
-    $blobPath = ($env && isset($env['HALAL_BLOB_PATH'])) ? trim($env['HALAL_BLOB_PATH'], " \t\n\r\0\x0B/") : $defaultPath;
-    if ($blobPath === '' || !preg_match('/^[A-Za-z0-9_\-]+$/', $blobPath)) { $blobPath = $defaultPath; }
-    return ['key' => $key, 'blobPath' => $blobPath];
+    return blob_response($meta);
 }
 
-function require_auth($expectedKey) {
-    $headerKey = isset($_SERVER['HTTP_X_HALAL_BLOB_KEY']) ? trim($_SERVER['HTTP_X_HALAL_BLOB_KEY']) : '';
-    $getKey = isset($_GET['key']) ? $_GET['key'] : '';
-    $key = $headerKey !== '' ? $headerKey : $getKey;
-    if ($expectedKey === '' || $key === '' || $key !== $expectedKey) {
-        respond_json(403, ['success' => false, 'error' => ['code' => 'INVALID_KEY', 'message' => 'Forbidden']]);
+function transfer_item($cfg, $root, $item, $defaultFolder, $move) {
+    $from = isset($item['from']) && is_string($item['from']) ? clean_path($item['from']) : null;
+    if ($from === null) {
+        return [400, ['success' => false, 'error' => ['code' => 'PATH_INVALID', 'message' => 'Invalid source path']]];
+    }
+    $folder = $defaultFolder;
+    if (isset($item['folder'])) {
+        $folder = is_string($item['folder']) ? clean_folder($item['folder']) : null;
+        if ($folder === null) {
+            return [400, ['success' => false, 'error' => ['code' => 'FOLDER_INVALID', 'message' => 'Folder contains invalid characters']]];
+        }
+    }
+    $filename = null;
+    if (isset($item['filename'])) {
+        if (!is_string($item['filename']) || $item['filename'] === '') {
+            return [400, ['success' => false, 'error' => ['code' => 'NAME_INVALID', 'message' => 'Target filename is invalid or changes the extension']]];
+        }
+        $filename = $item['filename'];
     }
+    return transfer_blob($cfg, $root, $from, $folder, $filename, $move);
 }
 
 $cfg = load_config($envPath);
 require_auth($cfg['key']);
-
-$blobRoot = $root . '/' . $cfg['blobPath'];
-$metaRoot = $root . '/meta';
+list($cfg, $root) = select_storage($cfg, $root);
 
 $raw = file_get_contents('php://input');
 $data = json_decode($raw, true);
 if (!is_array($data)) {
     respond_json(400, ['success' => false, 'error' => ['code' => 'SERVER_ERROR', 'message' => 'Invalid JSON']]);
 }
+$move = isset($data['move']) && $data['move'] === true;
 
-$relativePath = '';
-if (isset($data['path']) && is_string($data['path'])) {
-    $relativePath = $data['path'];
-} elseif (isset($data['filename']) && is_string($data['filename'])) {
-    $relativePath = $data['filename'];
-} else {
-    respond_json(400, ['success' => false, 'error' => ['code' => 'SERVER_ERROR', 'message' => 'Missing path or filename']]);
+if (isset($data['items']) && is_array($data['items'])) {
+    if (count($data['items']) > 1000) {
+        respond_json(400, ['success' => false, 'error' => ['code' => 'BATCH_TOO_LARGE', 'message' => 'Batch exceeds maximum item count']]);
+    }
+    $defaultFolder = null;
+    if (isset($data['folder'])) {
+        $defaultFolder = is_string($data['folder']) ? clean_folder($data['folder']) : null;
+        if ($defaultFolder === null) {
+            respond_json(400, ['success' => false, 'error' => ['code' => 'FOLDER_INVALID', 'message' => 'Folder contains invalid characters']]);
+        }
+    }
+    $results = [];
+    $transferred = 0;
+    foreach (array_values($data['items']) as $item) {
+        $item = is_string($item) ? ['from' => $item] : $item;
+        list($status, $payload) = is_array($item)
+            ? transfer_item($cfg, $root, $item, $defaultFolder, $move)
+            : [400, ['success' => false, 'error' => ['code' => 'PATH_INVALID', 'message' => 'Invalid source path']]];
+        if ($status === 200) { $transferred++; }
+        $results[] = ['from' => is_array($item) && isset($item['from']) && is_string($item['from']) ? $item['from'] : null] + $payload;
+    }
+    respond_json(200, ['success' => $transferred === count($results), 'transferred' => $transferred, 'failed' => count($results) - $transferred, 'results' => $results]);
 }
 
-$relativePath = preg_replace('/[^A-Za-z0-9_\-\.\/]/', '', $relativePath);
-$relativePath = trim($relativePath, '/');
+list($status, $payload) = transfer_item($cfg, $root, $data, null, $move);
+respond_json($status, $payload);
+"""
+
+def download_php_content() -> str:
+    return r"""<?php
+require __DIR__ . '/_bootstrap.php';
 
-$fullPath = $blobRoot . '/' . $relativePath;
-if (!is_file($fullPath)) {
-    respond_json(404, ['success' => false, 'error' => ['code' => 'FILE_NOT_FOUND', 'message' => 'File not found']]);
+function byte_range($header, $size) {
+    if (!preg_match('/^bytes=(\d*)-(\d*)$/', trim($header), $m) || ($m[1] === '' && $m[2] === '')) { return null; }
+    if ($m[1] === '') {
+        $length = (int)$m[2];
+        return ($length > 0 && $size > 0) ? [max(0, $size - $length), $size - 1] : false;
+    }
+    $start = (int)$m[1];
+    if ($m[2] !== '' && (int)$m[2] < $start) { return null; }
+    $end = $m[2] === '' ? $size - 1 : min((int)$m[2], $size - 1);
+    return $start < $size ? [$start, $end] : false;
 }
 
-if (!unlink($fullPath)) {
-    respond_json(500, ['success' => false, 'error' => ['code' => 'DELETE_FAILED', 'message' => 'Failed to delete file']]);
+$cfg = load_config($envPath);
+$maxAge = 0;
+if (request_key() !== '') {
+    require_auth($cfg['key']);
+    $path = clean_path(isset($_GET['path']) ? $_GET['path'] : '');
+} else {
+    $claims = null;
+    $error = token_verify($cfg['key'], isset($_GET['token']) && is_string($_GET['token']) ? $_GET['token'] : '', 'download', $claims);
+    if ($error) {
+        respond_json($error[0], $error[1]);
+    }
+    $path = isset($claims['path']) && is_string($claims['path']) ? clean_path($claims['path']) : null;
+    $maxAge = max(0, $claims['exp'] - time());
+    timing_mark('auth');
+}
+if ($path === null || preg_match('#(^|/)\.#', $path)) {
+    respond_json(400, ['success' => false, 'error' => ['code' => 'PATH_INVALID', 'message' => 'Invalid path']]);
 }
 
-$metaFull = $metaRoot . '/' . $relativePath . '.json';
-if (is_file($metaFull)) { @unlink($metaFull); }
+$storageRoot = private_root($cfg, $root);
+$blobRoot = $storageRoot . '/' . $cfg['blobPath'];
+$fullPath = $blobRoot . '/' . $path;
+if (!is_file($fullPath)) {
+    $altPath = blob_alternate_path($path);
+    if ($altPath !== null && is_file($blobRoot . '/' . $altPath)) {
+        $path = $altPath;
+        $fullPath = $blobRoot . '/' . $path;
+    }
+}
+if (!is_file($fullPath)) {
+    respond_json(404, ['success' => false, 'error' => ['code' => 'FILE_NOT_FOUND', 'message' => 'File not found']]);
+}
 
-respond_json(200, ['success' => true]);
-"""
+$raw = @file_get_contents($storageRoot . '/meta/' . $path . '.json');
+$meta = $raw === false ? null : json_decode($raw, true);
+$mime = (is_array($meta) && isset($meta['mime_type']) && is_string($meta['mime_type'])) ? $meta['mime_type'] : null;
+if ($mime === null) {
+    $finfo = finfo_open(FILEINFO_MIME_TYPE);
+    $mime = finfo_file($finfo, $fullPath) ?: 'application/octet-stream';
+    finfo_close($finfo);
+}
+$size = (int)filesize($fullPath);
+$mtime = (int)filemtime($fullPath);
+$etag = '"' . dechex($size) . '-' . dechex($mtime) . '"';
+$lastModified = gmdate('D, d M Y H:i:s', $mtime) . ' GMT';
+timing_mark('stat');
 
-def list_php_content() -> str:
-    return r"""<?php
-header('Content-Type: application/json');
+header('Content-Type: ' . $mime);
+header('ETag: ' . $etag);
+header('Last-Modified: ' . $lastModified);
+header('Cache-Control: private, ' . ($maxAge > 0 ? ('max-age=' . $maxAge) : 'no-cache'));
+header('Accept-Ranges: bytes');
+header('X-Content-Type-Options: nosniff');
 
-$root = dirname(__DIR__, 2);
-$envPath = $root . '/.env';
+$ifNoneMatch = isset($_SERVER['HTTP_IF_NONE_MATCH']) ? trim($_SERVER['HTTP_IF_NONE_MATCH']) : '';
+$ifModifiedSince = isset($_SERVER['HTTP_IF_MODIFIED_SINCE']) ? strtotime($_SERVER['HTTP_IF_MODIFIED_SINCE']) : false;
+if ($ifNoneMatch !== '' ? etag_matches($ifNoneMatch, $etag) : ($ifModifiedSince !== false && $ifModifiedSince >= $mtime)) {
+    respond_not_modified();
+}
 
-function respond_json($statusCode, $payload) {
-    http_response_code($statusCode);
-    header('Content-Type: application/json');
-    echo json_encode($payload);
+$sendfile = $cfg['sendfile'];
+if ($sendfile === 'auto') {
+    $sendfile = (function_exists('apache_get_modules') && in_array('mod_xsendfile', apache_get_modules(), true)) ? 'apache' : 'off';
+}
+if ($sendfile !== 'off') {
+    header($sendfile === 'nginx' ? ('X-Accel-Redirect: ' . $cfg['accelPrefix'] . '/' . $cfg['blobPath'] . '/' . $path) : ('X-Sendfile: ' . $fullPath));
+    timing_header();
+    timing_log(200, 0);
     exit;
 }
 
-function load_config($envPath) {
-    $defaultPath = 'blob';
-    $env = @parse_ini_file($envPath);
-    $key = ($env && isset($env['HALAL_BLOB_KEY'])) ? trim($env['HALAL_BLOB_KEY']) : '';
-    $baseUrl = ($env && isset($env['HALAL_BLOB_BASE_URL'])) ? rtrim(trim($env['HALAL_BLOB_BASE_URL']), '/') : '';
-    $blobPath = ($env && isset($env['HALAL_BLOB_PATH'])) ? trim($env['HALAL_BLOB_PATH'], " \t\n\r\0\x0B/") : $defaultPath;
-    if ($blobPath === '' || !preg_match('/^[A-Za-z0-9_\-]+$/', $blobPath)) { $blobPath = $defaultPath; }
-    return ['key' => $key, 'baseUrl' => $baseUrl, 'blobPath' => $blobPath];
+$status = 200;
+$start = 0;
+$end = $size - 1;
+$ifRange = isset($_SERVER['HTTP_IF_RANGE']) ? trim($_SERVER['HTTP_IF_RANGE']) : '';
+if (isset($_SERVER['HTTP_RANGE']) && ($ifRange === '' || $ifRange === $etag || $ifRange === $lastModified)) {
+    $range = byte_range($_SERVER['HTTP_RANGE'], $size);
+    if ($range === false) {
+        header('Content-Range: bytes */' . $size);
+        respond_json(416, ['success' => false, 'error' => ['code' => 'RANGE_INVALID', 'message' => 'Requested range not satisfiable']]);
+    }
+    if ($range !== null) {
+        list($start, $end) = $range;
+        $status = 206;
+    }
 }
 
-function require_auth($expectedKey) {
-    $headerKey = isset($_SERVER['HTTP_X_HALAL_BLOB_KEY']) ? trim($_SERVER['HTTP_X_HALAL_BLOB_KEY']) : '';
-    $getKey = isset($_GET['key']) ? $_GET['key'] : '';
-    $key = $headerKey !== '' ? $headerKey : $getKey;
-    if ($expectedKey === '' || $key === '' || $key !== $expectedKey) {
-        respond_json(403, ['success' => false, 'error' => ['code' => 'INVALID_KEY', 'message' => 'Forbidden']]);
+$handle = fopen($fullPath, 'rb');
+if ($handle === false || fseek($handle, $start) !== 0) {
+    respond_json(500, ['success' => false, 'error' => ['code' => 'SERVER_ERROR', 'message' => 'Failed to open file']]);
+}
+$length = $end - $start + 1;
+http_response_code($status);
+header('Content-Length: ' . $length);
+if ($status === 206) { header('Content-Range: bytes ' . $start . '-' . $end . '/' . $size); }
+timing_header();
+
+$sent = 0;
+if (!isset($_SERVER['REQUEST_METHOD']) || $_SERVER['REQUEST_METHOD'] !== 'HEAD') {
+    @set_time_limit(0);
+    while (ob_get_level() > 0) { ob_end_clean(); }
+    while ($sent < $length && !connection_aborted()) {
+        $chunk = fread($handle, min(1048576, $length - $sent));
+        if ($chunk === false || $chunk === '') { break; }
+        echo $chunk;
+        flush();
+        $sent += strlen($chunk);
     }
 }
+fclose($handle);
+timing_log($status, $sent);
+"""
+
+def list_php_content() -> str:
+    return r"""<?php
+require __DIR__ . '/_bootstrap.php';
 
 $cfg = load_config($envPath);
 require_auth($cfg['key']);
+list($cfg, $root) = select_storage($cfg, $root);
 
 $blobRoot = $root . '/' . $cfg['blobPath'];
 $metaRoot = $root . '/meta';
 
-$folder = isset($_GET['folder']) ? $_GET['folder'] : '';
-$folder = trim($folder);
-if ($folder !== '' && !preg_match('/^[A-Za-z0-9_\-\/]*$/', $folder)) {
+$folder = clean_folder(isset($_GET['folder']) ? $_GET['folder'] : '');
+if ($folder === null) {
     respond_json(400, ['success' => false, 'error' => ['code' => 'FOLDER_INVALID', 'message' => 'Invalid folder']]);
 }
-$folder = trim($folder, '/');
 
 $page = isset($_GET['page']) ? (int)$_GET['page'] : 1;
 $perPage = isset($_GET['per_page']) ? (int)$_GET['per_page'] : 50;
@@ -274,74 +1989,220 @@ if (!is_dir($dir)) {
     respond_json(400, ['success' => false, 'error' => ['code' => 'FOLDER_INVALID', 'message' => 'Folder not found']]);
 }
 
-$entries = scandir($dir);
-$files = [];
-foreach ($entries as $name) {
-    if ($name === '.' || $name === '..') { continue; }
-    $full = $dir . '/' . $name;
-    if (!is_file($full)) { continue; }
-    $relativePath = ($folder ? ($folder . '/') : '') . $name;
-    $baseUrl = $cfg['baseUrl'] ?: ('https://' . $_SERVER['HTTP_HOST']);
-    $url = $baseUrl . '/' . $cfg['blobPath'] . '/' . $relativePath;
-    $metaPath = $metaRoot . '/' . $relativePath . '.json';
-    $meta = null;
-    if (is_file($metaPath)) {
-        $raw = @file_get_contents($metaPath);
+$after = null;
+if (isset($_GET['cursor']) && $_GET['cursor'] !== '') {
+    $after = cursor_decode((string)$_GET['cursor']);
+    if ($after === null) {
+        respond_json(400, ['success' => false, 'error' => ['code' => 'CURSOR_INVALID', 'message' => 'Invalid cursor']]);
+    }
+} elseif (isset($_GET['after']) && $_GET['after'] !== '') {
+    $prefix = $folder ? ($folder . '/') : '';
+    $afterPath = (string)$_GET['after'];
+    if (strncmp($afterPath, $prefix, strlen($prefix)) !== 0 || strlen($afterPath) === strlen($prefix)) {
+        respond_json(400, ['success' => false, 'error' => ['code' => 'CURSOR_INVALID', 'message' => 'after must be a path inside the folder']]);
+    }
+    $after = substr($afterPath, strlen($prefix));
+}
+$withFolders = isset($_GET['folders']) && filter_var($_GET['folders'], FILTER_VALIDATE_BOOLEAN);
+$offset = $after === null ? ($page - 1) * $perPage : 0;
+$metaDir = $metaRoot . ($folder ? ('/' . $folder) : '');
+
+$etag = null;
+$cacheFile = null;
+$indexStamp = @filemtime($metaDir . '/.index.sqlite');
+$dirStamp = @filemtime($dir);
+if ($cfg['journal'] || max((int)$indexStamp, (int)$dirStamp) < time() - 1) {
+    $etag = '"' . substr(sha1(implode('|', [
+        $cfg['envStamp'],
+        blob_url($cfg, ''),
+        $cfg['journal'] ? journal_head(journal_dir()) : '',
+        $indexStamp,
+        $dirStamp,
+        $folder, $page, $perPage, (string)$after, (int)$withFolders,
+    ])), 0, 20) . '"';
+    header('ETag: ' . $etag);
+    header('Cache-Control: private, no-cache');
+    timing_mark('validate');
+    if (isset($_SERVER['HTTP_IF_NONE_MATCH']) && etag_matches($_SERVER['HTTP_IF_NONE_MATCH'], $etag)) {
+        respond_not_modified();
+    }
+    if ($cfg['listCacheSeconds'] > 0) {
+        $cacheDir = $metaRoot . '/.cache';
+        $cacheFile = $cacheDir . '/list-' . sha1($folder . '|' . $page . '|' . $perPage . '|' . $after . '|' . (int)$withFolders) . '.json';
+        $cached = @file_get_contents($cacheFile);
+        if ($cached !== false && strncmp($cached, $etag . "\n", strlen($etag) + 1) === 0 && @filemtime($cacheFile) > time() - $cfg['listCacheSeconds']) {
+            timing_mark('cache');
+            respond_body(200, substr($cached, strlen($etag) + 1));
+        }
+    }
+}
+
+$rows = [];
+$index = index_open($metaDir, $dir);
+if ($index) {
+    if ($after === null) {
+        $stmt = $index->prepare('SELECT name, meta FROM files ORDER BY name LIMIT ? OFFSET ?');
+        $stmt->execute([$perPage + 1, $offset]);
+    } else {
+        $stmt = $index->prepare('SELECT name, meta FROM files WHERE name > ? ORDER BY name LIMIT ?');
+        $stmt->execute([$after, $perPage + 1]);
+    }
+    foreach ($stmt->fetchAll(PDO::FETCH_ASSOC) as $row) {
+        $dec = $row['meta'] === null ? null : json_decode($row['meta'], true);
+        $rows[] = ['name' => $row['name'], 'meta' => is_array($dec) ? $dec : null];
+    }
+    $total = (int)$index->query('SELECT total FROM state WHERE id = 1')->fetchColumn();
+    timing_mark('query');
+} else {
+    $names = blob_scan($dir);
+    sort($names, SORT_STRING);
+    timing_mark('scan');
+    $total = count($names);
+    if ($after !== null) {
+        $names = array_values(array_filter($names, function($n) use ($after) { return strcmp($n, $after) > 0; }));
+    }
+    foreach (array_slice($names, $offset, $perPage + 1) as $name) {
+        $meta = null;
+        $raw = @file_get_contents($metaDir . '/' . $name . '.json');
         if ($raw !== false) {
             $dec = json_decode($raw, true);
             if (is_array($dec)) { $meta = $dec; }
         }
+        $rows[] = ['name' => $name, 'meta' => $meta];
     }
-    $files[] = ['path' => $relativePath, 'url' => $url, 'meta' => $meta];
+    timing_mark('meta');
 }
 
-usort($files, function($a, $b) { return strcmp($a['path'], $b['path']); });
-$total = count($files);
-$offset = ($page - 1) * $perPage;
-if ($offset < 0) { $offset = 0; }
-$paged = array_slice($files, $offset, $perPage);
+$hasMore = count($rows) > $perPage;
+$rows = array_slice($rows, 0, $perPage);
+$paged = [];
+foreach ($rows as $row) {
+    $relativePath = ($folder ? ($folder . '/') : '') . $row['name'];
+    $paged[] = ['path' => $relativePath, 'url' => blob_url($cfg, $relativePath), 'meta' => $row['meta']];
+}
+$nextCursor = ($hasMore && $rows) ? cursor_encode($rows[count($rows) - 1]['name']) : null;
 
-respond_json(200, [
+$payload = [
     'success' => true,
     'folder' => $folder,
     'page' => $page,
     'per_page' => $perPage,
     'total' => $total,
     'files' => $paged,
+    'next_cursor' => $nextCursor,
+];
+if ($withFolders) {
+    $payload['folders'] = blob_subfolders($dir, $folder, $metaDir);
+    timing_mark('folders');
+}
+$body = json_encode($payload);
+timing_mark('encode');
+if ($cacheFile !== null && (is_dir($cacheDir) || (@mkdir($cacheDir, 0755, true) && @file_put_contents($cacheDir . '/.htaccess', "Require all denied\n") !== false))) {
+    $tmp = $cacheFile . '.' . getmypid() . '.tmp';
+    if (@file_put_contents($tmp, $etag . "\n" . $body) === false || !@rename($tmp, $cacheFile)) { @unlink($tmp); }
+    if (mt_rand(1, 100) === 1) {
+        foreach ((array)glob($cacheDir . '/list-*.json') as $stale) {
+            if (@filemtime($stale) <= time() - $cfg['listCacheSeconds']) { @unlink($stale); }
+        }
+    }
+}
+respond_body(200, $body);
+"""
+
+def stats_php_content() -> str:
+    return r"""<?php
+require __DIR__ . '/_bootstrap.php';
+
+$cfg = load_config($envPath);
+require_auth($cfg['key']);
+list($cfg, $root) = select_storage($cfg, $root);
+
+$folder = clean_folder(isset($_GET['folder']) ? $_GET['folder'] : '');
+if ($folder === null) {
+    respond_json(400, ['success' => false, 'error' => ['code' => 'FOLDER_INVALID', 'message' => 'Invalid folder']]);
+}
+if (!is_dir($root . '/' . $cfg['blobPath'] . ($folder ? ('/' . $folder) : ''))) {
+    respond_json(400, ['success' => false, 'error' => ['code' => 'FOLDER_INVALID', 'message' => 'Folder not found']]);
+}
+
+$usage = usage_update($cfg, $root, $folder, 0, 0, null);
+timing_mark('usage');
+if (!is_array($usage)) {
+    respond_json(500, ['success' => false, 'error' => ['code' => 'SERVER_ERROR', 'message' => 'Failed to read usage counters']]);
+}
+
+respond_json(200, [
+    'success' => true,
+    'folder' => $folder,
+    'files' => $usage['files'],
+    'bytes' => $usage['bytes'],
+    'by_mime' => (object)$usage['mime'],
+    'quota_bytes' => quota_for($cfg, $folder),
 ]);
 """
 
-def ping_php_content() -> str:
+def changes_php_content() -> str:
     return r"""<?php
-header('Content-Type: application/json');
+require __DIR__ . '/_bootstrap.php';
 
-$root = dirname(__DIR__, 2);
-$envPath = $root . '/.env';
+$cfg = load_config($envPath);
+require_auth($cfg['key']);
 
-function respond_json($statusCode, $payload) {
-    http_response_code($statusCode);
-    header('Content-Type: application/json');
-    echo json_encode($payload);
-    exit;
+$since = isset($_GET['since']) && $_GET['since'] !== '' ? (string)$_GET['since'] : '0';
+if (!preg_match('/^\d{1,15}$/', $since)) {
+    respond_json(400, ['success' => false, 'error' => ['code' => 'CURSOR_INVALID', 'message' => 'Invalid cursor']]);
 }
+$since = (int)$since;
+$limit = isset($_GET['limit']) ? (int)$_GET['limit'] : 500;
+if ($limit < 1) { $limit = 500; }
+$limit = min($limit, 1000);
 
-function load_config($envPath) {
-    $defaultPath = 'blob';
-    $env = @parse_ini_file($envPath);
-    $key = ($env && isset($env['HALAL_BLOB_KEY'])) ? trim($env['HALAL_BLOB_KEY']) : '';
-    $blobPath = ($env && isset($env['HALAL_BLOB_PATH'])) ? trim($env['HALAL_BLOB_PATH'], " \t\n\r\0\x0B/") : $defaultPath;
-    if ($blobPath === '' || !preg_match('/^[A-Za-z0-9_\-]+$/', $blobPath)) { $blobPath = $defaultPath; }
-    return ['key' => $key, 'blobPath' => $blobPath];
+$dir = journal_dir();
+$head = journal_head($dir);
+$segments = journal_segments($dir);
+timing_mark('head');
+$expired = [410, ['success' => false, 'error' => ['code' => 'CURSOR_EXPIRED', 'message' => 'Cursor is outside the retained journal; re-list and resume from head'], 'head' => $head]];
+if ($since > $head || ($since < $head && (!$segments || $since + 1 < $segments[0]))) {
+    respond_json($expired[0], $expired[1]);
 }
 
-function require_auth($expectedKey) {
-    $headerKey = isset($_SERVER['HTTP_X_HALAL_BLOB_KEY']) ? trim($_SERVER['HTTP_X_HALAL_BLOB_KEY']) : '';
-    $getKey = isset($_GET['key']) ? $_GET['key'] : '';
-    $key = $headerKey !== '' ? $headerKey : $getKey;
-    if ($expectedKey === '' || $key === '' || $key !== $expectedKey) {
-        respond_json(403, ['success' => false, 'error' => ['code' => 'INVALID_KEY', 'message' => 'Forbidden']]);
+$first = 0;
+foreach ($segments as $i => $start) {
+    if ($start <= $since + 1) { $first = $i; }
+}
+$changes = [];
+$last = $since;
+foreach (array_slice($segments, $first) as $start) {
+    if ($last >= $head || count($changes) >= $limit) { break; }
+    $fh = @fopen(journal_segment_path($dir, $start), 'rb');
+    if ($fh === false) {
+        if (!$changes) { respond_json($expired[0], $expired[1]); }
+        break;
     }
+    while (count($changes) < $limit && ($line = fgets($fh)) !== false) {
+        $event = json_decode($line, true);
+        if (!is_array($event) || !isset($event['seq']) || !is_int($event['seq']) || $event['seq'] <= $since) { continue; }
+        if ($event['seq'] > $head) { break; }
+        $changes[] = $event;
+        $last = $event['seq'];
+    }
+    fclose($fh);
 }
+timing_mark('read');
+
+respond_json(200, [
+    'success' => true,
+    'since' => $since,
+    'next_since' => $last,
+    'head' => $head,
+    'has_more' => $last < $head,
+    'changes' => $changes,
+]);
+"""
+
+def ping_php_content() -> str:
+    return r"""<?php
+require __DIR__ . '/_bootstrap.php';
 
 $cfg = load_config($envPath);
 require_auth($cfg['key']);
@@ -355,13 +2216,33 @@ respond_json(200, [
 ]);
 """
 
-def env_template_content() -> str:
+def env_template_content(serving_profile: str = "standard") -> str:
     return (
         "HALAL_BLOB_KEY=\"REPLACE_WITH_A_RANDOM_64_CHAR_SECRET\"\n"
         "HALAL_BLOB_BASE_URL=\"https://blob.yourdomain.com\"\n"
         "HALAL_BLOB_MAX_MB=\"5\"\n"
+        "HALAL_BLOB_CHUNKED_MAX_MB=\"512\"\n"
+        "HALAL_BLOB_CHUNK_MB=\"5\"\n"
         "HALAL_BLOB_ALLOWED_EXT=\"jpg,jpeg,png,webp,gif\"\n"
         "HALAL_BLOB_PATH=\"blob\"\n"
+        "HALAL_BLOB_LAYOUT=\"flat\"\n"
+        "HALAL_BLOB_DEDUP=\"false\"\n"
+        "HALAL_BLOB_VARIANT_PRESETS=\"320x75,640x80,1280x80\"\n"
+        f"HALAL_BLOB_PRECOMPRESS=\"{'true' if serving_profile == 'performance' else 'false'}\"\n"
+        "HALAL_BLOB_QUOTAS=\"\"\n"
+        "HALAL_BLOB_SERVER_TIMING=\"true\"\n"
+        "HALAL_BLOB_ACCESS_LOG=\"false\"\n"
+        "HALAL_BLOB_BATCH_MAX_MB=\"20\"\n"
+        "HALAL_BLOB_BATCH_MAX_FILES=\"20\"\n"
+        "HALAL_BLOB_DELETE_BUDGET_MS=\"5000\"\n"
+        "HALAL_BLOB_CORS_ORIGINS=\"\"\n"
+        "HALAL_BLOB_PRIVATE_PATH=\"private\"\n"
+        "HALAL_BLOB_SENDFILE=\"auto\"\n"
+        "HALAL_BLOB_ACCEL_PREFIX=\"/_halal_private\"\n"
+        "HALAL_BLOB_JOURNAL=\"true\"\n"
+        "HALAL_BLOB_JOURNAL_SEGMENT_KB=\"1024\"\n"
+        "HALAL_BLOB_JOURNAL_RETAIN_DAYS=\"30\"\n"
+        "HALAL_BLOB_LIST_CACHE_SECONDS=\"30\"\n"
     )
 
 def howto_txt_content() -> str:
@@ -374,11 +2255,46 @@ def howto_txt_content() -> str:
         "  (NOTE: In cPanel File Manager, click 'Settings' (top right) -> Check 'Show Hidden Files' to see .env!)\n"
         "- Edit .env: Set HALAL_BLOB_KEY (random string) and HALAL_BLOB_BASE_URL.\n"
         "- Optional: Set HALAL_BLOB_PATH to customize the storage/API path (default is 'blob').\n"
-        "  (NOTE: If you change this, you must rename the 'blob' and 'api/blob' folders accordingly!)\n\n"
+        "  (NOTE: If you change this, you must rename the 'blob' and 'api/blob' folders accordingly!)\n"
+        "- Optional: Set HALAL_BLOB_ALLOWED_EXT (default jpg,jpeg,png,webp,gif). It also accepts mp4, webm, mov, mp3 and pdf (e.g. for\n"
+        "  upload_init.php chunked uploads) and json, txt, csv; every upload path sniffs the content and rejects types not enabled here.\n"
+        "- Optional: Set HALAL_BLOB_LAYOUT=\"sharded\" to store files as blob/<folder>/ab/cd/<name> (recommended for busy folders).\n"
+        "  Existing flat files can be moved with: python tools/migrate_layout.py (run from this folder; old URLs keep working).\n"
+        "- Optional: Set HALAL_BLOB_DEDUP=\"true\" to store identical uploads once (files are named by their SHA-256).\n"
+        "- Optional: Set HALAL_BLOB_VARIANT_PRESETS to the allowed <width>x<quality> image variants (needs GD or Imagick).\n"
+        "  Variants are cached under variants/ and served as static files; if you renamed api/blob, edit variants/.htaccess to match.\n"
+        "- Optional: Set HALAL_BLOB_QUOTAS to per-folder limits in MB, e.g. \"images=500,videos=2048,*=1024\" ('*' applies to every other folder).\n"
+        "  Usage per folder is tracked incrementally and returned by api/blob/stats.php.\n"
+        "- HALAL_BLOB_SERVER_TIMING adds a Server-Timing header with per-phase timings to API responses (set \"false\" to hide it).\n"
+        "- Optional: Set HALAL_BLOB_ACCESS_LOG=\"true\" to append one JSON line per request to meta/.logs/access-YYYYMMDD.ndjson.\n"
+        "- HALAL_BLOB_BATCH_MAX_MB / HALAL_BLOB_BATCH_MAX_FILES cap one multi-file upload (file[] fields in upload.php).\n"
+        "  Keep them within PHP's post_max_size and max_file_uploads, which silently drop larger requests.\n"
+        "- HALAL_BLOB_DELETE_BUDGET_MS bounds one folder delete pass in delete.php; larger folders return a cursor to continue with.\n"
+        "- HALAL_BLOB_CORS_ORIGINS lists the sites (e.g. https://app.example.com) whose browsers may POST to upload.php with an SDK-minted upload token.\n"
+        "- HALAL_BLOB_PRIVATE_PATH is where private uploads (?private=1 or a private upload token) are stored; they are only served by\n"
+        "  api/blob/download.php with an SDK-signed URL. The default 'private' folder ships with a deny-all .htaccess; on nginx, or to\n"
+        "  keep files out of public_html entirely, set an absolute path outside the web root (e.g. /home/user/halal-private).\n"
+        "- HALAL_BLOB_SENDFILE hands private downloads to the web server: 'auto' uses X-Sendfile when Apache has mod_xsendfile\n"
+        "  (add: XSendFilePath <private path>), 'nginx' sends X-Accel-Redirect to HALAL_BLOB_ACCEL_PREFIX, which needs\n"
+        "  location /_halal_private/ { internal; alias <private path>/; }  and 'off' always streams from PHP.\n"
+        "- HALAL_BLOB_JOURNAL records every upload, delete, copy and move in meta/.journal/ for api/blob/changes.php, so indexers and\n"
+        "  CDN purgers can sync incrementally. Segments rotate at HALAL_BLOB_JOURNAL_SEGMENT_KB and are compacted to the latest event per\n"
+        "  path; segments older than HALAL_BLOB_JOURNAL_RETAIN_DAYS (0 keeps them all) are dropped, and older cursors must re-list.\n"
+        "- api/blob/list.php answers with an ETag and 304 Not Modified when nothing changed, and keeps the rendered page in meta/.cache/\n"
+        "  for HALAL_BLOB_LIST_CACHE_SECONDS (0 turns that body cache off). The ETag covers the folder and index modification times,\n"
+        "  plus the journal head when HALAL_BLOB_JOURNAL is on; without the journal a folder changed in the last second is not validated.\n"
+        "- HALAL_BLOB_PRECOMPRESS=\"true\" is set by the 'performance' serving profile; it makes upload.php write .gz/.br copies of\n"
+        "  json, txt and csv uploads. Those types are off by default; add them to HALAL_BLOB_ALLOWED_EXT to accept them.\n"
+        "- The 'performance' profile caches generated names (32-hex random, 64-hex SHA-256) in blob/ and variants/ as immutable for a year;\n"
+        "  names chosen through copy/move 'filename' can be reused after a delete, so they get 'no-cache' and revalidate by ETag.\n\n"
         "3) Usage\n"
         "- Use the SDK (sdk/node/halalBlobClient.ts) in your App.\n"
         "- Pass env vars: HALAL_BLOB_KEY, HALAL_BLOB_BASE_URL.\n"
-        "- If you customized HALAL_BLOB_PATH, pass it to the client options as 'blobPath'.\n"
+        "- If you customized HALAL_BLOB_PATH, pass it to the client options as 'blobPath'.\n\n"
+        "4) Maintenance\n"
+        "- Check blob/ against meta/: python tools/blob_fsck.py scan --plan plan.ndjson (works on a downloaded copy too).\n"
+        "- Review the plan, then repair with: python tools/blob_fsck.py apply plan.ndjson\n"
+        "- Summarize access logs (p50/p95/p99 per endpoint and phase): python tools/analyze_logs.py meta/.logs/access-*.ndjson\n"
     )
 
 def api_htaccess_content() -> str:
@@ -387,13 +2303,108 @@ def api_htaccess_content() -> str:
         "<FilesMatch \\.(env|ini)$>\n"
         "  Require all denied\n"
         "</FilesMatch>\n"
+        "<FilesMatch ^_>\n"
+        "  Require all denied\n"
+        "</FilesMatch>\n"
+    )
+
+SERVING_PROFILES = ("standard", "performance")
+
+def blob_htaccess_content(serving_profile: str = "standard") -> str:
+    content = (
+        "Options -Indexes\n"
+        "<FilesMatch \\.(php)$>\n"
+        "  Require all denied\n"
+        "</FilesMatch>\n"
+    )
+    if serving_profile == "performance":
+        content += (
+            "FileETag MTime Size\n"
+            "<IfModule mod_mime.c>\n"
+            "  AddType image/webp .webp\n"
+            "  AddType video/mp4 .mp4\n"
+            "  AddType video/webm .webm\n"
+            "  AddType video/quicktime .mov\n"
+            "  AddType audio/mpeg .mp3\n"
+            "  AddType application/pdf .pdf\n"
+            "</IfModule>\n"
+            "<IfModule mod_rewrite.c>\n"
+            "  RewriteEngine On\n"
+            "  RewriteCond %{HTTP:Accept-Encoding} br\n"
+            "  RewriteCond %{REQUEST_FILENAME}.br -f\n"
+            "  RewriteRule ^(.+\\.(json|txt|csv))$ $1.br [L]\n"
+            "  RewriteCond %{HTTP:Accept-Encoding} gzip\n"
+            "  RewriteCond %{REQUEST_FILENAME}.gz -f\n"
+            "  RewriteRule ^(.+\\.(json|txt|csv))$ $1.gz [L]\n"
+            "  RewriteRule \\.(br|gz)$ - [E=no-gzip:1,E=no-brotli:1]\n"
+            "</IfModule>\n"
+            "<FilesMatch \\.json(\\.(br|gz))?$>\n"
+            "  ForceType application/json\n"
+            "</FilesMatch>\n"
+            "<FilesMatch \\.(txt|csv)(\\.(br|gz))?$>\n"
+            "  ForceType text/plain\n"
+            "</FilesMatch>\n"
+            "<IfModule mod_headers.c>\n"
+            "  Header set Cache-Control \"public, no-cache\"\n"
+            "  <FilesMatch ^[0-9a-f]{32}([0-9a-f]{32})?(\\.[A-Za-z0-9]+)*$>\n"
+            "    Header set Cache-Control \"public, max-age=31536000, immutable\"\n"
+            "  </FilesMatch>\n"
+            "  Header set X-Content-Type-Options nosniff\n"
+            "  <FilesMatch \\.(json|txt|csv)(\\.(br|gz))?$>\n"
+            "    Header append Vary Accept-Encoding\n"
+            "  </FilesMatch>\n"
+            "  <FilesMatch \\.br$>\n"
+            "    Header set Content-Encoding br\n"
+            "  </FilesMatch>\n"
+            "  <FilesMatch \\.gz$>\n"
+            "    Header set Content-Encoding gzip\n"
+            "  </FilesMatch>\n"
+            "</IfModule>\n"
+        )
+    return content + (
+        "<IfModule mod_rewrite.c>\n"
+        "  RewriteEngine On\n"
+        "  RewriteCond %{ENV:REDIRECT_STATUS} ^$\n"
+        "  RewriteCond %{REQUEST_FILENAME} !-f\n"
+        "  RewriteRule ^(.*/)?(([0-9a-f]{2})([0-9a-f]{2})[0-9a-f]{28}([0-9a-f]{32})?(\\.[A-Za-z0-9]+)?)$ $1$3/$4/$2 [L]\n"
+        "</IfModule>\n"
     )
 
-def blob_htaccess_content() -> str:
+def variants_htaccess_content() -> str:
     return (
         "Options -Indexes\n"
         "<FilesMatch \\.(php)$>\n"
         "  Require all denied\n"
         "</FilesMatch>\n"
+        "<IfModule mod_rewrite.c>\n"
+        "  RewriteEngine On\n"
+        "  RewriteCond %{REQUEST_FILENAME} !-f\n"
+        "  RewriteRule ^(w[0-9]+q[0-9]+/.+)$ /api/blob/variant.php?v=$1 [L,QSA]\n"
+        "</IfModule>\n"
+        "<IfModule mod_headers.c>\n"
+        "  Header set Cache-Control \"public, no-cache\"\n"
+        "  <FilesMatch ^[0-9a-f]{32}([0-9a-f]{32})?(\\.[A-Za-z0-9]+)*$>\n"
+        "    Header set Cache-Control \"public, max-age=31536000, immutable\"\n"
+        "  </FilesMatch>\n"
+        "</IfModule>\n"
+    )
+
+def tools_htaccess_content() -> str:
+    return (
+        "Require all denied\n"
+    )
+
+def private_htaccess_content() -> str:
+    return (
+        "Require all denied\n"
     )
 
+def migrate_layout_py_content() -> str:
+    return (Path(__file__).resolve().parent / "tools" / "migrate_layout.py").read_text(encoding="utf-8")
+
+def blob_fsck_py_content() -> str:
+    return (Path(__file__).resolve().parent / "tools" / "blob_fsck.py").read_text(encoding="utf-8")
+
+def analyze_logs_py_content() -> str:
+    return (Path(__file__).resolve().parent / "tools" / "analyze_logs.py").read_text(encoding="utf-8")
+
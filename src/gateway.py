@@ -0,0 +1,1915 @@
+"""Pure-Python reference implementation of the Halal Blob gateway.
+
+Speaks the protocol of the generated `ping.php`, `upload.php`, `list.php`,
+`delete.php`, `copy.php`, `download.php` and `changes.php` over the same `.env` keys
+and the same `blob/` + `meta/` tree (sidecars, `.index.sqlite`, `.usage.json`, the
+change journal, the private tree), so one folder can be served by either. Uploads
+are parsed as a stream straight to disk; `blob/` and signed private downloads
+(Range included) are served with `sendfile`.
+
+    python build_halal_custom_blob_setup.py --serve /srv/halal-blob --port 8080
+
+Content-addressed dedup (HALAL_BLOB_DEDUP), chunked uploads and image variants stay
+PHP-only; the server refuses to start on a dedup tree.
+"""
+
+from datetime import datetime, timezone
+from email.utils import formatdate, parsedate_to_datetime
+from http import HTTPStatus
+from pathlib import Path
+from typing import Optional
+from urllib.parse import parse_qs, unquote, urlsplit
+import asyncio
+import base64
+import fcntl
+import gzip
+import hashlib
+import hmac
+import json
+import os
+import platform
+import re
+import secrets
+import shutil
+import sqlite3
+import time
+import traceback
+import zlib
+
+CHUNK_BYTES = 65536
+MAX_HEADER_BYTES = 16384
+MAX_FIELD_BYTES = 65536
+MAX_DELETE_PATHS = 1000
+MAX_TRANSFER_ITEMS = 1000
+MIME_MAP = {
+    "jpg": "image/jpeg",
+    "jpeg": "image/jpeg",
+    "png": "image/png",
+    "webp": "image/webp",
+    "gif": "image/gif",
+    "mp4": "video/mp4",
+    "webm": "video/webm",
+    "mov": "video/quicktime",
+    "mp3": "audio/mpeg",
+    "pdf": "application/pdf",
+    "json": "application/json",
+    "txt": "text/plain",
+    "csv": "text/csv",
+}
+TEXT_MIMES = {"json": ("text/plain",), "csv": ("text/plain", "application/csv")}
+STATIC_TYPES = dict(MIME_MAP, svg="image/svg+xml")
+COMPRESSIBLE = ("application/json", "text/plain", "text/csv")
+MAGIC = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"%PDF-", "application/pdf"),
+    (b"\x1a\x45\xdf\xa3", "video/webm"),
+    (b"ID3", "audio/mpeg"),
+    (b"\xff\xfb", "audio/mpeg"),
+)
+SHARDED_PATH = re.compile(r"^(?:(.*)/)?([0-9a-f]{2})/([0-9a-f]{2})/(\2\3[^/]*)$")
+
+
+class HttpError(Exception):
+    pass
+
+
+def php_json(payload, pretty: bool = False) -> str:
+    """Encode like PHP's json_encode: escaped slashes, ASCII-only, no spaces unless pretty."""
+    if pretty:
+        text = json.dumps(payload, indent=4)
+    else:
+        text = json.dumps(payload, separators=(",", ":"))
+    return text.replace("/", "\\/")
+
+
+def php_int(value) -> int:
+    match = re.match(r"\s*[+-]?\d+", value or "")
+    return int(match.group()) if match else 0
+
+
+def php_bool(value: Optional[str], default: bool) -> bool:
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "on", "yes")
+
+
+def php_number(value: Optional[str], default: float) -> float:
+    try:
+        return float(value) if value is not None else default
+    except ValueError:
+        return default
+
+
+def error(status: int, code: str, message: str) -> tuple:
+    return status, {"success": False, "error": {"code": code, "message": message}}
+
+
+def read_env(env_path: Path) -> dict:
+    env = {}
+    if not env_path.is_file():
+        return env
+    for line in env_path.read_text(encoding="utf-8").splitlines():
+        line = line.strip()
+        if not line or line.startswith((";", "#", "[")) or "=" not in line:
+            continue
+        key, value = line.split("=", 1)
+        value = value.strip()
+        if len(value) >= 2 and value[0] == value[-1] and value[0] in "\"'":
+            value = value[1:-1]
+        env[key.strip()] = value
+    return env
+
+
+def compile_config(env_path: Path) -> dict:
+    env = read_env(env_path)
+    allowed = env.get("HALAL_BLOB_ALLOWED_EXT") or "jpg,jpeg,png,webp,gif"
+    blob_path = env.get("HALAL_BLOB_PATH", "blob").strip(" \t\n\r\0\x0b/")
+    if not re.match(r"^[A-Za-z0-9_\-]+$", blob_path):
+        blob_path = "blob"
+    quotas = {}
+    for entry in filter(None, (item.strip() for item in env.get("HALAL_BLOB_QUOTAS", "").split(","))):
+        parts = [part.strip() for part in entry.split("=", 1)]
+        if len(parts) != 2:
+            continue
+        try:
+            megabytes = float(parts[1])
+        except ValueError:
+            continue
+        folder = "*" if parts[0] == "*" else clean_folder(parts[0])
+        if folder is not None:
+            quotas[folder] = int(round(megabytes * 1024 * 1024))
+    private_path = env.get("HALAL_BLOB_PRIVATE_PATH", "private").strip().rstrip("/")
+    if not private_path or (not private_path.startswith("/") and (not re.match(r"^[A-Za-z0-9_\-]+$", private_path) or private_path in (blob_path, "api", "meta", "variants", "tools"))):
+        private_path = "private"
+    return {
+        "key": env.get("HALAL_BLOB_KEY", "").strip(),
+        "baseUrl": env.get("HALAL_BLOB_BASE_URL", "").strip().rstrip("/"),
+        "maxBytes": int(round(php_number(env.get("HALAL_BLOB_MAX_MB"), 5) * 1024 * 1024)),
+        "allowedExts": [ext.strip().lower() for ext in allowed.split(",") if ext.strip()],
+        "blobPath": blob_path,
+        "layout": "sharded" if env.get("HALAL_BLOB_LAYOUT", "").strip().lower() == "sharded" else "flat",
+        "dedup": php_bool(env.get("HALAL_BLOB_DEDUP"), False),
+        "precompress": php_bool(env.get("HALAL_BLOB_PRECOMPRESS"), False),
+        "quotas": quotas,
+        "serverTiming": php_bool(env.get("HALAL_BLOB_SERVER_TIMING"), True),
+        "accessLog": php_bool(env.get("HALAL_BLOB_ACCESS_LOG"), False),
+        "batchMaxBytes": int(round(php_number(env.get("HALAL_BLOB_BATCH_MAX_MB"), 20) * 1024 * 1024)),
+        "batchMaxFiles": max(1, int(php_number(env.get("HALAL_BLOB_BATCH_MAX_FILES"), 20))),
+        "deleteBudgetMs": max(100, int(php_number(env.get("HALAL_BLOB_DELETE_BUDGET_MS"), 5000))),
+        "corsOrigins": [origin.strip().rstrip("/") for origin in env.get("HALAL_BLOB_CORS_ORIGINS", "").split(",") if origin.strip().rstrip("/")],
+        "privatePath": private_path,
+        "journal": php_bool(env.get("HALAL_BLOB_JOURNAL"), True),
+        "journalSegmentBytes": max(1, int(php_number(env.get("HALAL_BLOB_JOURNAL_SEGMENT_KB"), 1024))) * 1024,
+        "journalRetainDays": max(0.0, php_number(env.get("HALAL_BLOB_JOURNAL_RETAIN_DAYS"), 30)),
+        "listCacheSeconds": max(0, int(php_number(env.get("HALAL_BLOB_LIST_CACHE_SECONDS"), 30))),
+    }
+
+
+def token_signature(key: str, body: str) -> str:
+    digest = hmac.new(key.encode(), body.encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).decode().rstrip("=")
+
+
+def token_sign(key: str, claims: dict) -> str:
+    """Mint a token the way the SDKs do: base64url(JSON claims) "." base64url(HMAC-SHA256)."""
+    body = base64.urlsafe_b64encode(json.dumps(claims, separators=(",", ":")).encode()).decode().rstrip("=")
+    return f"{body}.{token_signature(key, body)}"
+
+
+def token_verify(key: str, token: str, scope: str) -> tuple:
+    """Return (error, claims); `error` is a (status, payload) tuple or None."""
+    invalid = error(403, "TOKEN_INVALID", "Invalid token")
+    parts = token.split(".")
+    if not key or len(parts) != 2 or not hmac.compare_digest(token_signature(key, parts[0]), parts[1]):
+        return invalid, None
+    try:
+        claims = json.loads(base64.urlsafe_b64decode(parts[0] + "=" * (-len(parts[0]) % 4)))
+    except ValueError:
+        return invalid, None
+    if not isinstance(claims, dict) or claims.get("scope") != scope or type(claims.get("exp")) is not int:
+        return invalid, None
+    if claims["exp"] < time.time():
+        return error(403, "TOKEN_EXPIRED", "Token expired"), None
+    return None, claims
+
+
+def private_root(cfg: dict, root: Path) -> Path:
+    return Path(cfg["privatePath"]) if cfg["privatePath"].startswith("/") else root / cfg["privatePath"]
+
+
+def byte_range(header: str, size: int):
+    """Parse a single `bytes=` range: (start, end), None to ignore it, False if unsatisfiable."""
+    match = re.match(r"^bytes=(\d*)-(\d*)$", header.strip())
+    if not match or match.group(1) == match.group(2) == "":
+        return None
+    first, last = match.groups()
+    if first == "":
+        length = int(last)
+        return (max(0, size - length), size - 1) if length > 0 and size > 0 else False
+    start = int(first)
+    if last != "" and int(last) < start:
+        return None
+    end = size - 1 if last == "" else min(int(last), size - 1)
+    return (start, end) if start < size else False
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    return any(re.sub(r"^W/", "", candidate.strip()) == etag for candidate in header.split(","))
+
+
+def shard_prefix(filename: str) -> str:
+    return f"{filename[0:2]}/{filename[2:4]}"
+
+
+def split_blob_path(relative_path: str) -> tuple:
+    match = SHARDED_PATH.match(relative_path)
+    if match:
+        return match.group(1) or "", f"{match.group(2)}/{match.group(3)}/{match.group(4)}"
+    folder, _, name = relative_path.rpartition("/")
+    return folder, name
+
+
+def blob_alternate_path(relative_path: str) -> Optional[str]:
+    folder, name = split_blob_path(relative_path)
+    base = name.rpartition("/")[2]
+    if not re.match(r"^[0-9a-f]{4}", base):
+        return None
+    alt = base if "/" in name else f"{shard_prefix(base)}/{base}"
+    return f"{folder}/{alt}" if folder else alt
+
+
+def purge_variants(root: Path, relative_path: str) -> None:
+    """Drop cached variants of a blob under both its flat and sharded paths; variant.php
+    caches them under whichever path the URL used."""
+    variants = root / "variants"
+    if not variants.is_dir():
+        return
+    for path in filter(None, (relative_path, blob_alternate_path(relative_path))):
+        for variant in variants.glob(f"w*q*/{path}.*"):
+            variant.unlink(missing_ok=True)
+
+
+def clean_folder(folder) -> Optional[str]:
+    folder = str(folder).strip()
+    if folder and not re.match(r"^[A-Za-z0-9_\-/]*$", folder):
+        return None
+    return folder.strip("/")
+
+
+def clean_path(path) -> Optional[str]:
+    path = re.sub(r"[^A-Za-z0-9_\-./]", "", str(path)).strip("/")
+    for segment in path.split("/"):
+        if segment in ("", ".", ".."):
+            return None
+    return path
+
+
+def blob_scan(blob_dir: Path) -> list:
+    names = []
+    if not blob_dir.is_dir():
+        return names
+    with os.scandir(blob_dir) as it:
+        for entry in it:
+            if entry.name.startswith("."):
+                continue
+            if entry.is_file():
+                if not entry.name.endswith((".br", ".gz")):
+                    names.append(entry.name)
+                continue
+            if not re.match(r"^[0-9a-f]{2}$", entry.name) or not entry.is_dir():
+                continue
+            for sub in sorted(os.listdir(entry.path)):
+                sub_dir = Path(entry.path, sub)
+                if not re.match(r"^[0-9a-f]{2}$", sub) or not sub_dir.is_dir():
+                    continue
+                for name in sorted(os.listdir(sub_dir)):
+                    if name.startswith(entry.name + sub) and not name.endswith((".br", ".gz")) and (sub_dir / name).is_file():
+                        names.append(f"{entry.name}/{sub}/{name}")
+    return names
+
+
+def is_shard_dir(path: Path) -> bool:
+    if not re.match(r"^[0-9a-f]{2}$", path.name):
+        return False
+    with os.scandir(path) as it:
+        return all(re.match(r"^[0-9a-f]{2}$", entry.name) and entry.is_dir() for entry in it)
+
+
+def blob_subfolders(blob_dir: Path, folder: str, meta_dir: Optional[Path] = None) -> list:
+    stamp = file_mtime(blob_dir)
+    cache_path = meta_dir / ".folders.json" if meta_dir is not None else None
+    names = None
+    if cache_path is not None and stamp is not None:
+        try:
+            cached = json.loads(cache_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            cached = None
+        if isinstance(cached, dict) and cached.get("mtime") == stamp and isinstance(cached.get("names"), list):
+            names = cached["names"]
+    if names is None:
+        with os.scandir(blob_dir) as it:
+            names = sorted(
+                entry.name for entry in it
+                if "." not in entry.name and re.match(r"^[A-Za-z0-9_\-]+$", entry.name)
+                and entry.is_dir() and not is_shard_dir(Path(entry.path))
+            )
+        if cache_path is not None and stamp is not None and stamp < int(time.time()) and meta_dir.is_dir():
+            tmp = cache_path.with_name(f".folders.json.{os.getpid()}.tmp")
+            try:
+                tmp.write_text(json.dumps({"mtime": stamp, "names": names}), encoding="utf-8")
+                os.replace(tmp, cache_path)
+            except OSError:
+                pass
+    prefix = f"{folder}/" if folder else ""
+    return [f"{prefix}{name}" for name in names]
+
+
+def read_meta(path: Path):
+    try:
+        meta = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    return meta if isinstance(meta, dict) else None
+
+
+def file_mtime(path: Path) -> Optional[int]:
+    try:
+        return int(path.stat().st_mtime)
+    except OSError:
+        return None
+
+
+def sniff_mime(head: bytes) -> str:
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head[4:8] == b"ftyp":
+        return "video/quicktime" if head[8:10] == b"qt" else "video/mp4"
+    for magic, mime in MAGIC:
+        if head.startswith(magic):
+            return mime
+    if head and b"\0" not in head:
+        try:
+            text = head.decode("utf-8")
+        except UnicodeDecodeError as exc:
+            text = head[:exc.start].decode("utf-8") if exc.start >= len(head) - 3 else "\0"
+        if not any(ord(char) < 32 and char not in "\t\n\r\f" for char in text):
+            return "application/json" if text.lstrip()[:1] in ("{", "[") else "text/plain"
+    return "application/octet-stream"
+
+
+def index_open(meta_dir: Path, blob_dir: Path, create: bool = True):
+    db_path = meta_dir / ".index.sqlite"
+    if not db_path.is_file():
+        if not create:
+            return None
+        try:
+            meta_dir.mkdir(parents=True, exist_ok=True)
+        except OSError:
+            return None
+    try:
+        db = sqlite3.connect(str(db_path), timeout=5.0, isolation_level=None, check_same_thread=False)
+        db.execute("PRAGMA busy_timeout = 5000")
+        db.execute("CREATE TABLE IF NOT EXISTS files (name TEXT PRIMARY KEY, meta TEXT) WITHOUT ROWID")
+        db.execute("CREATE TABLE IF NOT EXISTS state (id INTEGER PRIMARY KEY CHECK (id = 1), total INTEGER NOT NULL)")
+        if db.execute("SELECT total FROM state WHERE id = 1").fetchone() is None:
+            index_rebuild(db, meta_dir, blob_dir)
+        return db
+    except sqlite3.Error:
+        return None
+
+
+def index_rebuild(db, meta_dir: Path, blob_dir: Path) -> None:
+    db.execute("BEGIN IMMEDIATE")
+    if db.execute("SELECT total FROM state WHERE id = 1").fetchone() is not None:
+        db.execute("COMMIT")
+        return
+    db.execute("DELETE FROM files")
+    total = 0
+    for name in blob_scan(blob_dir):
+        meta = read_meta(meta_dir / f"{name}.json")
+        db.execute("INSERT INTO files (name, meta) VALUES (?, ?)", (name, None if meta is None else php_json(meta)))
+        total += 1
+    db.execute("INSERT INTO state (id, total) VALUES (1, ?)", (total,))
+    db.execute("COMMIT")
+
+
+def index_invalidate(db) -> None:
+    try:
+        if db.in_transaction:
+            db.execute("ROLLBACK")
+        db.execute("DELETE FROM state")
+    except sqlite3.Error:
+        pass
+
+
+def index_put(db, name: str, meta) -> None:
+    try:
+        db.execute("BEGIN IMMEDIATE")
+        payload = None if meta is None else php_json(meta)
+        if db.execute("INSERT OR IGNORE INTO files (name, meta) VALUES (?, ?)", (name, payload)).rowcount > 0:
+            db.execute("UPDATE state SET total = total + 1 WHERE id = 1")
+        else:
+            db.execute("UPDATE files SET meta = ? WHERE name = ?", (payload, name))
+        db.execute("COMMIT")
+    except sqlite3.Error:
+        index_invalidate(db)
+
+
+def index_remove(db, name: str) -> None:
+    try:
+        db.execute("BEGIN IMMEDIATE")
+        if db.execute("DELETE FROM files WHERE name = ?", (name,)).rowcount > 0:
+            db.execute("UPDATE state SET total = total - 1 WHERE id = 1")
+        db.execute("COMMIT")
+    except sqlite3.Error:
+        index_invalidate(db)
+
+
+def quota_for(cfg: dict, folder: str) -> Optional[int]:
+    return cfg["quotas"].get(folder, cfg["quotas"].get("*"))
+
+
+def usage_add(usage: dict, files: int, size: int, mime: Optional[str]) -> dict:
+    usage["files"] = max(0, usage["files"] + files)
+    usage["bytes"] = max(0, usage["bytes"] + size)
+    if mime is not None and (files or size):
+        entry = usage["mime"].get(mime, {"files": 0, "bytes": 0})
+        entry = {"files": max(0, entry["files"] + files), "bytes": max(0, entry["bytes"] + size)}
+        if entry["files"] == 0:
+            usage["mime"].pop(mime, None)
+        else:
+            usage["mime"][mime] = entry
+    return usage
+
+
+def usage_seed(cfg: dict, root: Path, folder: str) -> dict:
+    suffix = f"/{folder}" if folder else ""
+    blob_dir = Path(f"{root}/{cfg['blobPath']}{suffix}")
+    usage = {"files": 0, "bytes": 0, "mime": {}}
+    for name in blob_scan(blob_dir):
+        meta = read_meta(Path(f"{root}/meta{suffix}/{name}.json"))
+        if meta is not None and "size_bytes" in meta:
+            size = int(meta["size_bytes"])
+        else:
+            try:
+                size = (blob_dir / name).stat().st_size
+            except OSError:
+                size = 0
+        mime = str(meta["mime_type"]) if meta is not None and "mime_type" in meta else "application/octet-stream"
+        usage = usage_add(usage, 1, size, mime)
+    return usage
+
+
+def usage_update(cfg: dict, root: Path, folder: str, files: int, size: int, mime: Optional[str], enforce_quota: bool = False):
+    """Same contract as the PHP helper: new counters, False over quota, None when unlockable."""
+    usage_dir = Path(f"{root}/meta/{folder}") if folder else root / "meta"
+    try:
+        usage_dir.mkdir(parents=True, exist_ok=True)
+        handle = os.fdopen(os.open(usage_dir / ".usage.json", os.O_RDWR | os.O_CREAT, 0o644), "r+", encoding="utf-8")
+    except OSError:
+        return None
+    with handle:
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        handle.seek(0)
+        raw = handle.read()
+        try:
+            usage = json.loads(raw) if raw else None
+        except ValueError:
+            usage = None
+        seeded = False
+        if not isinstance(usage, dict) or not all(key in usage for key in ("files", "bytes", "mime")):
+            usage = usage_seed(cfg, root, folder)
+            seeded = True
+        if isinstance(usage["mime"], list):
+            usage["mime"] = {}
+        quota = quota_for(cfg, folder)
+        exceeded = enforce_quota and quota is not None and size > 0 and usage["bytes"] + size > quota
+        if not exceeded:
+            usage = usage_add(usage, files, size, mime)
+        if seeded or (not exceeded and (files or size)):
+            handle.seek(0)
+            handle.truncate()
+            handle.write(php_json(dict(usage, mime=usage["mime"] or [])))
+            handle.flush()
+        fcntl.flock(handle, fcntl.LOCK_UN)
+    return False if exceeded else usage
+
+
+def journal_segments(directory: Path) -> list:
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return []
+    return sorted(int(name[:12]) for name in names if re.match(r"^\d{12}\.ndjson$", name))
+
+
+def journal_segment_path(directory: Path, start: int) -> Path:
+    return directory / f"{start:012d}.ndjson"
+
+
+def journal_decode(line: str) -> Optional[dict]:
+    try:
+        event = json.loads(line)
+    except ValueError:
+        return None
+    return event if isinstance(event, dict) and type(event.get("seq")) is int else None
+
+
+def journal_last_seq(directory: Path, segments: list) -> int:
+    if not segments:
+        return 0
+    seq = segments[-1] - 1
+    try:
+        with open(journal_segment_path(directory, segments[-1]), encoding="utf-8") as handle:
+            for line in handle:
+                event = journal_decode(line)
+                if event is not None:
+                    seq = max(seq, event["seq"])
+    except OSError:
+        pass
+    return seq
+
+
+def journal_head(directory: Path) -> int:
+    try:
+        handle = open(directory / ".head", encoding="utf-8")
+    except OSError:
+        return journal_last_seq(directory, journal_segments(directory))
+    with handle:
+        fcntl.flock(handle, fcntl.LOCK_SH)
+        raw = handle.read().strip()
+    return int(raw) if re.fullmatch(r"\d+", raw) else journal_last_seq(directory, journal_segments(directory))
+
+
+def journal_compact(cfg: dict, directory: Path, segments: list) -> None:
+    """Rewrite the just-closed segment keeping only the latest event per path (seq gaps are
+    fine for `since` cursors), then drop whole segments past HALAL_BLOB_JOURNAL_RETAIN_DAYS."""
+    path = journal_segment_path(directory, segments[-1])
+    try:
+        lines = path.read_text(encoding="utf-8").splitlines(keepends=True)
+        stat = path.stat()
+    except OSError:
+        lines = None
+    if lines is not None:
+        latest = {}
+        for index, line in enumerate(lines):
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(event, dict) and "path" in event:
+                latest[event["path"]] = index
+        tmp = Path(f"{path}.tmp")
+        try:
+            tmp.write_text("".join(lines[index] for index in sorted(latest.values())), encoding="utf-8")
+            os.utime(tmp, (stat.st_atime, stat.st_mtime))
+            os.replace(tmp, path)
+        except OSError:
+            tmp.unlink(missing_ok=True)
+    if cfg["journalRetainDays"] <= 0:
+        return
+    cutoff = time.time() - cfg["journalRetainDays"] * 86400
+    for start in segments:
+        segment = journal_segment_path(directory, start)
+        try:
+            if segment.stat().st_mtime >= cutoff:
+                break
+        except OSError:
+            pass
+        segment.unlink(missing_ok=True)
+
+
+def journal_append(cfg: dict, root: Path, events: list) -> None:
+    """Append events to meta/.journal under one lock on `.head`, the last assigned seq."""
+    if not cfg["journal"] or not events:
+        return
+    directory = root / "meta" / ".journal"
+    if not directory.is_dir():
+        try:
+            directory.mkdir(parents=True, exist_ok=True)
+        except OSError:
+            return
+        (directory / ".htaccess").write_text("Require all denied\n", encoding="utf-8")
+    try:
+        handle = os.fdopen(os.open(directory / ".head", os.O_RDWR | os.O_CREAT, 0o644), "r+", encoding="utf-8")
+    except OSError:
+        return
+    with handle:
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        raw = handle.read().strip()
+        segments = journal_segments(directory)
+        seq = int(raw) if re.fullmatch(r"\d+", raw) else journal_last_seq(directory, segments)
+        start = segments[-1] if segments else seq + 1
+        try:
+            full = bool(segments) and journal_segment_path(directory, start).stat().st_size >= cfg["journalSegmentBytes"]
+        except OSError:
+            full = False
+        if full:
+            journal_compact(cfg, directory, segments)
+            start = seq + 1
+        stamp = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        lines = []
+        for event in events:
+            seq += 1
+            lines.append(php_json({"seq": seq, "ts": stamp, **event}) + "\n")
+        try:
+            with open(journal_segment_path(directory, start), "a", encoding="utf-8") as segment:
+                segment.write("".join(lines))
+        except OSError:
+            pass
+        else:
+            handle.seek(0)
+            handle.truncate()
+            handle.write(str(seq))
+            handle.flush()
+        fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def precompress_blob(cfg: dict, path: Path, mime: str) -> None:
+    gz_path = Path(f"{path}.gz")
+    if not cfg["precompress"] or mime not in COMPRESSIBLE or gz_path.is_file():
+        return
+    tmp = Path(f"{path}.gz.tmp")
+    with open(path, "rb") as source, gzip.open(tmp, "wb", compresslevel=9) as target:
+        shutil.copyfileobj(source, target, CHUNK_BYTES * 16)
+    if tmp.stat().st_size < path.stat().st_size:
+        os.replace(tmp, gz_path)
+    else:
+        tmp.unlink()
+
+
+def inspect_upload(upload: dict) -> tuple:
+    name = upload["name"]
+    ext = name.rpartition(".")[2].lower() if "." in name else ""
+    return ext, sniff_mime(upload["head"])
+
+
+def upload_error(cfg: dict, ext: str, mime: str, size: int) -> Optional[tuple]:
+    allowed_mimes = [mime for e in cfg["allowedExts"] if e in MIME_MAP for mime in (MIME_MAP[e], *TEXT_MIMES.get(e, ()))]
+    if ext not in cfg["allowedExts"] or mime not in allowed_mimes:
+        return error(400, "INVALID_TYPE", "Unsupported file type")
+    if size > cfg["maxBytes"]:
+        return error(400, "FILE_TOO_LARGE", "File exceeds maximum allowed size")
+    return None
+
+
+class Timing:
+    def __init__(self) -> None:
+        self.start = self.last = time.perf_counter()
+        self.phases = {}
+
+    def mark(self, phase: str) -> None:
+        now = time.perf_counter()
+        self.phases[phase] = self.phases.get(phase, 0.0) + (now - self.last) * 1000
+        self.last = now
+
+    def total_ms(self) -> float:
+        return (time.perf_counter() - self.start) * 1000
+
+    def header(self) -> str:
+        parts = [f"{phase};dur={round(ms, 2)}" for phase, ms in self.phases.items()]
+        parts.append(f"total;dur={round(self.total_ms(), 2)}")
+        return ", ".join(parts)
+
+
+class BodyReader:
+    """Reads a request body with Content-Length or chunked transfer coding."""
+
+    def __init__(self, reader: asyncio.StreamReader, length: int, chunked: bool) -> None:
+        self.reader = reader
+        self.remaining = length
+        self.chunked = chunked
+        self.done = not chunked and length == 0
+
+    async def read(self, size: int = CHUNK_BYTES) -> bytes:
+        if self.done:
+            return b""
+        if self.chunked and self.remaining == 0:
+            line = await self.reader.readuntil(b"\r\n")
+            try:
+                self.remaining = int(line.split(b";", 1)[0].strip(), 16)
+            except ValueError:
+                raise HttpError("bad chunk size")
+            if self.remaining == 0:
+                while (await self.reader.readuntil(b"\r\n")) != b"\r\n":
+                    pass
+                self.done = True
+                return b""
+        data = await self.reader.read(min(size, self.remaining))
+        if not data:
+            raise HttpError("connection closed mid-body")
+        self.remaining -= len(data)
+        if self.remaining == 0:
+            if self.chunked:
+                await self.reader.readexactly(2)
+            else:
+                self.done = True
+        return data
+
+    async def read_all(self, limit: int) -> bytes:
+        parts, total = [], 0
+        while True:
+            data = await self.read()
+            if not data:
+                return b"".join(parts)
+            total += len(data)
+            if total > limit:
+                raise HttpError("body too large")
+            parts.append(data)
+
+    async def drain(self) -> None:
+        while await self.read():
+            pass
+
+
+class Request:
+    def __init__(self, method: str, target: str, version: str, headers: dict, body: BodyReader, client_ip: str) -> None:
+        parts = urlsplit(target)
+        self.method = method
+        self.path = unquote(parts.path)
+        self.query = {key: values[0] for key, values in parse_qs(parts.query, keep_blank_values=True).items()}
+        self.version = version
+        self.headers = headers
+        self.body = body
+        self.client_ip = client_ip
+
+    @property
+    def keep_alive(self) -> bool:
+        connection = self.headers.get("connection", "").lower()
+        if self.version == "HTTP/1.0":
+            return connection == "keep-alive"
+        return connection != "close"
+
+
+async def read_request(reader: asyncio.StreamReader, client_ip: str) -> Optional[Request]:
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError as exc:
+        if exc.partial.strip():
+            raise HttpError("truncated request head")
+        return None
+    except asyncio.LimitOverrunError:
+        raise HttpError("request head too large")
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, target, version = lines[0].split(" ", 2)
+    except ValueError:
+        raise HttpError("bad request line")
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+    chunked = "chunked" in headers.get("transfer-encoding", "").lower()
+    length = 0 if chunked else php_int(headers.get("content-length", "0"))
+    return Request(method.upper(), target, version, headers, BodyReader(reader, length, chunked), client_ip)
+
+
+class MultipartParser:
+    """Streams multipart/form-data parts; file parts are written to disk as they arrive."""
+
+    def __init__(self, body: BodyReader, boundary: bytes) -> None:
+        self.body = body
+        self.delimiter = b"\r\n--" + boundary
+        self.buffer = b"\r\n"
+        self.eof = False
+
+    async def fill(self) -> bool:
+        if self.eof:
+            return False
+        data = await self.body.read()
+        if not data:
+            self.eof = True
+            return False
+        self.buffer += data
+        return True
+
+    async def skip_to_delimiter(self) -> bool:
+        """Drop bytes up to and including the next delimiter; False at the closing boundary or EOF."""
+        while True:
+            index = self.buffer.find(self.delimiter)
+            if index >= 0:
+                self.buffer = self.buffer[index + len(self.delimiter):]
+                while len(self.buffer) < 2 and await self.fill():
+                    pass
+                return self.buffer[:2] == b"\r\n"
+            self.buffer = self.buffer[-len(self.delimiter):]
+            if not await self.fill():
+                return False
+
+    async def read_headers(self) -> dict:
+        while b"\r\n\r\n" not in self.buffer:
+            if len(self.buffer) > MAX_HEADER_BYTES or not await self.fill():
+                raise HttpError("bad multipart headers")
+        raw, self.buffer = self.buffer[2:].split(b"\r\n\r\n", 1)
+        headers = {}
+        for line in raw.decode("utf-8", "replace").split("\r\n"):
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        return headers
+
+    async def stream_part(self, sink) -> None:
+        """Feed the current part's bytes to sink(data) until the next delimiter."""
+        keep = len(self.delimiter)
+        while True:
+            index = self.buffer.find(self.delimiter)
+            if index >= 0:
+                if index:
+                    sink(self.buffer[:index])
+                self.buffer = self.buffer[index:]
+                return
+            if len(self.buffer) > keep:
+                sink(self.buffer[:-keep])
+                self.buffer = self.buffer[-keep:]
+            if not await self.fill():
+                raise HttpError("unterminated multipart body")
+
+    async def parts(self):
+        if not await self.skip_to_delimiter():
+            return
+        while True:
+            headers = await self.read_headers()
+            yield headers
+            if not await self.skip_to_delimiter():
+                return
+
+
+async def receive_file(parser: MultipartParser, upload: dict, limit: int) -> None:
+    """Stream one file part to upload["path"]; bytes past `limit` are counted but not written."""
+    with open(upload["path"], "wb") as handle:
+        def sink(data: bytes) -> None:
+            if len(upload["head"]) < 32:
+                upload["head"] += data[: 32 - len(upload["head"])]
+            upload["size"] += len(data)
+            if upload["size"] <= limit:
+                handle.write(data)
+        await parser.stream_part(sink)
+
+
+def disposition_params(value: str) -> dict:
+    params = {}
+    for match in re.finditer(r';\s*([A-Za-z0-9_*-]+)=(?:"((?:[^"\\]|\\.)*)"|([^;]*))', value):
+        params[match.group(1).lower()] = match.group(2) if match.group(2) is not None else match.group(3).strip()
+    return params
+
+
+class Gateway:
+    def __init__(self, root: Path, storage: Optional[Path] = None) -> None:
+        self.root = root
+        self.storage = storage or root
+        self.env_path = root / ".env"
+        self.cfg = None
+        self.env_stamp = None
+        self.private = None
+
+    def config(self) -> dict:
+        try:
+            stat = self.env_path.stat()
+            stamp = (stat.st_mtime_ns, stat.st_size, zlib.crc32(self.env_path.read_bytes()))
+        except OSError:
+            stamp = None
+        if self.cfg is None or stamp != self.env_stamp:
+            self.cfg = dict(compile_config(self.env_path), envStamp=repr(stamp))
+            self.env_stamp = stamp
+        return self.cfg
+
+    def base_url(self, cfg: dict, request: Request) -> str:
+        return cfg["baseUrl"] or f"https://{request.headers.get('host', '')}"
+
+    def blob_url(self, cfg: dict, request: Request, relative_path: str) -> str:
+        if cfg.get("private"):
+            return f"{self.base_url(cfg, request)}/api/{cfg['blobPath']}/download.php?path={relative_path}"
+        return f"{self.base_url(cfg, request)}/{cfg['blobPath']}/{relative_path}"
+
+    def private_gateway(self, cfg: dict) -> "Gateway":
+        """The same handlers over the private tree (HALAL_BLOB_PRIVATE_PATH) instead of the web root."""
+        storage = private_root(cfg, self.root)
+        if self.private is None or self.private.storage != storage:
+            if not storage.is_dir():
+                storage.mkdir(parents=True, exist_ok=True)
+                (storage / ".htaccess").write_text("Require all denied\n", encoding="utf-8")
+            self.private = Gateway(self.root, storage)
+        return self.private
+
+    def journal(self, cfg: dict, request: Request, timing: Timing, changes: list) -> None:
+        """Record (op, path, meta) changes in the web root's journal, whichever tree they touched."""
+        events = []
+        for op, relative_path, meta in changes:
+            event = {"op": op, "path": relative_path, "url": self.blob_url(cfg, request, relative_path)}
+            if meta is not None:
+                event.update((field, meta[field]) for field in ("size_bytes", "mime_type", "sha256") if meta.get(field) is not None)
+            if cfg.get("private"):
+                event["private"] = True
+            events.append(event)
+        journal_append(cfg, self.root, events)
+        timing.mark("journal")
+
+    def authorized(self, cfg: dict, request: Request) -> bool:
+        key = request.headers.get("x-halal-blob-key", "").strip() or request.query.get("key", "")
+        return cfg["key"] != "" and key != "" and secrets.compare_digest(key, cfg["key"])
+
+    def authorize(self, cfg: dict, request: Request, endpoint: str) -> tuple:
+        """Return (error, cfg). upload.php also takes an SDK-minted upload token instead of
+        the key; the returned cfg is then narrowed to the token's folder, size and types."""
+        token = request.headers.get("x-halal-blob-token", "").strip() or request.query.get("token", "")
+        has_key = request.headers.get("x-halal-blob-key", "").strip() or request.query.get("key", "")
+        if endpoint != "upload.php" or not token or has_key:
+            return (None, cfg) if self.authorized(cfg, request) else (error(403, "INVALID_KEY", "Forbidden"), cfg)
+        failure, claims = token_verify(cfg["key"], token, "upload")
+        folder = clean_folder(claims["folder"]) if claims is not None and isinstance(claims.get("folder"), str) else None
+        if failure is None and (
+            folder is None
+            or ("max_bytes" in claims and type(claims["max_bytes"]) is not int)
+            or ("types" in claims and not isinstance(claims["types"], list))
+            or ("private" in claims and not isinstance(claims["private"], bool))
+        ):
+            failure = error(403, "TOKEN_INVALID", "Invalid token")
+        if failure is not None:
+            return failure, cfg
+        scoped = dict(cfg, tokenFolder=folder, tokenPrivate=claims.get("private") is True)
+        if "max_bytes" in claims:
+            scoped["maxBytes"] = min(cfg["maxBytes"], claims["max_bytes"])
+        if "types" in claims:
+            types = {value.lower() for value in claims["types"] if isinstance(value, str)}
+            scoped["allowedExts"] = [ext for ext in cfg["allowedExts"] if ext in types]
+        return None, scoped
+
+    def cors_headers(self, cfg: dict, request: Request) -> list:
+        origin = request.headers.get("origin", "").rstrip("/")
+        if not origin or ("*" not in cfg["corsOrigins"] and origin not in cfg["corsOrigins"]):
+            return []
+        return [("Access-Control-Allow-Origin", origin), ("Vary", "Origin")]
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        peer = writer.get_extra_info("peername")
+        client_ip = peer[0] if isinstance(peer, tuple) else ""
+        try:
+            while True:
+                request = await read_request(reader, client_ip)
+                if request is None:
+                    break
+                await self.dispatch(request, writer)
+                await request.body.drain()
+                if not request.keep_alive:
+                    break
+        except HttpError:
+            writer.write(b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            try:
+                await writer.drain()
+            except ConnectionError:
+                pass
+            writer.close()
+
+    async def send(self, writer, request: Request, status: int, headers: list, body: bytes = b"") -> None:
+        lines = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}"]
+        lines += [f"{name}: {value}" for name, value in headers]
+        lines.append(f"Connection: {'keep-alive' if request.keep_alive else 'close'}")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        if body and request.method != "HEAD":
+            writer.write(body)
+        await writer.drain()
+
+    async def dispatch(self, request: Request, writer) -> None:
+        timing = Timing()
+        cfg = self.config()
+        timing.mark("config")
+        api_prefix = f"/api/{cfg['blobPath']}/"
+        blob_prefix = f"/{cfg['blobPath']}/"
+        if request.path.startswith(api_prefix):
+            endpoint = request.path[len(api_prefix):]
+            if endpoint == "download.php" and request.method in ("GET", "HEAD"):
+                await self.download(cfg, request, writer, timing)
+                return
+            handler = {
+                "ping.php": "ping",
+                "upload.php": "upload",
+                "list.php": "list_files",
+                "delete.php": "delete",
+                "copy.php": "copy",
+                "changes.php": "changes",
+            }.get(endpoint)
+            if handler is not None:
+                cors = self.cors_headers(cfg, request) if endpoint == "upload.php" else []
+                if cors and request.method == "OPTIONS":
+                    cors += [
+                        ("Access-Control-Allow-Methods", "POST, OPTIONS"),
+                        ("Access-Control-Allow-Headers", "Content-Type, X-Halal-Blob-Token"),
+                        ("Access-Control-Max-Age", "600"),
+                        ("Content-Length", "0"),
+                    ]
+                    await self.send(writer, request, 204, cors)
+                    return
+                failure, scoped = self.authorize(cfg, request, endpoint)
+                headers = []
+                if failure is not None:
+                    status, payload = failure
+                else:
+                    timing.mark("auth")
+                    target = self
+                    if scoped.get("tokenPrivate") or php_bool(request.query.get("private"), False):
+                        scoped = dict(scoped, private=True)
+                        target = self.private_gateway(cfg)
+                    try:
+                        status, payload, *extra = await getattr(target, handler)(scoped, request, timing)
+                        headers = extra[0] if extra else []
+                    except (HttpError, ConnectionError, asyncio.IncompleteReadError):
+                        raise
+                    except Exception:
+                        traceback.print_exc()
+                        status, payload = error(500, "SERVER_ERROR", "Internal server error")
+                await self.respond_json(cfg, request, writer, endpoint, timing, status, payload, [*cors, *headers])
+                return
+        elif request.path.startswith(blob_prefix) and request.method in ("GET", "HEAD"):
+            await self.serve_blob(cfg, request, writer, request.path[len(blob_prefix):])
+            return
+        await self.send(writer, request, 404, [("Content-Type", "text/plain"), ("Content-Length", "9")], b"Not Found")
+
+    async def respond_json(self, cfg: dict, request: Request, writer, endpoint: str, timing: Timing, status: int, payload, extra_headers: list = ()) -> None:
+        """Send `payload` as JSON; bytes are an already-encoded body and None sends headers only (304)."""
+        if payload is None:
+            body, headers = b"", [*extra_headers]
+        else:
+            if not isinstance(payload, bytes):
+                payload = php_json(payload).encode("ascii")
+                timing.mark("encode")
+            body = payload
+            headers = [*extra_headers, ("Content-Type", "application/json"), ("Content-Length", str(len(body)))]
+        if cfg["serverTiming"]:
+            headers.append(("Server-Timing", timing.header()))
+        await self.send(writer, request, status, headers, body)
+        if cfg["accessLog"]:
+            await asyncio.to_thread(self.write_access_log, request, endpoint, timing, status, len(body))
+
+    def write_access_log(self, request: Request, endpoint: str, timing: Timing, status: int, bytes_out: int) -> None:
+        log_dir = self.root / "meta" / ".logs"
+        if not log_dir.is_dir():
+            log_dir.mkdir(parents=True, exist_ok=True)
+            (log_dir / ".htaccess").write_text("Require all denied\n", encoding="utf-8")
+        entry = {
+            "ts": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "endpoint": endpoint[:-4],
+            "method": request.method,
+            "status": status,
+            "total_ms": round(timing.total_ms(), 3),
+            "phases": {phase: round(ms, 3) for phase, ms in timing.phases.items()},
+            "bytes_in": php_int(request.headers.get("content-length", "0")),
+            "bytes_out": bytes_out,
+        }
+        with open(log_dir / f"access-{time.strftime('%Y%m%d', time.gmtime())}.ndjson", "a", encoding="utf-8") as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            handle.write(php_json(entry) + "\n")
+
+    async def serve_blob(self, cfg: dict, request: Request, writer, relative: str) -> None:
+        blob_root = self.storage / cfg["blobPath"]
+        cleaned = clean_path(relative)
+        relative = cleaned if cleaned == relative.strip("/") else None
+        if relative is not None and any(segment.startswith(".") for segment in relative.split("/")):
+            relative = None
+        if relative is not None and not (blob_root / relative).is_file():
+            alt = blob_alternate_path(relative)
+            relative = alt if alt is not None and (blob_root / alt).is_file() else None
+        if relative is None:
+            await self.send(writer, request, 404, [("Content-Type", "text/plain"), ("Content-Length", "9")], b"Not Found")
+            return
+        path = blob_root / relative
+        stat = path.stat()
+        ext = path.suffix.lower().lstrip(".")
+        headers = [
+            ("Content-Type", STATIC_TYPES.get(ext, "application/octet-stream")),
+            ("Content-Length", str(stat.st_size)),
+            ("Last-Modified", formatdate(stat.st_mtime, usegmt=True)),
+        ]
+        await self.send(writer, request, 200, headers)
+        if request.method == "GET" and stat.st_size:
+            with open(path, "rb") as handle:
+                await asyncio.get_running_loop().sendfile(writer.transport, handle)
+
+    async def download(self, cfg: dict, request: Request, writer, timing: Timing) -> None:
+        """Serve a private blob to a key holder or an SDK-signed `?token=` URL, with
+        conditional GET and single-range (206) support for media seeking."""
+        max_age = 0
+        if request.headers.get("x-halal-blob-key", "").strip() or request.query.get("key", ""):
+            if not self.authorized(cfg, request):
+                await self.respond_json(cfg, request, writer, "download.php", timing, *error(403, "INVALID_KEY", "Forbidden"))
+                return
+            relative = clean_path(request.query.get("path", ""))
+        else:
+            failure, claims = token_verify(cfg["key"], request.query.get("token", ""), "download")
+            if failure is not None:
+                await self.respond_json(cfg, request, writer, "download.php", timing, *failure)
+                return
+            relative = clean_path(claims["path"]) if isinstance(claims.get("path"), str) else None
+            max_age = max(0, claims["exp"] - int(time.time()))
+        timing.mark("auth")
+        if relative is None or re.search(r"(^|/)\.", relative):
+            await self.respond_json(cfg, request, writer, "download.php", timing, *error(400, "PATH_INVALID", "Invalid path"))
+            return
+
+        storage = private_root(cfg, self.root)
+        blob_root = storage / cfg["blobPath"]
+        if not (blob_root / relative).is_file():
+            alt = blob_alternate_path(relative)
+            if alt is not None and (blob_root / alt).is_file():
+                relative = alt
+        path = blob_root / relative
+        if not path.is_file():
+            await self.respond_json(cfg, request, writer, "download.php", timing, *error(404, "FILE_NOT_FOUND", "File not found"))
+            return
+        meta = read_meta(storage / "meta" / f"{relative}.json")
+        mime = meta["mime_type"] if meta is not None and isinstance(meta.get("mime_type"), str) else None
+        if mime is None:
+            with open(path, "rb") as handle:
+                mime = sniff_mime(handle.read(64))
+        stat = path.stat()
+        size, mtime = stat.st_size, int(stat.st_mtime)
+        etag = f'"{size:x}-{mtime:x}"'
+        last_modified = formatdate(mtime, usegmt=True)
+        timing.mark("stat")
+        headers = [
+            ("Content-Type", mime),
+            ("ETag", etag),
+            ("Last-Modified", last_modified),
+            ("Cache-Control", f"private, max-age={max_age}" if max_age > 0 else "private, no-cache"),
+            ("Accept-Ranges", "bytes"),
+            ("X-Content-Type-Options", "nosniff"),
+        ]
+
+        if_none_match = request.headers.get("if-none-match", "").strip()
+        try:
+            since = parsedate_to_datetime(request.headers["if-modified-since"]).timestamp()
+        except (KeyError, TypeError, ValueError):
+            since = None
+        status, start, end = 200, 0, size - 1
+        if etag_matches(if_none_match, etag) if if_none_match else (since is not None and since >= mtime):
+            status, end = 304, -1
+        elif "range" in request.headers and request.headers.get("if-range", "").strip() in ("", etag, last_modified):
+            span = byte_range(request.headers["range"], size)
+            if span is False:
+                extra = [*headers[1:], ("Content-Range", f"bytes */{size}")]
+                await self.respond_json(cfg, request, writer, "download.php", timing, *error(416, "RANGE_INVALID", "Requested range not satisfiable"), extra)
+                return
+            if span is not None:
+                status, (start, end) = 206, span
+
+        length = end - start + 1
+        if status != 304:
+            headers.append(("Content-Length", str(length)))
+        if status == 206:
+            headers.append(("Content-Range", f"bytes {start}-{end}/{size}"))
+        if cfg["serverTiming"]:
+            headers.append(("Server-Timing", timing.header()))
+        await self.send(writer, request, status, headers)
+        sent = length if request.method == "GET" else 0
+        if sent:
+            with open(path, "rb") as handle:
+                await asyncio.get_running_loop().sendfile(writer.transport, handle, start, length)
+        if cfg["accessLog"]:
+            await asyncio.to_thread(self.write_access_log, request, "download.php", timing, status, sent)
+
+    async def ping(self, cfg: dict, request: Request, timing: Timing) -> tuple:
+        return 200, {
+            "success": True,
+            "status": "ok",
+            "php_version": f"python-{platform.python_version()}",
+            "time": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "blob_path": cfg["blobPath"],
+        }
+
+    async def upload(self, cfg: dict, request: Request, timing: Timing) -> tuple:
+        match = re.search(r'boundary=(?:"([^"]+)"|([^;\s]+))', request.headers.get("content-type", ""))
+        if request.method != "POST" or not match:
+            return error(400, "NO_FILE", "No file uploaded")
+        uploads = self.storage / "meta" / ".uploads"
+        if not uploads.is_dir():
+            uploads.mkdir(parents=True, exist_ok=True)
+            (uploads / ".htaccess").write_text("Require all denied\n", encoding="utf-8")
+
+        parser = MultipartParser(request.body, (match.group(1) or match.group(2)).encode("latin-1"))
+        fields, files, batch = {}, [], None
+        try:
+            async for headers in parser.parts():
+                params = disposition_params(headers.get("content-disposition", ""))
+                name = params.get("name", "")
+                is_batch_part = name.startswith("file[")
+                if "filename" in params and (name == "file" or is_batch_part) and (batch is None or (batch and is_batch_part)):
+                    batch = is_batch_part
+                    upload = {
+                        "name": params["filename"].replace("\\", "/").rpartition("/")[2],
+                        "size": 0,
+                        "head": b"",
+                        "path": uploads / f"{secrets.token_hex(16)}.part",
+                    }
+                    files.append(upload)
+                    limit = cfg["maxBytes"]
+                    if batch:
+                        received = sum(item["size"] for item in files)
+                        if len(files) > cfg["batchMaxFiles"] or received > cfg["batchMaxBytes"]:
+                            limit = 0
+                    await receive_file(parser, upload, limit)
+                elif "filename" not in params:
+                    chunks = []
+
+                    def collect(data: bytes) -> None:
+                        chunks.append(data)
+                        if sum(len(chunk) for chunk in chunks) > MAX_FIELD_BYTES:
+                            raise HttpError("form field too large")
+                    await parser.stream_part(collect)
+                    fields[name] = b"".join(chunks).decode("utf-8", "replace")
+                else:
+                    await parser.stream_part(lambda data: None)
+            timing.mark("receive")
+
+            if not files or (not batch and not files[0]["name"]):
+                return error(400, "NO_FILE", "No file uploaded")
+            folder = clean_folder(fields.get("folder", ""))
+            if folder is None:
+                return error(400, "FOLDER_INVALID", "Folder contains invalid characters")
+            if "tokenFolder" in cfg:
+                if folder and folder != cfg["tokenFolder"]:
+                    return error(403, "TOKEN_SCOPE", "Folder not allowed by upload token")
+                folder = cfg["tokenFolder"]
+            if batch:
+                return await self.upload_batch(cfg, request, folder, files, timing)
+
+            upload = files[0]
+            ext, real_mime = inspect_upload(upload)
+            timing.mark("sniff")
+            failure = upload_error(cfg, ext, real_mime, upload["size"])
+            if failure is not None:
+                return failure
+            return await asyncio.to_thread(self.store_blob, cfg, request, folder, upload["path"], upload["name"], ext, upload["size"], real_mime, timing)
+        finally:
+            for upload in files:
+                upload["path"].unlink(missing_ok=True)
+
+    async def upload_batch(self, cfg: dict, request: Request, folder: str, files: list, timing: Timing) -> tuple:
+        if len(files) > cfg["batchMaxFiles"]:
+            return error(400, "BATCH_TOO_LARGE", "Batch exceeds maximum file count")
+        if sum(upload["size"] for upload in files) > cfg["batchMaxBytes"]:
+            return error(400, "BATCH_TOO_LARGE", "Batch exceeds maximum allowed size")
+        results, uploaded = [], 0
+        for index, upload in enumerate(files):
+            if not upload["name"]:
+                results.append({"index": index, "success": False, "error": {"code": "NO_FILE", "message": "No file uploaded"}})
+                continue
+            ext, real_mime = inspect_upload(upload)
+            timing.mark("sniff")
+            status, payload = upload_error(cfg, ext, real_mime, upload["size"]) or await asyncio.to_thread(
+                self.store_blob, cfg, request, folder, upload["path"], upload["name"], ext, upload["size"], real_mime, timing
+            )
+            uploaded += status == 200
+            results.append({"index": index, **payload})
+        return 200, {"success": uploaded == len(files), "uploaded": uploaded, "failed": len(files) - uploaded, "results": results}
+
+    def store_blob(self, cfg: dict, request: Request, folder: str, source: Path, original_name: str, ext: str, size: int, mime: str, timing: Timing) -> tuple:
+        try:
+            basename = secrets.token_hex(16)
+            filename = basename + (f".{ext}" if ext else "")
+            stored_name = f"{shard_prefix(basename)}/{filename}" if cfg["layout"] == "sharded" else filename
+            suffix = f"/{folder}" if folder else ""
+            target = Path(f"{self.storage}/{cfg['blobPath']}{suffix}/{stored_name}")
+            try:
+                target.parent.mkdir(parents=True, exist_ok=True)
+            except OSError:
+                return error(500, "SERVER_ERROR", "Failed to create target directory")
+            timing.mark("mkdir")
+
+            if usage_update(cfg, self.storage, folder, 1, size, mime, True) is False:
+                return 413, {"success": False, "error": {"code": "QUOTA_EXCEEDED", "message": "Folder storage quota exceeded"}}
+            timing.mark("usage")
+            try:
+                os.rename(source, target)
+            except OSError:
+                usage_update(cfg, self.storage, folder, -1, -size, mime)
+                return error(500, "SERVER_ERROR", "Failed to save file")
+            timing.mark("move")
+            precompress_blob(cfg, target, mime)
+            timing.mark("precompress")
+
+            relative_path = f"{folder}/{stored_name}" if folder else stored_name
+            meta = {
+                "path": relative_path,
+                "url": self.blob_url(cfg, request, relative_path),
+                "size_bytes": size,
+                "mime_type": mime,
+                "original_name": original_name,
+                "uploaded_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "client_ip": request.client_ip,
+                "folder": folder,
+            }
+            meta_path = Path(f"{self.storage}/meta{suffix}/{stored_name}.json")
+            try:
+                meta_path.parent.mkdir(parents=True, exist_ok=True)
+                meta_path.write_text(php_json(meta, pretty=True), encoding="utf-8")
+            except OSError:
+                return error(500, "SERVER_ERROR", "Failed to write metadata")
+            timing.mark("meta")
+            index = index_open(Path(f"{self.storage}/meta{suffix}"), Path(f"{self.storage}/{cfg['blobPath']}{suffix}"))
+            if index is not None:
+                index_put(index, stored_name, meta)
+                index.close()
+            timing.mark("index")
+            self.journal(cfg, request, timing, [("put", relative_path, meta)])
+        finally:
+            if source.exists():
+                source.unlink()
+        return blob_response(meta)
+
+    async def delete(self, cfg: dict, request: Request, timing: Timing) -> tuple:
+        try:
+            data = json.loads(await request.body.read_all(MAX_FIELD_BYTES * 16))
+        except (ValueError, HttpError):
+            data = None
+        if not isinstance(data, dict):
+            return error(400, "SERVER_ERROR", "Invalid JSON")
+        if isinstance(data.get("paths"), (list, dict)):
+            return await asyncio.to_thread(self.delete_many, cfg, request, data["paths"], timing)
+        if data.get("folder") is not None:
+            return await asyncio.to_thread(self.delete_folder, cfg, request, data, timing)
+        if isinstance(data.get("path"), str):
+            relative_path = data["path"]
+        elif isinstance(data.get("filename"), str):
+            relative_path = data["filename"]
+        else:
+            return error(400, "SERVER_ERROR", "Missing path or filename")
+        relative_path = clean_path(relative_path)
+        if relative_path is None:
+            return error(400, "PATH_INVALID", "Invalid path")
+        indexes = {}
+        try:
+            return await asyncio.to_thread(self.delete_path, cfg, request, relative_path, timing, indexes)
+        finally:
+            close_indexes(indexes)
+
+    def delete_many(self, cfg: dict, request: Request, paths, timing: Timing) -> tuple:
+        paths = list(paths.values()) if isinstance(paths, dict) else paths
+        if len(paths) > MAX_DELETE_PATHS:
+            return error(400, "BATCH_TOO_LARGE", "Batch exceeds maximum path count")
+        results, deleted, indexes = [], 0, {}
+        try:
+            for path in paths:
+                relative_path = clean_path(path) if isinstance(path, str) else None
+                if relative_path is None:
+                    status, payload = error(400, "PATH_INVALID", "Invalid path")
+                else:
+                    status, payload = self.delete_path(cfg, request, relative_path, timing, indexes)
+                deleted += status == 200
+                results.append({"path": path if isinstance(path, str) else None, **payload})
+        finally:
+            close_indexes(indexes)
+        return 200, {"success": deleted == len(results), "deleted": deleted, "failed": len(results) - deleted, "results": results}
+
+    def delete_path(self, cfg: dict, request: Request, relative_path: str, timing: Timing, indexes: dict) -> tuple:
+        blob_root = self.storage / cfg["blobPath"]
+        meta_root = self.storage / "meta"
+        full_path = blob_root / relative_path
+        if not full_path.is_file():
+            alt = blob_alternate_path(relative_path)
+            if alt is not None and (blob_root / alt).is_file():
+                relative_path, full_path = alt, blob_root / alt
+        if not full_path.is_file():
+            return error(404, "FILE_NOT_FOUND", "File not found")
+
+        folder, name = split_blob_path(relative_path)
+        suffix = f"/{folder}" if folder else ""
+        if suffix not in indexes:
+            indexes[suffix] = index_open(Path(f"{meta_root}{suffix}"), Path(f"{blob_root}{suffix}"), False)
+        meta_full = meta_root / f"{relative_path}.json"
+        meta = read_meta(meta_full)
+        size = int(meta["size_bytes"]) if meta is not None and "size_bytes" in meta else full_path.stat().st_size
+        mime = str(meta["mime_type"]) if meta is not None and "mime_type" in meta else "application/octet-stream"
+        usage_update(cfg, self.storage, folder, -1, -size, mime)
+        try:
+            full_path.unlink()
+        except OSError:
+            usage_update(cfg, self.storage, folder, 1, size, mime)
+            return error(500, "DELETE_FAILED", "Failed to delete file")
+        timing.mark("unlink")
+
+        meta_full.unlink(missing_ok=True)
+        for sibling in (".br", ".gz"):
+            Path(f"{full_path}{sibling}").unlink(missing_ok=True)
+        purge_variants(self.storage, relative_path)
+        timing.mark("cleanup")
+        if indexes[suffix] is not None:
+            index_remove(indexes[suffix], name)
+        timing.mark("index")
+        self.journal(cfg, request, timing, [("delete", relative_path, meta)])
+        return 200, {"success": True}
+
+    def delete_folder(self, cfg: dict, request: Request, data: dict, timing: Timing) -> tuple:
+        folder = clean_folder(data["folder"]) if isinstance(data["folder"], str) else None
+        if not folder:
+            return error(400, "FOLDER_INVALID", "Invalid folder")
+        blob_root = self.storage / cfg["blobPath"]
+        if not (blob_root / folder).is_dir():
+            return error(400, "FOLDER_INVALID", "Folder not found")
+        after = None
+        if data.get("cursor") not in (None, ""):
+            after = cursor_decode(data["cursor"]) if isinstance(data["cursor"], str) else None
+            if after is None or not after.startswith(folder + "/"):
+                return error(400, "CURSOR_INVALID", "Invalid cursor")
+
+        state = {"deleted": 0, "failed": 0, "bytes": 0, "last": after, "done": True, "folders": set(), "events": []}
+        self.purge_walk(cfg, blob_root, folder, after, time.monotonic() + cfg["deleteBudgetMs"] / 1000, state)
+        timing.mark("unlink")
+        self.journal(cfg, request, timing, state["events"])
+        for touched in state["folders"]:
+            suffix = f"/{touched}" if touched else ""
+            index = index_open(Path(f"{self.storage}/meta{suffix}"), Path(f"{blob_root}{suffix}"), False)
+            if index is not None:
+                index_invalidate(index)
+                index.close()
+        if state["done"]:
+            try:
+                (blob_root / folder).rmdir()
+            except OSError:
+                pass
+            else:
+                shutil.rmtree(self.storage / "meta" / folder, ignore_errors=True)
+                for variant_dir in (self.storage / "variants").glob(f"w*q*/{folder}"):
+                    shutil.rmtree(variant_dir, ignore_errors=True)
+        timing.mark("cleanup")
+        return 200, {
+            "success": state["failed"] == 0,
+            "folder": folder,
+            "deleted": state["deleted"],
+            "failed": state["failed"],
+            "bytes": state["bytes"],
+            "done": state["done"],
+            "cursor": None if state["done"] else cursor_encode(state["last"]),
+        }
+
+    def purge_walk(self, cfg: dict, blob_root: Path, directory: str, after: Optional[str], deadline: float, state: dict) -> None:
+        """Delete everything under `directory` depth-first in lexical order of the full paths, so
+        `after` (the last path handled by a previous pass) resumes exactly where it stopped."""
+        try:
+            entries = sorted(entry.name + "/" if entry.is_dir(follow_symlinks=False) else entry.name for entry in os.scandir(blob_root / directory))
+        except OSError:
+            return
+        for entry in entries:
+            path = f"{directory}/{entry.rstrip('/')}"
+            if entry.endswith("/"):
+                if after is None or path + "/" > after or after.startswith(path + "/"):
+                    self.purge_walk(cfg, blob_root, path, after, deadline, state)
+                    if not state["done"]:
+                        return
+                try:
+                    (blob_root / path).rmdir()
+                except OSError:
+                    pass
+                continue
+            if after is not None and path <= after:
+                continue
+            self.purge_file(cfg, blob_root, path, state)
+            state["last"] = path
+            if time.monotonic() >= deadline:
+                state["done"] = False
+                return
+
+    def purge_file(self, cfg: dict, blob_root: Path, relative_path: str, state: dict) -> None:
+        full_path = blob_root / relative_path
+        base = relative_path.rpartition("/")[2]
+        if base.startswith(".") or base.endswith((".br", ".gz")):
+            full_path.unlink(missing_ok=True)
+            return
+        meta_full = self.storage / "meta" / f"{relative_path}.json"
+        meta = read_meta(meta_full)
+        folder = split_blob_path(relative_path)[0]
+        try:
+            size = int(meta["size_bytes"]) if meta is not None and "size_bytes" in meta else full_path.stat().st_size
+        except OSError:
+            state["failed"] += 1
+            return
+        mime = str(meta["mime_type"]) if meta is not None and "mime_type" in meta else "application/octet-stream"
+        usage_update(cfg, self.storage, folder, -1, -size, mime)
+        try:
+            full_path.unlink()
+        except OSError:
+            usage_update(cfg, self.storage, folder, 1, size, mime)
+            state["failed"] += 1
+            return
+        meta_full.unlink(missing_ok=True)
+        for sibling in (".br", ".gz"):
+            Path(f"{full_path}{sibling}").unlink(missing_ok=True)
+        state["folders"].add(folder)
+        state["deleted"] += 1
+        state["bytes"] += size
+        state["events"].append(("delete", relative_path, meta))
+
+    async def copy(self, cfg: dict, request: Request, timing: Timing) -> tuple:
+        try:
+            data = json.loads(await request.body.read_all(MAX_FIELD_BYTES * 16))
+        except (ValueError, HttpError):
+            data = None
+        if not isinstance(data, dict):
+            return error(400, "SERVER_ERROR", "Invalid JSON")
+        move = data.get("move") is True
+        indexes = {}
+        try:
+            if isinstance(data.get("items"), (list, dict)):
+                return await asyncio.to_thread(self.transfer_many, cfg, request, data, move, timing, indexes)
+            return await asyncio.to_thread(self.transfer_item, cfg, request, data, None, move, timing, indexes)
+        finally:
+            close_indexes(indexes)
+
+    def transfer_many(self, cfg: dict, request: Request, data: dict, move: bool, timing: Timing, indexes: dict) -> tuple:
+        items = list(data["items"].values()) if isinstance(data["items"], dict) else data["items"]
+        if len(items) > MAX_TRANSFER_ITEMS:
+            return error(400, "BATCH_TOO_LARGE", "Batch exceeds maximum item count")
+        default_folder = None
+        if data.get("folder") is not None:
+            default_folder = clean_folder(data["folder"]) if isinstance(data["folder"], str) else None
+            if default_folder is None:
+                return error(400, "FOLDER_INVALID", "Folder contains invalid characters")
+        results, transferred = [], 0
+        for item in items:
+            item = {"from": item} if isinstance(item, str) else item
+            if isinstance(item, dict):
+                status, payload = self.transfer_item(cfg, request, item, default_folder, move, timing, indexes)
+            else:
+                status, payload = error(400, "PATH_INVALID", "Invalid source path")
+            transferred += status == 200
+            source = item.get("from") if isinstance(item, dict) else None
+            results.append({"from": source if isinstance(source, str) else None, **payload})
+        return 200, {"success": transferred == len(results), "transferred": transferred, "failed": len(results) - transferred, "results": results}
+
+    def transfer_item(self, cfg: dict, request: Request, item: dict, default_folder: Optional[str], move: bool, timing: Timing, indexes: dict) -> tuple:
+        source = clean_path(item["from"]) if isinstance(item.get("from"), str) else None
+        if source is None:
+            return error(400, "PATH_INVALID", "Invalid source path")
+        folder = default_folder
+        if item.get("folder") is not None:
+            folder = clean_folder(item["folder"]) if isinstance(item["folder"], str) else None
+            if folder is None:
+                return error(400, "FOLDER_INVALID", "Folder contains invalid characters")
+        filename = None
+        if item.get("filename") is not None:
+            if not isinstance(item["filename"], str) or item["filename"] == "":
+                return error(400, "NAME_INVALID", "Target filename is invalid or changes the extension")
+            filename = item["filename"]
+        return self.transfer_blob(cfg, request, source, folder, filename, move, timing, indexes)
+
+    def transfer_blob(self, cfg: dict, request: Request, source: str, folder: Optional[str], filename: Optional[str], move: bool, timing: Timing, indexes: dict) -> tuple:
+        """Copy (hard link, else byte copy) or move (`rename`) one blob with its `.br`/`.gz`
+        siblings, carrying the sidecar over and keeping usage counters and indexes in step."""
+        blob_root = self.storage / cfg["blobPath"]
+        if not (blob_root / source).is_file():
+            alt = blob_alternate_path(source)
+            if alt is not None and (blob_root / alt).is_file():
+                source = alt
+        from_folder, from_name = split_blob_path(source)
+        base = from_name.rpartition("/")[2]
+        source_path = blob_root / source
+        if not source_path.is_file() or base.startswith(".") or re.search(r"\.(br|gz)$", base):
+            return error(404, "FILE_NOT_FOUND", "File not found")
+        ext = base.rpartition(".")[2].lower() if "." in base else ""
+        meta = read_meta(self.storage / "meta" / f"{source}.json")
+        if meta is None:
+            with open(source_path, "rb") as handle:
+                mime = sniff_mime(handle.read(64))
+            meta = {
+                "path": source,
+                "url": self.blob_url(cfg, request, source),
+                "size_bytes": source_path.stat().st_size,
+                "mime_type": mime,
+                "original_name": base,
+                "uploaded_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "client_ip": request.client_ip,
+                "folder": from_folder,
+            }
+        size = int(meta["size_bytes"]) if "size_bytes" in meta else source_path.stat().st_size
+        mime = str(meta.get("mime_type", "application/octet-stream"))
+        folder = from_folder if folder is None else folder
+
+        if filename is not None:
+            name_ext = filename.rpartition(".")[2].lower() if "." in filename else ""
+            if not re.match(r"^[A-Za-z0-9_\-][A-Za-z0-9_\-.]*$", filename) or re.search(r"\.(br|gz)$", filename) or name_ext != ext:
+                return error(400, "NAME_INVALID", "Target filename is invalid or changes the extension")
+        name = filename if filename is not None else base
+        stored_name = f"{shard_prefix(name)}/{name}" if cfg["layout"] == "sharded" and re.match(r"^[0-9a-f]{4}", name) else name
+        target = f"{folder}/{stored_name}" if folder else stored_name
+        if target in (source, blob_alternate_path(source)):
+            return error(400, "PATH_INVALID", "Source and target are the same")
+
+        target_path = blob_root / target
+        target_alt = blob_alternate_path(target)
+        if target_path.exists() or (target_alt is not None and (blob_root / target_alt).exists()):
+            return error(409, "TARGET_EXISTS", "Target already exists")
+        try:
+            target_path.parent.mkdir(parents=True, exist_ok=True)
+        except OSError:
+            return error(500, "SERVER_ERROR", "Failed to create target directory")
+        timing.mark("mkdir")
+
+        counted = not move or folder != from_folder
+        if counted and usage_update(cfg, self.storage, folder, 1, size, mime, True) is False:
+            return 413, {"success": False, "error": {"code": "QUOTA_EXCEEDED", "message": "Folder storage quota exceeded"}}
+        timing.mark("usage")
+        try:
+            transfer_file(source_path, target_path, move)
+        except OSError:
+            if counted:
+                usage_update(cfg, self.storage, folder, -1, -size, mime)
+            return error(500, "SERVER_ERROR", "Failed to save file")
+        if move and counted:
+            usage_update(cfg, self.storage, from_folder, -1, -size, mime)
+        for sibling in (".br", ".gz"):
+            if Path(f"{source_path}{sibling}").is_file():
+                try:
+                    transfer_file(Path(f"{source_path}{sibling}"), Path(f"{target_path}{sibling}"), move)
+                except OSError:
+                    pass
+        if move:
+            purge_variants(self.storage, source)
+        timing.mark("move")
+
+        meta.update(path=target, url=self.blob_url(cfg, request, target), folder=folder)
+        meta_path = self.storage / "meta" / f"{target}.json"
+        try:
+            meta_path.parent.mkdir(parents=True, exist_ok=True)
+            meta_path.write_text(php_json(meta, pretty=True), encoding="utf-8")
+        except OSError:
+            return error(500, "SERVER_ERROR", "Failed to write metadata")
+        if move:
+            (self.storage / "meta" / f"{source}.json").unlink(missing_ok=True)
+        timing.mark("meta")
+        index = self.index_for(cfg, folder, indexes)
+        if index is not None:
+            index_put(index, stored_name, meta)
+        if move:
+            index = self.index_for(cfg, from_folder, indexes)
+            if index is not None:
+                index_remove(index, from_name)
+        timing.mark("index")
+        self.journal(cfg, request, timing, ([("delete", source, meta)] if move else []) + [("put", target, meta)])
+        return blob_response(meta)
+
+    async def changes(self, cfg: dict, request: Request, timing: Timing) -> tuple:
+        return await asyncio.to_thread(self.read_changes, cfg, request, timing)
+
+    def read_changes(self, cfg: dict, request: Request, timing: Timing) -> tuple:
+        """One bounded page of journal events after the `since` seq, never past `head`."""
+        since = request.query.get("since", "") or "0"
+        if not re.fullmatch(r"\d{1,15}", since):
+            return error(400, "CURSOR_INVALID", "Invalid cursor")
+        since = int(since)
+        limit = php_int(request.query["limit"]) if "limit" in request.query else 500
+        limit = min(limit if limit >= 1 else 500, 1000)
+
+        directory = self.root / "meta" / ".journal"
+        head = journal_head(directory)
+        segments = journal_segments(directory)
+        timing.mark("head")
+        status, expired = error(410, "CURSOR_EXPIRED", "Cursor is outside the retained journal; re-list and resume from head")
+        expired["head"] = head
+        if since > head or (since < head and (not segments or since + 1 < segments[0])):
+            return status, expired
+
+        first = 0
+        for index, start in enumerate(segments):
+            if start <= since + 1:
+                first = index
+        changes, last = [], since
+        for start in segments[first:]:
+            if last >= head or len(changes) >= limit:
+                break
+            try:
+                handle = open(journal_segment_path(directory, start), encoding="utf-8")
+            except OSError:
+                if not changes:
+                    return status, expired
+                break
+            with handle:
+                for line in handle:
+                    if len(changes) >= limit:
+                        break
+                    event = journal_decode(line)
+                    if event is None or event["seq"] <= since:
+                        continue
+                    if event["seq"] > head:
+                        break
+                    changes.append(event)
+                    last = event["seq"]
+        timing.mark("read")
+        return 200, {
+            "success": True,
+            "since": since,
+            "next_since": last,
+            "head": head,
+            "has_more": last < head,
+            "changes": changes,
+        }
+
+    def index_for(self, cfg: dict, folder: str, indexes: dict):
+        suffix = f"/{folder}" if folder else ""
+        if suffix not in indexes:
+            indexes[suffix] = index_open(Path(f"{self.storage}/meta{suffix}"), Path(f"{self.storage}/{cfg['blobPath']}{suffix}"))
+        return indexes[suffix]
+
+    async def list_files(self, cfg: dict, request: Request, timing: Timing) -> tuple:
+        return await asyncio.to_thread(self.list_folder, cfg, request, timing)
+
+    def list_folder(self, cfg: dict, request: Request, timing: Timing) -> tuple:
+        folder = clean_folder(request.query.get("folder", ""))
+        if folder is None:
+            return error(400, "FOLDER_INVALID", "Invalid folder")
+        page = php_int(request.query["page"]) if "page" in request.query else 1
+        per_page = php_int(request.query["per_page"]) if "per_page" in request.query else 50
+        page = max(page, 1)
+        per_page = per_page if per_page >= 1 else 50
+
+        suffix = f"/{folder}" if folder else ""
+        blob_dir = Path(f"{self.storage}/{cfg['blobPath']}{suffix}")
+        if not blob_dir.is_dir():
+            return error(400, "FOLDER_INVALID", "Folder not found")
+        after = None
+        if request.query.get("cursor", "") != "":
+            after = cursor_decode(request.query["cursor"])
+            if after is None:
+                return error(400, "CURSOR_INVALID", "Invalid cursor")
+        elif request.query.get("after", "") != "":
+            prefix = f"{folder}/" if folder else ""
+            if not request.query["after"].startswith(prefix) or len(request.query["after"]) == len(prefix):
+                return error(400, "CURSOR_INVALID", "after must be a path inside the folder")
+            after = request.query["after"][len(prefix):]
+        with_folders = php_bool(request.query.get("folders"), False)
+        offset = (page - 1) * per_page if after is None else 0
+        meta_dir = Path(f"{self.storage}/meta{suffix}")
+
+        headers, cache_file = [], None
+        index_stamp = file_mtime(meta_dir / ".index.sqlite")
+        dir_stamp = file_mtime(blob_dir)
+        if cfg["journal"] or max(index_stamp or 0, dir_stamp or 0) < int(time.time()) - 1:
+            validator = "|".join(str(part if part is not None else "") for part in (
+                cfg["envStamp"],
+                self.blob_url(cfg, request, ""),
+                journal_head(self.root / "meta" / ".journal") if cfg["journal"] else "",
+                index_stamp,
+                dir_stamp,
+                folder, page, per_page, after, int(with_folders),
+            ))
+            etag = f'"{hashlib.sha1(validator.encode()).hexdigest()[:20]}"'
+            headers = [("ETag", etag), ("Cache-Control", "private, no-cache")]
+            timing.mark("validate")
+            if etag_matches(request.headers.get("if-none-match", ""), etag):
+                return 304, None, headers
+            if cfg["listCacheSeconds"] > 0:
+                key = hashlib.sha1(f"{folder}|{page}|{per_page}|{after or ''}|{int(with_folders)}".encode()).hexdigest()
+                cache_file = self.storage / "meta" / ".cache" / f"list-{key}.json"
+                try:
+                    cached = cache_file.read_bytes()
+                    fresh = cache_file.stat().st_mtime > time.time() - cfg["listCacheSeconds"]
+                except OSError:
+                    cached, fresh = b"", False
+                if fresh and cached.startswith(etag.encode() + b"\n"):
+                    timing.mark("cache")
+                    return 200, cached[len(etag) + 1:], headers
+
+        rows = []
+        index = index_open(meta_dir, blob_dir)
+        if index is not None:
+            try:
+                if after is None:
+                    cursor = index.execute("SELECT name, meta FROM files ORDER BY name LIMIT ? OFFSET ?", (per_page + 1, offset))
+                else:
+                    cursor = index.execute("SELECT name, meta FROM files WHERE name > ? ORDER BY name LIMIT ?", (after, per_page + 1))
+                for name, raw in cursor.fetchall():
+                    meta = json.loads(raw) if raw is not None else None
+                    rows.append((name, meta if isinstance(meta, dict) else None))
+                total = index.execute("SELECT total FROM state WHERE id = 1").fetchone()[0]
+            finally:
+                index.close()
+            timing.mark("query")
+        else:
+            names = sorted(blob_scan(blob_dir))
+            total = len(names)
+            timing.mark("scan")
+            if after is not None:
+                names = [name for name in names if name > after]
+            for name in names[offset:offset + per_page + 1]:
+                rows.append((name, read_meta(meta_dir / f"{name}.json")))
+            timing.mark("meta")
+
+        has_more = len(rows) > per_page
+        rows = rows[:per_page]
+        files = []
+        for name, meta in rows:
+            relative_path = f"{folder}/{name}" if folder else name
+            files.append({"path": relative_path, "url": self.blob_url(cfg, request, relative_path), "meta": meta})
+        payload = {
+            "success": True,
+            "folder": folder,
+            "page": page,
+            "per_page": per_page,
+            "total": total,
+            "files": files,
+            "next_cursor": cursor_encode(rows[-1][0]) if has_more and rows else None,
+        }
+        if with_folders:
+            payload["folders"] = blob_subfolders(blob_dir, folder, meta_dir)
+            timing.mark("folders")
+        body = php_json(payload).encode("ascii")
+        timing.mark("encode")
+        if cache_file is not None:
+            self.write_list_cache(cfg, cache_file, headers[0][1], body)
+        return 200, body, headers
+
+    def write_list_cache(self, cfg: dict, cache_file: Path, etag: str, body: bytes) -> None:
+        """Keep the rendered page next to the ETag it was built under; stale entries are swept now and then."""
+        cache_dir = cache_file.parent
+        if not cache_dir.is_dir():
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            (cache_dir / ".htaccess").write_text("Require all denied\n", encoding="utf-8")
+        tmp = cache_file.with_name(f"{cache_file.name}.{os.getpid()}.tmp")
+        try:
+            tmp.write_bytes(etag.encode() + b"\n" + body)
+            os.replace(tmp, cache_file)
+        except OSError:
+            tmp.unlink(missing_ok=True)
+        if secrets.randbelow(100) == 0:
+            cutoff = time.time() - cfg["listCacheSeconds"]
+            for stale in cache_dir.glob("list-*.json"):
+                try:
+                    if stale.stat().st_mtime <= cutoff:
+                        stale.unlink()
+                except OSError:
+                    pass
+
+
+def blob_response(meta: dict) -> tuple:
+    return 200, {
+        "success": True,
+        "url": meta["url"],
+        "filename": meta["path"].rpartition("/")[2],
+        "path": meta["path"],
+        "meta": {
+            "size_bytes": meta["size_bytes"],
+            "mime_type": meta["mime_type"],
+            "uploaded_at": meta["uploaded_at"],
+            "folder": meta["folder"],
+            "original_name": meta["original_name"],
+            "client_ip": meta["client_ip"],
+        },
+    }
+
+
+def transfer_file(source: Path, target: Path, move: bool) -> None:
+    if move:
+        os.rename(source, target)
+        return
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+
+
+def close_indexes(indexes: dict) -> None:
+    for index in indexes.values():
+        if index is not None:
+            index.close()
+
+
+def cursor_encode(name: str) -> str:
+    return base64.urlsafe_b64encode(name.encode()).decode().rstrip("=")
+
+
+def cursor_decode(cursor: str) -> Optional[str]:
+    try:
+        name = base64.b64decode(cursor.replace("-", "+").replace("_", "/") + "=" * (-len(cursor) % 4), validate=True).decode()
+    except (ValueError, UnicodeDecodeError):
+        return None
+    return name if re.match(r"^[A-Za-z0-9_\-./]+$", name) else None
+
+
+async def run_server(root: Path, host: str, port: int) -> None:
+    gateway = Gateway(root)
+    if gateway.config()["dedup"]:
+        raise SystemExit("HALAL_BLOB_DEDUP is not supported by the Python gateway; serve this tree with PHP.")
+    server = await asyncio.start_server(gateway.handle_connection, host, port, limit=MAX_HEADER_BYTES * 4)
+    bound = ", ".join(f"{sock.getsockname()[0]}:{sock.getsockname()[1]}" for sock in server.sockets)
+    print(f"Halal Blob Python gateway serving {root} on {bound}", flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+def serve(root: Path, host: str = "127.0.0.1", port: int = 8080) -> None:
+    root = root.resolve()
+    for name in ("blob", "meta"):
+        if name == "blob":
+            (root / compile_config(root / ".env")["blobPath"]).mkdir(parents=True, exist_ok=True)
+        else:
+            (root / name).mkdir(parents=True, exist_ok=True)
+    try:
+        asyncio.run(run_server(root, host, port))
+    except KeyboardInterrupt:
+        pass
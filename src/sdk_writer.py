@@ -1,9 +1,16 @@
 from pathlib import Path
 from . import __version__
 
+def _write_text_if_changed(path: Path, content: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if not path.is_file() or path.read_text(encoding="utf-8") != content:
+        path.write_text(content, encoding="utf-8")
+
 def write_sdk(root_path: Path) -> None:
-    sdk_dir = root_path / "sdk" / "node"
-    sdk_dir.mkdir(parents=True, exist_ok=True)
+    write_node_sdk(root_path)
+    write_python_sdk(root_path)
+
+def write_node_sdk(root_path: Path) -> None:
     head = (
         r"""/**
 Usage example (Next.js 15/16):
@@ -28,69 +35,984 @@ declare type Buffer = unknown;
    key: string;
    blobPath?: string;
    fetchImpl?: typeof fetch;
+   dispatcher?: unknown;
+   retries?: number;
+   retryDelayMs?: number;
+   listCacheSize?: number;
+   onTiming?: (timing: RequestTiming) => void;
  };
 
 export type ErrorPayload = { success: false; error: { code: string; message: string } };
-export type UploadResponse = { success: true; url: string; filename: string; path: string; meta: { size_bytes: number; mime_type: string; uploaded_at: string; folder: string; original_name: string; client_ip: string } } | ErrorPayload;
-export type DeleteResponse = { success: true } | ErrorPayload;
+export type RequestTiming = { endpoint: string; method: string; attempt: number; status: number; headersMs: number; totalMs: number };
+export type UploadSource = Blob | File | Buffer | string | AsyncIterable<Uint8Array | string>;
+export type UploadOptions = { folder?: string; filename?: string; dedupe?: boolean; size?: number; private?: boolean };
+export type UploadManyItem = UploadSource | ({ file: UploadSource } & UploadOptions);
+export type BatchSource = Blob | File | Buffer | string | { file: Blob | File | Buffer | string; filename?: string };
+export type UploadBatchOptions = { folder?: string; maxBatchBytes?: number; maxBatchFiles?: number; concurrency?: number };
+export type UploadResponse = { success: true; url: string; filename: string; path: string; deduplicated?: boolean; meta: { size_bytes: number; mime_type: string; uploaded_at: string; folder: string; original_name: string; client_ip: string; sha256?: string; ref_count?: number } } | ErrorPayload;
+export type BatchUploadResponse = { success: boolean; uploaded: number; failed: number; results: Array<UploadResponse & { index: number }> } | ErrorPayload;
+export type ExistsResponse = { success: true; exists: false } | (Extract<UploadResponse, { success: true }> & { exists: true }) | ErrorPayload;
+export type DeleteResponse = { success: true; ref_count?: number } | ErrorPayload;
+export type BulkDeleteResponse = { success: boolean; deleted: number; failed: number; results: Array<DeleteResponse & { path: string | null }> } | ErrorPayload;
+export type DeleteFolderResponse = { success: boolean; folder: string; deleted: number; failed: number; bytes: number; done: boolean; cursor: string | null } | ErrorPayload;
+export type TransferOptions = { folder?: string; filename?: string };
+export type TransferItem = string | ({ from: string } & TransferOptions);
+export type BatchTransferResponse = { success: boolean; transferred: number; failed: number; results: Array<UploadResponse & { from: string | null }> } | ErrorPayload;
+export type UploadTokenOptions = { folder?: string; maxBytes?: number; types?: string[]; ttlSeconds?: number; private?: boolean };
+export type UploadToken = { token: string; url: string; expiresAt: number };
 export type PingResponse = { success: true; status: 'ok'; php_version: string; time: string; blob_path: string } | ErrorPayload;
+export type UploadSessionResponse = { success: true; upload_id: string; size: number; chunk_size: number; chunks: number; received: number[]; offset: number } | ErrorPayload;
+export type UploadLargeOptions = { folder?: string; filename?: string; chunkSize?: number; concurrency?: number; uploadId?: string; private?: boolean; onProgress?: (sentBytes: number, totalBytes: number) => void };
+export type VariantFormat = 'jpg' | 'png' | 'webp' | 'gif';
+export type VariantOptions = { width: number; quality?: number; format?: VariantFormat };
 export type ListItem = { path: string; url: string; meta?: any };
-export type ListResponse = { success: true; folder: string; page: number; per_page: number; total: number; files: ListItem[] } | ErrorPayload;
+export type StatsResponse = { success: true; folder: string; files: number; bytes: number; by_mime: Record<string, { files: number; bytes: number }>; quota_bytes: number | null } | ErrorPayload;
+export type ListOptions = { folder?: string; page?: number; perPage?: number; cursor?: string | null; after?: string; folders?: boolean; private?: boolean };
+export type ListAllOptions = { folder?: string; perPage?: number; recursive?: boolean; private?: boolean };
+export type ListResponse = { success: true; folder: string; page: number; per_page: number; total: number; files: ListItem[]; next_cursor: string | null; folders?: string[] } | ErrorPayload;
+export type ChangeEvent = { seq: number; ts: string; op: 'put' | 'delete'; path: string; url: string; size_bytes?: number; mime_type?: string; sha256?: string; private?: boolean };
+export type ChangesResponse = { success: true; since: number; next_since: number; head: number; has_more: boolean; changes: ChangeEvent[] } | (ErrorPayload & { head?: number });
+export type ChangesOptions = { since?: number; limit?: number; follow?: boolean; pollIntervalMs?: number; signal?: AbortSignal };
+
+const RETRY_STATUSES = [500, 502, 503, 504];
+
+export class HalalBlobError extends Error {
+  readonly code: string;
+
+  constructor(code: string, message: string) {
+    super(`${code}: ${message}`);
+    this.name = 'HalalBlobError';
+    this.code = code;
+  }
+}
+const sleep = (ms: number) => new Promise<void>((resolve) => setTimeout(resolve, ms));
+const errorPayload = (code: string, message: string): ErrorPayload => ({ success: false, error: { code, message } });
+const nodeModule = (name: string): Promise<any> => import(/* webpackIgnore: true */ name);
+const isStream = (value: unknown): value is AsyncIterable<Uint8Array | string> =>
+  !!value && !(value instanceof Blob) && typeof (value as any)[Symbol.asyncIterator] === 'function';
+
+const base64Url = (bytes: Uint8Array): string =>
+  btoa(Array.from(bytes, (byte) => String.fromCharCode(byte)).join('')).replace(/\+/g, '-').replace(/\//g, '_').replace(/=+$/, '');
+
+// Same format upload.php verifies: base64url(JSON claims) "." base64url(HMAC-SHA256(claims part, key)).
+async function signToken(key: string, claims: Record<string, unknown>): Promise<string> {
+  const encoder = new TextEncoder();
+  const body = base64Url(encoder.encode(JSON.stringify(claims)));
+  const hmacKey = await globalThis.crypto.subtle.importKey('raw', encoder.encode(key), { name: 'HMAC', hash: 'SHA-256' }, false, ['sign']);
+  const signature = await globalThis.crypto.subtle.sign('HMAC', hmacKey, encoder.encode(body));
+  return `${body}.${base64Url(new Uint8Array(signature))}`;
+}
+
+async function mapLimit<T, R>(items: T[], concurrency: number, fn: (item: T) => Promise<R>): Promise<R[]> {
+  const results = new Array<R>(items.length);
+  let next = 0;
+  const worker = async () => {
+    while (next < items.length) {
+      const index = next++;
+      results[index] = await fn(items[index]);
+    }
+  };
+  await Promise.all(Array.from({ length: Math.max(1, Math.min(concurrency, items.length)) }, worker));
+  return results;
+}
 
 export class HalalBlobClient {
   private baseUrl: string;
   private key: string;
   private blobPath: string;
   private fetchImpl: typeof fetch;
+  private dispatcher?: unknown;
+  private retries: number;
+  private retryDelayMs: number;
+  private listCacheSize: number;
+  private listCache = new Map<string, { etag: string; body: ListResponse }>();
+  private onTiming?: (timing: RequestTiming) => void;
 
   constructor(options: HalalBlobClientOptions) {
     this.baseUrl = options.baseUrl.replace(/\/$/, '');
     this.key = options.key;
     this.blobPath = (options.blobPath ?? 'blob').replace(/^\/|\/$/g, '');
     this.fetchImpl = options.fetchImpl ?? (globalThis.fetch as typeof fetch);
+    this.dispatcher = options.dispatcher;
+    this.retries = Math.max(0, options.retries ?? 2);
+    this.retryDelayMs = options.retryDelayMs ?? 250;
+    this.listCacheSize = Math.max(0, options.listCacheSize ?? 100);
+    this.onTiming = options.onTiming;
   }
 
-  async ping(): Promise<PingResponse> {
-    const res = await this.fetchImpl(`${this.baseUrl}/api/${this.blobPath}/ping.php`, {
-      headers: { 'X-Halal-Blob-Key': this.key },
+  // Sends one API call. Network errors and 5xx are retried with jittered exponential
+  // backoff when the body can be rebuilt; makeInit runs once per attempt for that reason.
+  // intercept sees the final response first and may answer without reading its body.
+  private async request<T>(endpoint: string, makeInit: () => RequestInit | Promise<RequestInit> = () => ({}), replayable = true, intercept?: (res: Response) => T | undefined): Promise<T> {
+    const url = `${this.baseUrl}/api/${this.blobPath}/${endpoint}`;
+    const name = endpoint.split('?')[0];
+    for (let attempt = 0; ; attempt++) {
+      const init = await makeInit();
+      const started = Date.now();
+      let status = 0;
+      let headersMs = 0;
+      try {
+        const res = await this.fetchImpl(url, {
+          ...init,
+          headers: { 'X-Halal-Blob-Key': this.key, ...(init.headers as Record<string, string> | undefined) },
+          ...(this.dispatcher ? { dispatcher: this.dispatcher } : {}),
+        } as RequestInit);
+        status = res.status;
+        headersMs = Date.now() - started;
+        if (!replayable || attempt >= this.retries || !RETRY_STATUSES.includes(res.status)) {
+          const intercepted = intercept?.(res);
+          if (intercepted !== undefined) {
+            await res.body?.cancel();
+            return intercepted;
+          }
+          const text = await res.text();
+          try {
+            return JSON.parse(text) as T;
+          } catch {
+            return errorPayload('SERVER_ERROR', `Unexpected HTTP ${res.status} response`) as T;
+          }
+        }
+        await res.body?.cancel();
+      } catch (error) {
+        if (!replayable || attempt >= this.retries) {
+          return errorPayload('NETWORK_ERROR', error instanceof Error ? error.message : String(error)) as T;
+        }
+      } finally {
+        this.onTiming?.({ endpoint: name, method: init.method ?? 'GET', attempt, status, headersMs, totalMs: Date.now() - started });
+      }
+      await sleep(this.retryDelayMs * 2 ** attempt * (0.5 + Math.random()));
+    }
+  }
+
+  private sourceName(file: UploadSource): string | undefined {
+    const path = typeof file === 'string' ? file : ((file as any)?.name ?? (file as any)?.path);
+    return typeof path === 'string' ? path.split(/[\\/]/).pop() : undefined;
+  }
+
+  private async sha256Of(file: UploadSource): Promise<string | null> {
+    if (typeof file === 'string') {
+      const [{ createHash }, { createReadStream }] = await Promise.all([nodeModule('node:crypto'), nodeModule('node:fs')]);
+      const hash = createHash('sha256');
+      for await (const chunk of createReadStream(file)) hash.update(chunk);
+      return hash.digest('hex');
+    }
+    if (isStream(file) || !globalThis.crypto?.subtle) return null;
+    const blob = file instanceof Blob ? file : new Blob([file as any]);
+    const digest = await globalThis.crypto.subtle.digest('SHA-256', await blob.arrayBuffer());
+    return Array.from(new Uint8Array(digest), (b) => b.toString(16).padStart(2, '0')).join('');
+  }
+
+  // Builds a multipart body that streams the file instead of buffering it. File paths are
+  // reopened on every attempt; a Readable can only be sent once.
+  private async streamingForm(file: string | AsyncIterable<Uint8Array | string>, fields: Record<string, string | undefined>, size?: number, partName?: string): Promise<RequestInit> {
+    let source = file as AsyncIterable<Uint8Array | string>;
+    if (typeof file === 'string') {
+      const fs = await nodeModule('node:fs');
+      size = (await fs.promises.stat(file)).size;
+      source = fs.createReadStream(file, { highWaterMark: 1 << 20 });
+    }
+    const encoder = new TextEncoder();
+    const boundary = `----HalalBlob${Date.now().toString(16)}${Math.random().toString(16).slice(2)}`;
+    const filename = (partName ?? this.sourceName(file) ?? 'upload.bin').replace(/["\r\n]/g, '_');
+    let head = '';
+    for (const [name, value] of Object.entries(fields)) {
+      if (value) head += `--${boundary}\r\nContent-Disposition: form-data; name="${name}"\r\n\r\n${value}\r\n`;
+    }
+    head += `--${boundary}\r\nContent-Disposition: form-data; name="file"; filename="${filename}"\r\nContent-Type: application/octet-stream\r\n\r\n`;
+    const pre = encoder.encode(head);
+    const post = encoder.encode(`\r\n--${boundary}--\r\n`);
+    const parts = (async function* () {
+      yield pre;
+      for await (const chunk of source) yield typeof chunk === 'string' ? encoder.encode(chunk) : chunk;
+      yield post;
+    })();
+    const body = new ReadableStream<Uint8Array>({
+      async pull(controller) {
+        const { value, done } = await parts.next();
+        if (done) controller.close();
+        else controller.enqueue(value);
+      },
+      async cancel() {
+        await parts.return(undefined);
+      },
     });
-    return res.json();
+    const headers: Record<string, string> = { 'Content-Type': `multipart/form-data; boundary=${boundary}` };
+    if (size !== undefined) headers['Content-Length'] = String(pre.length + size + post.length);
+    return { method: 'POST', headers, body, duplex: 'half' } as RequestInit;
   }
 
-  async uploadFile(file: Blob | File | Buffer, options?: { folder?: string; filename?: string }): Promise<UploadResponse> {
-    const form = new FormData();
-    form.append('file', file as any);
-    if (options?.folder) form.append('folder', options.folder);
-    if (options?.filename) form.append('filename', options.filename);
-    const res = await this.fetchImpl(`${this.baseUrl}/api/${this.blobPath}/upload.php`, {
+  private async transfer(item: { from: string } & TransferOptions, move: boolean): Promise<UploadResponse> {
+    return this.request<UploadResponse>('copy.php', () => ({
       method: 'POST',
-      headers: { 'X-Halal-Blob-Key': this.key },
-      body: form,
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ ...item, move }),
+    }));
+  }
+
+  private async transferMany(items: TransferItem[], move: boolean, options?: { folder?: string; batchSize?: number; concurrency?: number }): Promise<UploadResponse[]> {
+    const size = Math.min(1000, Math.max(1, options?.batchSize ?? 1000));
+    const batches: TransferItem[][] = [];
+    for (let i = 0; i < items.length; i += size) batches.push(items.slice(i, i + size));
+    const responses = await mapLimit(batches, options?.concurrency ?? 2, (batch) =>
+      this.request<BatchTransferResponse>('copy.php', () => ({
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ items: batch, folder: options?.folder, move }),
+      })),
+    );
+    return responses.flatMap((body, b) =>
+      batches[b].map((_, i): UploadResponse => {
+        if ('results' in body && body.results[i]) return body.results[i];
+        return 'error' in body ? body : errorPayload('SERVER_ERROR', 'Missing transfer result');
+      }),
+    );
+  }
+
+  async ping(): Promise<PingResponse> {
+    return this.request<PingResponse>('ping.php');
+  }
+
+  // Mints a short-lived upload token on the server so a browser can POST straight to
+  // upload.php without ever seeing the key. The token pins the folder, and optionally
+  // a per-file size cap and allowed extensions; the gateway's own limits still apply.
+  async createUploadToken(options?: UploadTokenOptions): Promise<UploadToken> {
+    const expiresAt = Math.floor(Date.now() / 1000) + (options?.ttlSeconds ?? 300);
+    const claims: Record<string, unknown> = { scope: 'upload', folder: (options?.folder ?? '').replace(/^\/+|\/+$/g, ''), exp: expiresAt };
+    if (options?.maxBytes !== undefined) claims.max_bytes = Math.floor(options.maxBytes);
+    if (options?.types) claims.types = options.types.map((type) => type.toLowerCase());
+    if (options?.private) claims.private = true;
+    const token = await signToken(this.key, claims);
+    return { token, url: `${this.baseUrl}/api/${this.blobPath}/upload.php?token=${token}`, expiresAt };
+  }
+
+  // Signed, expiring download.php URL for a private file (uploaded with `private: true`).
+  // It supports Range requests, so it can go straight into a <video> or <audio> src.
+  async signedUrl(path: string, options?: { ttlSeconds?: number }): Promise<string> {
+    const claims = { scope: 'download', path: path.replace(/^\/+/, ''), exp: Math.floor(Date.now() / 1000) + (options?.ttlSeconds ?? 3600) };
+    return `${this.baseUrl}/api/${this.blobPath}/download.php?token=${await signToken(this.key, claims)}`;
+  }
+
+  // Browser side of createUploadToken: needs only the minted url, not a client or key.
+  static async uploadWithToken(url: string, file: Blob | File, options?: { filename?: string; fetchImpl?: typeof fetch }): Promise<UploadResponse> {
+    const form = new FormData();
+    form.append('file', file, options?.filename ?? ((file as File).name || 'upload'));
+    try {
+      const res = await (options?.fetchImpl ?? fetch)(url, { method: 'POST', body: form });
+      return (await res.json()) as UploadResponse;
+    } catch (error) {
+      return errorPayload('NETWORK_ERROR', error instanceof Error ? error.message : String(error));
+    }
+  }
+
+  async uploadFile(file: UploadSource, options?: UploadOptions): Promise<UploadResponse> {
+    if (options?.dedupe) {
+      const sha256 = await this.sha256Of(file);
+      if (sha256) {
+        const filename = options.filename ?? this.sourceName(file);
+        const found = await this.exists(sha256, { folder: options.folder, filename, private: options.private });
+        if (!found.success || found.exists) return found;
+      }
+    }
+    const endpoint = options?.private ? 'upload.php?private=1' : 'upload.php';
+    if (typeof file === 'string' || isStream(file)) {
+      const fields = { folder: options?.folder, filename: options?.filename };
+      const partName = options?.filename ?? this.sourceName(file);
+      return this.request<UploadResponse>(endpoint, () => this.streamingForm(file, fields, options?.size, partName), typeof file === 'string');
+    }
+    return this.request<UploadResponse>(endpoint, () => {
+      const form = new FormData();
+      form.append('file', file as any);
+      if (options?.folder) form.append('folder', options.folder);
+      if (options?.filename) form.append('filename', options.filename);
+      return { method: 'POST', body: form };
+    });
+  }
+
+  async uploadMany(items: UploadManyItem[], options?: { folder?: string; dedupe?: boolean; concurrency?: number }): Promise<UploadResponse[]> {
+    return mapLimit(items, options?.concurrency ?? 4, (item) => {
+      const { file, ...rest } = typeof item === 'object' && item !== null && 'file' in item ? item : { file: item as UploadSource };
+      return this.uploadFile(file, { folder: options?.folder, dedupe: options?.dedupe, ...rest });
+    });
+  }
+
+  // Packs files into multi-file upload.php requests (file[] fields) of at most maxBatchBytes and
+  // maxBatchFiles each; keep both within the gateway's HALAL_BLOB_BATCH_MAX_MB / _MAX_FILES.
+  // Results keep the input order; a request-level error is reported for every file it carried.
+  async uploadBatch(files: BatchSource[], options?: UploadBatchOptions): Promise<UploadResponse[]> {
+    const maxBytes = options?.maxBatchBytes ?? 20 * 1024 * 1024;
+    const maxFiles = Math.max(1, options?.maxBatchFiles ?? 20);
+    const entries = files.map((item) => (typeof item === 'object' && item !== null && 'file' in item ? item : { file: item, filename: undefined }));
+    const fs = entries.some(({ file }) => typeof file === 'string') ? await nodeModule('node:fs') : null;
+    const parts = await Promise.all(entries.map(async ({ file, filename }) => ({
+      blob: (typeof file === 'string' ? await fs.openAsBlob(file) : file instanceof Blob ? file : new Blob([file as any])) as Blob,
+      name: (filename ?? this.sourceName(file) ?? 'upload.bin').replace(/["\r\n]/g, '_'),
+    })));
+
+    const batches: number[][] = [];
+    let current: number[] = [];
+    let currentBytes = 0;
+    parts.forEach(({ blob }, index) => {
+      if (current.length > 0 && (current.length >= maxFiles || currentBytes + blob.size > maxBytes)) {
+        batches.push(current);
+        current = [];
+        currentBytes = 0;
+      }
+      current.push(index);
+      currentBytes += blob.size;
     });
-    return res.json();
+    if (current.length > 0) batches.push(current);
+
+    const results = new Array<UploadResponse>(files.length);
+    await mapLimit(batches, options?.concurrency ?? 2, async (batch) => {
+      const body = await this.request<BatchUploadResponse>('upload.php', () => {
+        const form = new FormData();
+        if (options?.folder) form.append('folder', options.folder);
+        for (const index of batch) form.append('file[]', parts[index].blob, parts[index].name);
+        return { method: 'POST', body: form };
+      });
+      if ('results' in body) {
+        for (const { index, ...result } of body.results) results[batch[index]] = result as UploadResponse;
+      }
+      for (const index of batch) {
+        results[index] ??= 'error' in body ? body : errorPayload('NO_FILE', 'No file uploaded');
+      }
+    });
+    return results;
+  }
+
+  async uploadLarge(file: Blob | File | Buffer, options?: UploadLargeOptions): Promise<UploadResponse> {
+    const blob = file instanceof Blob ? file : new Blob([file as any]);
+    const filename = options?.filename ?? ((file as any)?.name as string | undefined) ?? 'upload.bin';
+    const jsonHeaders = { 'Content-Type': 'application/json' };
+    const initBody = options?.uploadId
+      ? { upload_id: options.uploadId }
+      : { filename, size: blob.size, folder: options?.folder, chunk_size: options?.chunkSize };
+    const initEndpoint = options?.private ? 'upload_init.php?private=1' : 'upload_init.php';
+    const session = await this.request<UploadSessionResponse>(initEndpoint, () => ({ method: 'POST', headers: jsonHeaders, body: JSON.stringify(initBody) }));
+    if (!session.success) return session;
+
+    const received = new Set(session.received);
+    const pending: number[] = [];
+    for (let i = 0; i < session.chunks; i++) if (!received.has(i)) pending.push(i);
+    let sent = session.size - pending.reduce((sum, i) => sum + Math.min(session.chunk_size, session.size - i * session.chunk_size), 0);
+    let failure = null as ErrorPayload | null;
+
+    const worker = async () => {
+      while (!failure && pending.length > 0) {
+        const index = pending.shift()!;
+        const start = index * session.chunk_size;
+        const chunk = blob.slice(start, Math.min(start + session.chunk_size, session.size));
+        const body = await this.request<any>(`upload_chunk.php?upload_id=${session.upload_id}&index=${index}`, () => ({
+          method: 'POST',
+          headers: { 'Content-Type': 'application/octet-stream' },
+          body: chunk,
+        }));
+        if (!body.success) { failure = body; return; }
+        sent += chunk.size;
+        options?.onProgress?.(sent, session.size);
+      }
+    };
+    await Promise.all(Array.from({ length: Math.max(1, options?.concurrency ?? 4) }, worker));
+    if (failure) return failure;
+
+    return this.request<UploadResponse>('upload_complete.php', () => ({ method: 'POST', headers: jsonHeaders, body: JSON.stringify({ upload_id: session.upload_id }) }));
+  }
+
+  async exists(sha256: string, options?: { folder?: string; filename?: string; private?: boolean }): Promise<ExistsResponse> {
+    return this.request<ExistsResponse>(options?.private ? 'exists.php?private=1' : 'exists.php', () => ({
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ sha256, folder: options?.folder, filename: options?.filename }),
+    }));
+  }
+
+  variantUrl(path: string, options: VariantOptions): string {
+    const quality = options.quality ?? 80;
+    const format = options.format ?? 'webp';
+    const clean = path.replace(/^\/+/, '');
+    return `${this.baseUrl}/variants/w${Math.round(options.width)}q${Math.round(quality)}/${clean}.${format}`;
+  }
+
+  variantSrcSet(path: string, widths: number[], options?: Omit<VariantOptions, 'width'>): string {
+    return widths.map((width) => `${this.variantUrl(path, { ...options, width })} ${width}w`).join(', ');
   }
 
-  async deleteFile(path: string): Promise<DeleteResponse> {
-    const res = await this.fetchImpl(`${this.baseUrl}/api/${this.blobPath}/delete.php`, {
+  async deleteFile(path: string, options?: { private?: boolean }): Promise<DeleteResponse> {
+    return this.request<DeleteResponse>(options?.private ? 'delete.php?private=1' : 'delete.php', () => ({
       method: 'POST',
-      headers: { 'X-Halal-Blob-Key': this.key, 'Content-Type': 'application/json' },
+      headers: { 'Content-Type': 'application/json' },
       body: JSON.stringify({ path }),
-    });
-    return res.json();
+    }));
+  }
+
+  // Sends paths to delete.php in bulk requests of up to batchSize paths (the gateway caps a
+  // request at 1000), concurrency at a time. Results keep the input order.
+  async deleteMany(paths: string[], options?: { batchSize?: number; concurrency?: number }): Promise<DeleteResponse[]> {
+    const size = Math.min(1000, Math.max(1, options?.batchSize ?? 1000));
+    const batches: string[][] = [];
+    for (let i = 0; i < paths.length; i += size) batches.push(paths.slice(i, i + size));
+    const responses = await mapLimit(batches, options?.concurrency ?? 2, (batch) =>
+      this.request<BulkDeleteResponse>('delete.php', () => ({
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ paths: batch }),
+      })),
+    );
+    return responses.flatMap((body, b) =>
+      batches[b].map((_, i): DeleteResponse => {
+        if ('results' in body && body.results[i]) return body.results[i];
+        return 'error' in body ? body : errorPayload('SERVER_ERROR', 'Missing delete result');
+      }),
+    );
+  }
+
+  // Removes a folder (blobs, sidecars, empty directories) in server-side passes bounded by
+  // HALAL_BLOB_DELETE_BUDGET_MS, following the continuation cursor until the gateway is done.
+  async deleteFolder(folder: string, options?: { onProgress?: (deleted: number) => void }): Promise<DeleteFolderResponse> {
+    let cursor: string | null = null;
+    let deleted = 0;
+    let failed = 0;
+    let bytes = 0;
+    for (;;) {
+      const body: DeleteFolderResponse = await this.request<DeleteFolderResponse>('delete.php', () => ({
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ folder, cursor }),
+      }));
+      if ('error' in body) return body;
+      deleted += body.deleted;
+      failed += body.failed;
+      bytes += body.bytes;
+      options?.onProgress?.(deleted);
+      if (body.done || !body.cursor) return { ...body, deleted, failed, bytes, success: failed === 0 };
+      cursor = body.cursor;
+    }
+  }
+
+  // Copies a file on the server (hard link where possible, no re-upload) into `folder`
+  // (default: its current folder), optionally as `filename` with the same extension.
+  async copyFile(from: string, options?: TransferOptions): Promise<UploadResponse> {
+    return this.transfer({ ...options, from }, false);
+  }
+
+  // Moves or renames a file with rename(); the sidecar, usage counters and list indexes follow it.
+  async moveFile(from: string, options?: TransferOptions): Promise<UploadResponse> {
+    return this.transfer({ ...options, from }, true);
+  }
+
+  // Batched copyFile: up to batchSize items (max 1000) per copy.php request; results keep the input order.
+  async copyMany(items: TransferItem[], options?: { folder?: string; batchSize?: number; concurrency?: number }): Promise<UploadResponse[]> {
+    return this.transferMany(items, false, options);
+  }
+
+  async moveMany(items: TransferItem[], options?: { folder?: string; batchSize?: number; concurrency?: number }): Promise<UploadResponse[]> {
+    return this.transferMany(items, true, options);
   }
 
-  async listFiles(options?: { folder?: string; page?: number; perPage?: number }): Promise<ListResponse> {
+  async stats(folder?: string): Promise<StatsResponse> {
+    const query = folder ? `?folder=${encodeURIComponent(folder)}` : '';
+    return this.request<StatsResponse>(`stats.php${query}`);
+  }
+
+  // The last listCacheSize pages are kept with the ETag list.php sent; asking for one again
+  // revalidates with If-None-Match and reuses the cached page (same object) on 304.
+  async listFiles(options?: ListOptions): Promise<ListResponse> {
     const params = new URLSearchParams();
     if (options?.folder) params.set('folder', options.folder);
-    if (options?.page) params.set('page', String(options.page));
+    if (options?.private) params.set('private', '1');
+    if (options?.cursor) params.set('cursor', options.cursor);
+    else if (options?.after) params.set('after', options.after);
+    else if (options?.page) params.set('page', String(options.page));
     if (options?.perPage) params.set('per_page', String(options.perPage));
-    const url = `${this.baseUrl}/api/${this.blobPath}/list.php` + (params.toString() ? `?${params.toString()}` : '');
-    const res = await this.fetchImpl(url, { headers: { 'X-Halal-Blob-Key': this.key } });
-    return res.json();
+    if (options?.folders) params.set('folders', '1');
+    const endpoint = 'list.php' + (params.toString() ? `?${params.toString()}` : '');
+    const cached = this.listCache.get(endpoint);
+    const seen: { etag?: string | null } = {};
+    const body = await this.request<ListResponse>(endpoint, () => (cached ? { headers: { 'If-None-Match': cached.etag } } : {}), true, (res) => {
+      if (res.status === 304 && cached) return cached.body;
+      seen.etag = res.headers.get('ETag');
+      return undefined;
+    });
+    this.listCache.delete(endpoint);
+    const entry = body === cached?.body ? cached : seen.etag && body.success ? { etag: seen.etag, body } : undefined;
+    if (entry && this.listCacheSize > 0) {
+      this.listCache.set(endpoint, entry);
+      if (this.listCache.size > this.listCacheSize) this.listCache.delete(this.listCache.keys().next().value as string);
+    }
+    return body;
+  }
+
+  // Yields every file in a folder in name order, requesting the next page as soon as the
+  // current one arrives. Pages are keyed on the last path seen (after=), so concurrent
+  // uploads and deletes never shift items into a page already read. With recursive,
+  // subfolders follow depth-first in name order; one deleted mid-walk is skipped.
+  async *listAll(options?: ListAllOptions): AsyncGenerator<ListItem> {
+    const top = options?.folder ?? '';
+    const stack = [top];
+    while (stack.length) {
+      const folder = stack.pop()!;
+      const fetchPage = (after?: string) =>
+        this.listFiles({ folder, after, perPage: options?.perPage ?? 100, private: options?.private, folders: options?.recursive && after === undefined });
+      let subfolders: string[] = [];
+      let next: Promise<ListResponse> | null = fetchPage();
+      while (next) {
+        const page: ListResponse = await next;
+        if (!page.success) {
+          if (folder !== top && page.error.code === 'FOLDER_INVALID') break;
+          throw new HalalBlobError(page.error.code, page.error.message);
+        }
+        subfolders = page.folders ?? subfolders;
+        const last = page.files[page.files.length - 1];
+        next = page.next_cursor && last ? fetchPage(last.path) : null;
+        for (const item of page.files) yield item;
+      }
+      stack.push(...[...subfolders].reverse());
+    }
+  }
+
+  async getChanges(options?: { since?: number; limit?: number }): Promise<ChangesResponse> {
+    const params = new URLSearchParams({ since: String(options?.since ?? 0) });
+    if (options?.limit) params.set('limit', String(options.limit));
+    return this.request<ChangesResponse>(`changes.php?${params.toString()}`);
+  }
+
+  // Tails the change journal after `since` (0 = everything still retained); store each
+  // event's seq to resume there. With follow it keeps polling once caught up, until
+  // `signal` aborts. Throws HalalBlobError; CURSOR_EXPIRED means the journal was pruned
+  // past the cursor: re-list, then resume from the head getChanges reports.
+  async *changes(options?: ChangesOptions): AsyncGenerator<ChangeEvent> {
+    let since = options?.since ?? 0;
+    for (;;) {
+      const page = await this.getChanges({ since, limit: options?.limit });
+      if (!page.success) throw new HalalBlobError(page.error.code, page.error.message);
+      for (const event of page.changes) yield event;
+      since = page.next_since;
+      if (page.has_more) continue;
+      if (!options?.follow || options.signal?.aborted) return;
+      await sleep(options.pollIntervalMs ?? 5000);
+      if (options.signal?.aborted) return;
+    }
   }
 }
 """
     )
-    content = head + version_line + tail
-    (sdk_dir / "halalBlobClient.ts").write_text(content, encoding="utf-8")
+    _write_text_if_changed(root_path / "sdk" / "node" / "halalBlobClient.ts", head + version_line + tail)
+
+
+def write_python_sdk(root_path: Path) -> None:
+    head = (
+        r'''"""Async Python client for the Halal Blob gateway.
+
+Usage example (requires httpx: `pip install httpx`):
+
+    import asyncio
+    from halal_blob_client import HalalBlobClient
+
+    async def main():
+        async with HalalBlobClient(base_url="https://blob.example.com", key="...") as client:
+            await client.ping()
+            results = await client.upload_many(["a.jpg", "b.png"], folder="images", concurrency=8)
+            async for item in client.iter_files(folder="images"):
+                print(item["path"])
+
+    asyncio.run(main())
+"""
+
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterable, Optional, Union
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import os
+import random
+import time
+
+import httpx
+'''
+    )
+    version_line = f"\nHALAL_BLOB_SDK_VERSION = \"{__version__}\"\n"
+    tail = (
+        r'''
+PathLike = Union[str, "os.PathLike[str]"]
+RETRY_STATUSES = frozenset({500, 502, 503, 504})
+
+
+class HalalBlobError(Exception):
+    def __init__(self, code: str, message: str) -> None:
+        super().__init__(f"{code}: {message}")
+        self.code = code
+        self.message = message
+
+
+def _error(code: str, message: str) -> dict:
+    return {"success": False, "error": {"code": code, "message": message}}
+
+
+def _sha256_file(path: Path, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for block in iter(lambda: handle.read(chunk_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class HalalBlobClient:
+    """Pooled keep-alive client; reuse one instance per process and close it with `aclose()`."""
+
+    def __init__(
+        self,
+        base_url: str,
+        key: str,
+        blob_path: str = "blob",
+        *,
+        max_connections: int = 16,
+        timeout: float = 60.0,
+        retries: int = 3,
+        backoff: float = 0.5,
+        client: Optional[httpx.AsyncClient] = None,
+    ) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.key = key
+        self.blob_path = blob_path.strip("/") or "blob"
+        self.retries = max(0, retries)
+        self.backoff = backoff
+        self._owns_client = client is None
+        self._client = client or httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            headers={"User-Agent": f"halal-blob-client-python/{HALAL_BLOB_SDK_VERSION}"},
+        )
+
+    async def __aenter__(self) -> "HalalBlobClient":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        if self._owns_client:
+            await self._client.aclose()
+
+    def _url(self, endpoint: str) -> str:
+        return f"{self.base_url}/api/{self.blob_path}/{endpoint}"
+
+    async def _request(self, method: str, endpoint: str, build: Optional[Callable[[], dict]] = None, **kwargs: Any) -> dict:
+        """Send a request, retrying transport errors and 5xx with jittered exponential backoff.
+
+        `build` is called once per attempt so streamed bodies (open file handles) are
+        recreated from the start on every retry.
+        """
+        headers = {"X-Halal-Blob-Key": self.key}
+        attempt = 0
+        while True:
+            handles: list = []
+            request_kwargs = dict(kwargs)
+            if build is not None:
+                extra = build()
+                handles = extra.pop("_handles", [])
+                request_kwargs.update(extra)
+            try:
+                res = await self._client.request(method, self._url(endpoint), headers=headers, **request_kwargs)
+            except httpx.TransportError as exc:
+                if attempt >= self.retries:
+                    return _error("NETWORK_ERROR", str(exc) or exc.__class__.__name__)
+                res = None
+            finally:
+                for handle in handles:
+                    handle.close()
+            if res is not None and (res.status_code not in RETRY_STATUSES or attempt >= self.retries):
+                try:
+                    return res.json()
+                except ValueError:
+                    return _error("SERVER_ERROR", f"Unexpected HTTP {res.status_code} response")
+            await asyncio.sleep(self.backoff * (2 ** attempt) * (0.5 + random.random()))
+            attempt += 1
+
+    async def ping(self) -> dict:
+        return await self._request("GET", "ping.php")
+
+    def create_upload_token(
+        self,
+        *,
+        folder: str = "",
+        max_bytes: Optional[int] = None,
+        types: Optional[Iterable[str]] = None,
+        ttl: int = 300,
+        private: bool = False,
+    ) -> dict:
+        """Mint a short-lived HMAC-signed token that lets a browser POST straight to
+        `upload.php` (as `?token=` or `X-Halal-Blob-Token`) without the key.
+
+        Returns `{"token", "url", "expires_at"}`; the token pins the folder and optionally a
+        per-file size cap and allowed extensions on top of the gateway's own limits.
+        `private=True` stores the uploads in the private area (see `signed_url`).
+        """
+        claims: dict = {"scope": "upload", "folder": folder.strip("/"), "exp": int(time.time()) + ttl}
+        if max_bytes is not None:
+            claims["max_bytes"] = int(max_bytes)
+        if types is not None:
+            claims["types"] = [value.lower() for value in types]
+        if private:
+            claims["private"] = True
+        token = self._sign(claims)
+        return {"token": token, "url": f"{self._url('upload.php')}?token={token}", "expires_at": claims["exp"]}
 
+    def signed_url(self, path: str, *, ttl: int = 3600) -> str:
+        """Return an expiring `download.php` URL for a private file; it serves Range requests."""
+        token = self._sign({"scope": "download", "path": path.lstrip("/"), "exp": int(time.time()) + ttl})
+        return f"{self._url('download.php')}?token={token}"
+
+    def _sign(self, claims: dict) -> str:
+        body = base64.urlsafe_b64encode(json.dumps(claims, separators=(",", ":")).encode()).decode().rstrip("=")
+        signature = hmac.new(self.key.encode(), body.encode(), hashlib.sha256).digest()
+        return f"{body}.{base64.urlsafe_b64encode(signature).decode().rstrip('=')}"
+
+    async def upload_file(
+        self,
+        path: PathLike,
+        *,
+        folder: Optional[str] = None,
+        filename: Optional[str] = None,
+        dedupe: bool = False,
+        private: bool = False,
+    ) -> dict:
+        """Upload one file from disk; the body is streamed, never read whole into memory.
+
+        `private=True` stores it outside the public tree; fetch it through `signed_url`.
+        """
+        path = Path(path)
+        if dedupe:
+            sha256 = await asyncio.to_thread(_sha256_file, path)
+            found = await self.exists(sha256, folder=folder, filename=filename or path.name, private=private)
+            if not found.get("success") or found.get("exists"):
+                return found
+        data = {name: value for name, value in (("folder", folder), ("filename", filename)) if value}
+
+        def build() -> dict:
+            handle = open(path, "rb")
+            return {"files": {"file": (path.name, handle, "application/octet-stream")}, "data": data, "_handles": [handle]}
+
+        return await self._request("POST", "upload.php", build, params={"private": 1} if private else {})
+
+    async def upload_batch(
+        self,
+        paths: Iterable[PathLike],
+        *,
+        folder: Optional[str] = None,
+        max_batch_bytes: int = 20 * 1024 * 1024,
+        max_batch_files: int = 20,
+        concurrency: int = 2,
+    ) -> list:
+        """Upload files as multi-file `file[]` requests packed up to the batch caps.
+
+        Keep the caps within the gateway's HALAL_BLOB_BATCH_MAX_MB / _MAX_FILES. Results
+        keep the input order; a request-level error is reported for every file it carried.
+        """
+        paths = [Path(path) for path in paths]
+        sizes = await asyncio.to_thread(lambda: [path.stat().st_size for path in paths])
+        batches: list = []
+        current: list = []
+        current_bytes = 0
+        for index, size in enumerate(sizes):
+            if current and (len(current) >= max(1, max_batch_files) or current_bytes + size > max_batch_bytes):
+                batches.append(current)
+                current, current_bytes = [], 0
+            current.append(index)
+            current_bytes += size
+        if current:
+            batches.append(current)
+
+        results: list = [None] * len(paths)
+        data = {"folder": folder} if folder else {}
+
+        async def send(batch: list) -> dict:
+            def build() -> dict:
+                handles = [open(paths[index], "rb") for index in batch]
+                files = [("file[]", (paths[index].name, handle, "application/octet-stream")) for index, handle in zip(batch, handles)]
+                return {"files": files, "data": data, "_handles": handles}
+
+            body = await self._request("POST", "upload.php", build)
+            for result in body.get("results", []):
+                result = dict(result)
+                results[batch[result.pop("index")]] = result
+            for index in batch:
+                if results[index] is None:
+                    results[index] = body if "error" in body else _error("NO_FILE", "No file uploaded")
+            return body
+
+        await self._gather_limited(batches, send, concurrency)
+        return results
+
+    async def exists(self, sha256: str, *, folder: Optional[str] = None, filename: Optional[str] = None, private: bool = False) -> dict:
+        return await self._request(
+            "POST", "exists.php", json={"sha256": sha256, "folder": folder, "filename": filename}, params={"private": 1} if private else {}
+        )
+
+    async def delete_file(self, path: str, *, private: bool = False) -> dict:
+        return await self._request("POST", "delete.php", json={"path": path}, params={"private": 1} if private else {})
+
+    async def copy_file(self, path: str, *, folder: Optional[str] = None, filename: Optional[str] = None) -> dict:
+        """Copy a file on the server (hard link where possible) without re-uploading it."""
+        return await self._request("POST", "copy.php", json={"from": path, "folder": folder, "filename": filename})
+
+    async def move_file(self, path: str, *, folder: Optional[str] = None, filename: Optional[str] = None) -> dict:
+        """Move or rename a file on the server; its sidecar and list index entry follow it."""
+        return await self._request("POST", "copy.php", json={"from": path, "folder": folder, "filename": filename, "move": True})
+
+    async def list_files(
+        self,
+        *,
+        folder: Optional[str] = None,
+        page: Optional[int] = None,
+        per_page: Optional[int] = None,
+        cursor: Optional[str] = None,
+        private: bool = False,
+    ) -> dict:
+        params: dict = {}
+        if folder:
+            params["folder"] = folder
+        if private:
+            params["private"] = 1
+        if cursor:
+            params["cursor"] = cursor
+        elif page:
+            params["page"] = page
+        if per_page:
+            params["per_page"] = per_page
+        return await self._request("GET", "list.php", params=params)
+
+    async def stats(self, folder: Optional[str] = None) -> dict:
+        """Return file count, bytes, per-MIME usage and quota for one folder."""
+        return await self._request("GET", "stats.php", params={"folder": folder} if folder else {})
+
+    async def changes(self, *, since: int = 0, limit: Optional[int] = None) -> dict:
+        """Return one page of the change journal after the `since` seq."""
+        params: dict = {"since": since}
+        if limit:
+            params["limit"] = limit
+        return await self._request("GET", "changes.php", params=params)
+
+    async def iter_changes(
+        self,
+        *,
+        since: int = 0,
+        limit: Optional[int] = None,
+        follow: bool = False,
+        poll_interval: float = 5.0,
+    ) -> AsyncIterator[dict]:
+        """Yield journal events (`put`/`delete`) after `since` in order; store each `seq` to resume.
+
+        With `follow=True` it keeps polling every `poll_interval` seconds once caught up.
+        `HalalBlobError` with code CURSOR_EXPIRED means the journal was pruned past the
+        cursor: re-list, then resume from the `head` that `changes()` reports.
+        """
+        while True:
+            body = await self.changes(since=since, limit=limit)
+            if not body.get("success"):
+                error = body.get("error") or {}
+                raise HalalBlobError(error.get("code", "SERVER_ERROR"), error.get("message", "Changes failed"))
+            for event in body.get("changes", []):
+                yield event
+            since = body.get("next_since", since)
+            if body.get("has_more"):
+                continue
+            if not follow:
+                return
+            await asyncio.sleep(poll_interval)
+
+    async def iter_files(self, *, folder: Optional[str] = None, per_page: int = 100) -> AsyncIterator[dict]:
+        """Yield every file in `folder`, fetching pages lazily via `next_cursor`."""
+        cursor: Optional[str] = None
+        while True:
+            body = await self.list_files(folder=folder, per_page=per_page, cursor=cursor)
+            if not body.get("success"):
+                error = body.get("error") or {}
+                raise HalalBlobError(error.get("code", "SERVER_ERROR"), error.get("message", "List failed"))
+            for item in body.get("files", []):
+                yield item
+            cursor = body.get("next_cursor")
+            if not cursor:
+                return
+
+    async def _gather_limited(self, items: Iterable[Any], worker: Callable[[Any], Awaitable[dict]], concurrency: int) -> list:
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def run(item: Any) -> dict:
+            async with semaphore:
+                return await worker(item)
+
+        return await asyncio.gather(*(run(item) for item in items))
+
+    async def upload_many(
+        self,
+        paths: Iterable[PathLike],
+        *,
+        folder: Optional[str] = None,
+        concurrency: int = 4,
+        dedupe: bool = False,
+    ) -> list:
+        """Upload several files at most `concurrency` at a time; results keep the input order."""
+        return await self._gather_limited(
+            paths, lambda path: self.upload_file(path, folder=folder, dedupe=dedupe), concurrency
+        )
+
+    async def delete_many(self, paths: Iterable[str], *, batch_size: int = 1000, concurrency: int = 2) -> list:
+        """Delete files through bulk requests of up to `batch_size` paths (the gateway caps a
+        request at 1000), `concurrency` at a time; results keep the input order."""
+        paths = list(paths)
+        size = min(1000, max(1, batch_size))
+        batches = [paths[i:i + size] for i in range(0, len(paths), size)]
+
+        async def send(batch: list) -> list:
+            body = await self._request("POST", "delete.php", json={"paths": batch})
+            results = body.get("results") or []
+            fallback = body if "error" in body else _error("SERVER_ERROR", "Missing delete result")
+            return [results[i] if i < len(results) else fallback for i in range(len(batch))]
+
+        responses = await self._gather_limited(batches, send, concurrency)
+        return [result for batch in responses for result in batch]
+
+    async def copy_many(self, items: Iterable[Any], *, folder: Optional[str] = None, batch_size: int = 1000, concurrency: int = 2) -> list:
+        """Copy paths (or `{"from", "folder", "filename"}` dicts) through batched `copy.php`
+        requests; one result per item in input order."""
+        return await self._transfer_many(items, False, folder, batch_size, concurrency)
+
+    async def move_many(self, items: Iterable[Any], *, folder: Optional[str] = None, batch_size: int = 1000, concurrency: int = 2) -> list:
+        """Batched `move_file`; one result per item in input order."""
+        return await self._transfer_many(items, True, folder, batch_size, concurrency)
+
+    async def _transfer_many(self, items: Iterable[Any], move: bool, folder: Optional[str], batch_size: int, concurrency: int) -> list:
+        items = list(items)
+        size = min(1000, max(1, batch_size))
+        batches = [items[i:i + size] for i in range(0, len(items), size)]
+
+        async def send(batch: list) -> list:
+            body = await self._request("POST", "copy.php", json={"items": batch, "folder": folder, "move": move})
+            results = body.get("results") or []
+            fallback = body if "error" in body else _error("SERVER_ERROR", "Missing transfer result")
+            return [results[i] if i < len(results) else fallback for i in range(len(batch))]
+
+        responses = await self._gather_limited(batches, send, concurrency)
+        return [result for batch in responses for result in batch]
+
+    async def delete_folder(self, folder: str, *, on_progress: Optional[Callable[[int], None]] = None) -> dict:
+        """Remove a folder in server-side passes bounded by HALAL_BLOB_DELETE_BUDGET_MS,
+        following the continuation cursor until the gateway reports `done`."""
+        cursor: Optional[str] = None
+        totals = {"deleted": 0, "failed": 0, "bytes": 0}
+        while True:
+            body = await self._request("POST", "delete.php", json={"folder": folder, "cursor": cursor})
+            if "error" in body:
+                return body
+            for key in totals:
+                totals[key] += body.get(key, 0)
+            if on_progress is not None:
+                on_progress(totals["deleted"])
+            if body.get("done") or not body.get("cursor"):
+                return {**body, **totals, "success": totals["failed"] == 0}
+            cursor = body["cursor"]
+'''
+    )
+    _write_text_if_changed(root_path / "sdk" / "python" / "halal_blob_client.py", head + version_line + tail)
@@ -0,0 +1,179 @@
+"""Summarize Halal Blob access logs (HALAL_BLOB_ACCESS_LOG="true").
+
+Each request appends one JSON line to `meta/.logs/access-YYYYMMDD.ndjson` with its
+total time, per-phase timings and byte counts. Stream any number of those files
+(plain or .gz, or '-' for stdin) through this script:
+
+    python tools/analyze_logs.py meta/.logs/access-*.ndjson --bucket 60
+
+It reports p50/p95/p99 per endpoint and per phase plus requests and bytes per
+time bucket. Latencies go into log-scale histograms, so memory does not grow
+with the number of requests.
+"""
+
+from datetime import datetime, timezone
+from pathlib import Path
+import argparse
+import gzip
+import json
+import math
+import sys
+
+PERCENTILES = (0.50, 0.95, 0.99)
+
+
+class Histogram:
+    """Log-bucketed latency histogram with about 1% relative error."""
+
+    GROWTH = 1.02
+    FLOOR_MS = 0.01
+
+    def __init__(self) -> None:
+        self.counts = {}
+        self.total = 0
+        self.max = 0.0
+
+    def add(self, ms: float) -> None:
+        key = 0 if ms <= self.FLOOR_MS else int(math.log(ms / self.FLOOR_MS, self.GROWTH)) + 1
+        self.counts[key] = self.counts.get(key, 0) + 1
+        self.total += 1
+        self.max = max(self.max, ms)
+
+    def percentile(self, q: float) -> float:
+        rank = max(1, math.ceil(q * self.total))
+        seen = 0
+        for key in sorted(self.counts):
+            seen += self.counts[key]
+            if seen >= rank:
+                return min(self.max, self.FLOOR_MS * self.GROWTH ** key)
+        return self.max
+
+    def summary(self) -> dict:
+        result = {"count": self.total}
+        for q in PERCENTILES:
+            result[f"p{int(q * 100)}"] = round(self.percentile(q), 3)
+        result["max"] = round(self.max, 3)
+        return result
+
+
+def open_log(path: str):
+    if path == "-":
+        return sys.stdin
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, encoding="utf-8")
+
+
+def iter_entries(paths):
+    for path in paths:
+        handle = open_log(path)
+        try:
+            for line in handle:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(entry, dict):
+                    yield entry
+        finally:
+            if handle is not sys.stdin:
+                handle.close()
+
+
+def analyze(entries, bucket_seconds: int) -> dict:
+    endpoints = {}
+    buckets = {}
+    skipped = 0
+    for entry in entries:
+        try:
+            endpoint = str(entry["endpoint"])
+            total_ms = float(entry["total_ms"])
+            stamp = datetime.fromisoformat(entry["ts"]).timestamp()
+            phases = [(str(phase), float(ms)) for phase, ms in (entry.get("phases") or {}).items()]
+            bytes_in = int(entry.get("bytes_in") or 0)
+            bytes_out = int(entry.get("bytes_out") or 0)
+        except (AttributeError, KeyError, TypeError, ValueError):
+            skipped += 1
+            continue
+        stats = endpoints.setdefault(endpoint, {"total": Histogram(), "phases": {}, "status": {}, "bytes_in": 0, "bytes_out": 0})
+        stats["total"].add(total_ms)
+        for phase, ms in phases:
+            stats["phases"].setdefault(phase, Histogram()).add(ms)
+        status = str(entry.get("status", ""))
+        stats["status"][status] = stats["status"].get(status, 0) + 1
+        stats["bytes_in"] += bytes_in
+        stats["bytes_out"] += bytes_out
+
+        start = int(stamp // bucket_seconds) * bucket_seconds
+        bucket = buckets.setdefault(start, {"requests": 0, "bytes_in": 0, "bytes_out": 0})
+        bucket["requests"] += 1
+        bucket["bytes_in"] += bytes_in
+        bucket["bytes_out"] += bytes_out
+
+    return {
+        "skipped": skipped,
+        "endpoints": {
+            name: {
+                "total_ms": stats["total"].summary(),
+                "phases_ms": {phase: hist.summary() for phase, hist in sorted(stats["phases"].items())},
+                "status": dict(sorted(stats["status"].items())),
+                "bytes_in": stats["bytes_in"],
+                "bytes_out": stats["bytes_out"],
+            }
+            for name, stats in sorted(endpoints.items())
+        },
+        "throughput": [
+            {
+                "start": datetime.fromtimestamp(start, timezone.utc).isoformat(timespec="seconds"),
+                "requests": bucket["requests"],
+                "requests_per_s": round(bucket["requests"] / bucket_seconds, 3),
+                "bytes_in_per_s": round(bucket["bytes_in"] / bucket_seconds, 1),
+                "bytes_out_per_s": round(bucket["bytes_out"] / bucket_seconds, 1),
+            }
+            for start, bucket in sorted(buckets.items())
+        ],
+    }
+
+
+def format_row(label: str, summary: dict) -> str:
+    return f"  {label:<16} {summary['count']:>8} {summary['p50']:>10} {summary['p95']:>10} {summary['p99']:>10} {summary['max']:>10}"
+
+
+def print_report(report: dict) -> None:
+    header = f"  {'phase':<16} {'count':>8} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'max ms':>10}"
+    for name, stats in report["endpoints"].items():
+        statuses = ", ".join(f"{code}: {count}" for code, count in stats["status"].items())
+        print(f"{name}  ({statuses}; in {stats['bytes_in']} B, out {stats['bytes_out']} B)")
+        print(header)
+        print(format_row("total", stats["total_ms"]))
+        for phase, summary in stats["phases_ms"].items():
+            print(format_row(phase, summary))
+        print()
+    if report["throughput"]:
+        print(f"  {'bucket start':<26} {'requests':>9} {'req/s':>9} {'in B/s':>12} {'out B/s':>12}")
+        for bucket in report["throughput"]:
+            print(f"  {bucket['start']:<26} {bucket['requests']:>9} {bucket['requests_per_s']:>9} {bucket['bytes_in_per_s']:>12} {bucket['bytes_out_per_s']:>12}")
+    if report["skipped"]:
+        print(f"\nSkipped {report['skipped']} malformed line(s).")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Report latency percentiles and throughput from access logs.")
+    parser.add_argument("logs", nargs="+", help="NDJSON access logs (.ndjson, .ndjson.gz or '-' for stdin)")
+    parser.add_argument("--bucket", type=int, default=60, help="Throughput bucket size in seconds")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    paths = [path if path == "-" else str(Path(path)) for path in args.logs]
+    report = analyze(iter_entries(paths), max(1, args.bucket))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,353 @@
+"""Check and repair a Halal Blob `blob/` + `meta/` tree offline.
+
+Run against a downloaded or mounted copy of the gateway root (the folder holding
+`.env`, `blob/`, `meta/`), or on the server itself:
+
+    python tools/blob_fsck.py scan --plan plan.ndjson
+    python tools/blob_fsck.py apply plan.ndjson
+
+`scan` walks both trees with a process pool and writes a repair plan, one JSON
+action per line:
+
+    write_meta     blob without a sidecar, or with a corrupt/stale one; the rebuilt
+                   sidecar (size, sniffed MIME, mtime) is included in the action
+    remove_meta    sidecar whose blob is gone
+    remove_sibling .br/.gz file whose blob is gone
+    reindex        folder whose `.index.sqlite` must be rebuilt
+
+`apply` re-checks each action before performing it, so a plan can be applied to
+a live tree. Directories are streamed in batches and only checked by existence,
+so memory stays flat even for folders with millions of files. `apply` deletes
+the `.usage.json` counters of every folder it repaired so the gateway reseeds
+them (and quotas see the repaired totals); `meta/.cas`, `meta/.uploads` and
+other dotfiles are never touched.
+"""
+
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime, timezone
+from pathlib import Path
+import argparse
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import sys
+
+SIBLING_SUFFIXES = (".br", ".gz")
+SHARDED_PATH = re.compile(r"^(?:(.*)/)?([0-9a-f]{2})/([0-9a-f]{2})/(\2\3[^/]*)$")
+SHA256_NAME = re.compile(r"^[0-9a-f]{64}(\.[A-Za-z0-9]+)?$")
+MAGIC = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"%PDF-", "application/pdf"),
+    (b"\x1a\x45\xdf\xa3", "video/webm"),
+    (b"ID3", "audio/mpeg"),
+    (b"\xff\xfb", "audio/mpeg"),
+    (b"\xff\xf3", "audio/mpeg"),
+    (b"\xff\xf2", "audio/mpeg"),
+)
+
+
+def read_env(root: Path) -> dict:
+    env = {}
+    env_path = root / ".env"
+    if not env_path.is_file():
+        return env
+    for line in env_path.read_text(encoding="utf-8").splitlines():
+        line = line.strip()
+        if not line or line.startswith(("#", ";")) or "=" not in line:
+            continue
+        key, value = line.split("=", 1)
+        env[key.strip()] = value.strip().strip('"').strip("'")
+    return env
+
+
+def folder_of(rel_path: str) -> str:
+    match = SHARDED_PATH.match(rel_path)
+    if match:
+        return match.group(1) or ""
+    return rel_path.rpartition("/")[0]
+
+
+def sniff_mime(path: Path) -> str:
+    with open(path, "rb") as handle:
+        head = handle.read(32)
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head[4:8] == b"ftyp":
+        return "video/quicktime" if head[8:10] == b"qt" else "video/mp4"
+    for magic, mime in MAGIC:
+        if head.startswith(magic):
+            return mime
+    if head and b"\0" not in head:
+        try:
+            text = head.decode("utf-8")
+        except UnicodeDecodeError as exc:
+            text = head[:exc.start].decode("utf-8") if exc.start >= len(head) - 3 else "\0"
+        if not any(ord(char) < 32 and char not in "\t\n\r\f" for char in text):
+            return "application/json" if text.lstrip()[:1] in ("{", "[") else "text/plain"
+    return "application/octet-stream"
+
+
+def sha256_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for block in iter(lambda: handle.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def rebuilt_meta(settings: dict, blob_file: Path, rel_path: str, stat: os.stat_result, old) -> dict:
+    meta = dict(old) if isinstance(old, dict) else {}
+    name = rel_path.rpartition("/")[2]
+    meta["path"] = rel_path
+    meta["url"] = f"{settings['base_url']}/{settings['blob_path']}/{rel_path}"
+    meta["size_bytes"] = stat.st_size
+    meta["mime_type"] = sniff_mime(blob_file)
+    meta.setdefault("original_name", name)
+    meta.setdefault("uploaded_at", datetime.fromtimestamp(stat.st_mtime, timezone.utc).isoformat(timespec="seconds"))
+    meta.setdefault("client_ip", "")
+    meta["folder"] = folder_of(rel_path)
+    if settings["dedup"] and SHA256_NAME.match(name) and "sha256" not in meta:
+        meta["sha256"] = sha256_file(blob_file)
+    return meta
+
+
+def check_blob_batch(settings: dict, rel_dir: str, names: list) -> list:
+    blob_dir = Path(settings["blob_root"], rel_dir)
+    meta_dir = Path(settings["meta_root"], rel_dir)
+    actions = []
+    for name in names:
+        rel_path = f"{rel_dir}/{name}" if rel_dir else name
+        if name.endswith(SIBLING_SUFFIXES):
+            base = name[:-3]
+            if not (blob_dir / base).is_file():
+                actions.append({"action": "remove_sibling", "path": rel_path, "reason": "orphan"})
+            continue
+        blob_file = blob_dir / name
+        try:
+            stat = blob_file.stat()
+        except OSError:
+            continue
+        old, reason = None, None
+        try:
+            raw = (meta_dir / f"{name}.json").read_text(encoding="utf-8")
+        except FileNotFoundError:
+            reason = "missing"
+        except (OSError, UnicodeDecodeError):
+            reason = "corrupt"
+        else:
+            try:
+                old = json.loads(raw)
+            except ValueError:
+                old = None
+            if not isinstance(old, dict):
+                old, reason = None, "corrupt"
+            elif old.get("path") != rel_path or old.get("size_bytes") != stat.st_size:
+                reason = "stale"
+        if reason is not None:
+            meta = rebuilt_meta(settings, blob_file, rel_path, stat, old)
+            actions.append({"action": "write_meta", "path": rel_path, "reason": reason, "meta": meta})
+    return actions
+
+
+def check_meta_batch(settings: dict, rel_dir: str, names: list) -> list:
+    blob_dir = Path(settings["blob_root"], rel_dir)
+    actions = []
+    for name in names:
+        if not name.endswith(".json"):
+            continue
+        if not (blob_dir / name[:-5]).is_file():
+            rel_path = f"{rel_dir}/{name[:-5]}" if rel_dir else name[:-5]
+            actions.append({"action": "remove_meta", "path": rel_path, "reason": "orphan"})
+    return actions
+
+
+def check_batch(task: tuple) -> tuple:
+    kind, settings, rel_dir, names = task
+    checker = check_blob_batch if kind == "blob" else check_meta_batch
+    return kind, len(names), checker(settings, rel_dir, names)
+
+
+def iter_batches(root: Path, batch_size: int):
+    """Yield (rel_dir, names) for every non-dot directory under root, names in bounded batches."""
+    stack = [""]
+    while stack:
+        rel_dir = stack.pop()
+        batch = []
+        try:
+            it = os.scandir(root / rel_dir if rel_dir else root)
+        except OSError:
+            continue
+        with it:
+            for entry in it:
+                if entry.name.startswith(".") or entry.name.endswith(".tmp"):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(f"{rel_dir}/{entry.name}" if rel_dir else entry.name)
+                elif entry.is_file():
+                    batch.append(entry.name)
+                    if len(batch) >= batch_size:
+                        yield rel_dir, batch
+                        batch = []
+        if batch:
+            yield rel_dir, batch
+
+
+def iter_tasks(settings: dict, batch_size: int):
+    for rel_dir, names in iter_batches(Path(settings["blob_root"]), batch_size):
+        yield ("blob", settings, rel_dir, names)
+    for rel_dir, names in iter_batches(Path(settings["meta_root"]), batch_size):
+        yield ("meta", settings, rel_dir, names)
+
+
+def iter_index_folders(meta_root: Path):
+    for db_path in meta_root.rglob(".index.sqlite"):
+        rel_dir = db_path.parent.relative_to(meta_root).as_posix()
+        yield "" if rel_dir == "." else rel_dir
+
+
+def scan(root: Path, out, workers: int, batch_size: int, reindex_all: bool, base_url: str) -> dict:
+    env = read_env(root)
+    blob_path = env.get("HALAL_BLOB_PATH", "blob").strip("/ ") or "blob"
+    settings = {
+        "blob_root": str(root / blob_path),
+        "meta_root": str(root / "meta"),
+        "blob_path": blob_path,
+        "base_url": (base_url or env.get("HALAL_BLOB_BASE_URL", "")).rstrip("/"),
+        "dedup": env.get("HALAL_BLOB_DEDUP", "false").lower() in ("1", "true", "yes", "on"),
+    }
+    if not Path(settings["blob_root"]).is_dir():
+        raise SystemExit(f"blob root not found: {settings['blob_root']}")
+
+    counts = {"blob_files": 0, "meta_files": 0, "write_meta": 0, "remove_meta": 0, "remove_sibling": 0, "reindex": 0}
+    dirty_folders = set()
+    tasks = iter_tasks(settings, batch_size)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        exhausted = False
+        while pending or not exhausted:
+            while not exhausted and len(pending) < workers * 4:
+                task = next(tasks, None)
+                if task is None:
+                    exhausted = True
+                else:
+                    pending.add(pool.submit(check_batch, task))
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                kind, checked, actions = future.result()
+                counts[f"{kind}_files"] += checked
+                for action in actions:
+                    counts[action["action"]] += 1
+                    dirty_folders.add(folder_of(action["path"]))
+                    out.write(json.dumps(action, separators=(",", ":")) + "\n")
+
+    meta_root = Path(settings["meta_root"])
+    if meta_root.is_dir():
+        for folder in iter_index_folders(meta_root):
+            if reindex_all or folder in dirty_folders:
+                counts["reindex"] += 1
+                out.write(json.dumps({"action": "reindex", "folder": folder}) + "\n")
+    return counts
+
+
+def write_json_atomic(path: Path, data: dict) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(data, indent=4), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def invalidate_index(db_path: Path) -> bool:
+    if not db_path.is_file():
+        return False
+    db = sqlite3.connect(str(db_path), timeout=5.0, isolation_level=None)
+    try:
+        db.execute("PRAGMA busy_timeout = 5000")
+        db.execute("DELETE FROM state")
+    finally:
+        db.close()
+    return True
+
+
+def apply_plan(root: Path, plan) -> dict:
+    env = read_env(root)
+    blob_root = root / (env.get("HALAL_BLOB_PATH", "blob").strip("/ ") or "blob")
+    meta_root = root / "meta"
+    counts = {"applied": 0, "skipped": 0, "reset_usage": 0}
+    repaired = set()
+    for line in plan:
+        line = line.strip()
+        if not line:
+            continue
+        action = json.loads(line)
+        kind = action.get("action")
+        done = False
+        if kind == "reindex":
+            folder = action.get("folder", "")
+            done = invalidate_index((meta_root / folder if folder else meta_root) / ".index.sqlite")
+        else:
+            rel_path = action.get("path", "")
+            if not rel_path or any(part in ("", ".", "..") for part in rel_path.split("/")):
+                counts["skipped"] += 1
+                continue
+            blob_file = blob_root / rel_path
+            if kind == "write_meta" and blob_file.is_file():
+                write_json_atomic(meta_root / f"{rel_path}.json", action["meta"])
+                done = True
+            elif kind == "remove_meta" and not blob_file.exists():
+                (meta_root / f"{rel_path}.json").unlink(missing_ok=True)
+                done = True
+            elif kind == "remove_sibling" and rel_path.endswith(SIBLING_SUFFIXES) and not (blob_root / rel_path[:-3]).exists():
+                blob_file.unlink(missing_ok=True)
+                done = True
+            if done:
+                repaired.add(folder_of(rel_path))
+        counts["applied" if done else "skipped"] += 1
+    for folder in sorted(repaired):
+        usage_path = (meta_root / folder if folder else meta_root) / ".usage.json"
+        if usage_path.is_file():
+            usage_path.unlink(missing_ok=True)
+            counts["reset_usage"] += 1
+    return counts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Check and repair a blob/ + meta/ tree.")
+    parser.add_argument("--root", type=Path, default=Path.cwd(), help="Gateway root holding .env, blob/ and meta/")
+    sub = parser.add_subparsers(dest="command", required=True)
+    scan_parser = sub.add_parser("scan", help="Write a repair plan (NDJSON)")
+    scan_parser.add_argument("--plan", type=Path, help="Plan file to write (default: stdout)")
+    scan_parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="Worker processes")
+    scan_parser.add_argument("--batch-size", type=int, default=1000, help="Directory entries checked per task")
+    scan_parser.add_argument("--reindex", action="store_true", help="Rebuild every folder index, not only repaired ones")
+    scan_parser.add_argument("--base-url", default="", help="Base URL for rebuilt sidecars (default: HALAL_BLOB_BASE_URL)")
+    apply_parser = sub.add_parser("apply", help="Apply a repair plan written by scan")
+    apply_parser.add_argument("plan", type=Path, help="Plan file ('-' for stdin)")
+    args = parser.parse_args()
+    root = args.root.resolve()
+
+    if args.command == "scan":
+        out = open(args.plan, "w", encoding="utf-8") if args.plan else sys.stdout
+        try:
+            counts = scan(root, out, max(1, args.workers), max(1, args.batch_size), args.reindex, args.base_url)
+        finally:
+            if out is not sys.stdout:
+                out.close()
+    else:
+        plan = sys.stdin if str(args.plan) == "-" else open(args.plan, encoding="utf-8")
+        try:
+            counts = apply_plan(root, plan)
+        finally:
+            if plan is not sys.stdin:
+                plan.close()
+    print(" ".join(f"{key}={value}" for key, value in counts.items()), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""Move a flat Halal Blob tree into the sharded layout.
+
+Run from the deployed gateway root (the folder holding `.env`, `blob/`, `meta/`):
+
+    python tools/migrate_layout.py --batch-size 500
+
+Set HALAL_BLOB_LAYOUT="sharded" in `.env` first so new uploads land in shards
+while old ones are being moved. Each file is its own short index update, so live
+uploads never wait on the migration; batches only pace the run. Cached variants
+and dedup records follow each file to its shard, and the `blob/.htaccess`
+rewrite keeps old flat URLs resolving during and after the move. Re-run until
+it reports nothing left to move.
+"""
+
+from pathlib import Path
+import argparse
+import fcntl
+import json
+import os
+import re
+import sqlite3
+import time
+
+STORED_NAME = re.compile(r"^[0-9a-f]{32}([0-9a-f]{32})?(\.[A-Za-z0-9]+)?$")
+SHARD_DIR = re.compile(r"^[0-9a-f]{2}$")
+
+
+def read_env(root: Path) -> dict:
+    env = {}
+    env_path = root / ".env"
+    if not env_path.is_file():
+        return env
+    for line in env_path.read_text(encoding="utf-8").splitlines():
+        line = line.strip()
+        if not line or line.startswith(("#", ";")) or "=" not in line:
+            continue
+        key, value = line.split("=", 1)
+        env[key.strip()] = value.strip().strip('"').strip("'")
+    return env
+
+
+def is_shard_dir(path: Path) -> bool:
+    if not SHARD_DIR.match(path.name):
+        return False
+    with os.scandir(path) as it:
+        return all(entry.is_dir() and SHARD_DIR.match(entry.name) for entry in it)
+
+
+def iter_folders(blob_root: Path):
+    stack = [blob_root]
+    while stack:
+        folder = stack.pop()
+        yield folder
+        with os.scandir(folder) as it:
+            for entry in it:
+                if entry.is_dir() and not entry.name.startswith(".") and not is_shard_dir(Path(entry.path)):
+                    stack.append(Path(entry.path))
+
+
+def iter_batches(folder: Path, batch_size: int):
+    batch = []
+    with os.scandir(folder) as it:
+        for entry in it:
+            if entry.is_file() and STORED_NAME.match(entry.name):
+                batch.append(entry.name)
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+    if batch:
+        yield batch
+
+
+def open_index(meta_dir: Path):
+    db_path = meta_dir / ".index.sqlite"
+    if not db_path.is_file():
+        return None
+    db = sqlite3.connect(str(db_path), timeout=5.0, isolation_level=None)
+    db.execute("PRAGMA busy_timeout = 5000")
+    return db
+
+
+def move_variants(root: Path, old_rel: str, new_rel: str) -> None:
+    variants = root / "variants"
+    if not variants.is_dir():
+        return
+    name = old_rel.rpartition("/")[2]
+    for variant in variants.glob(f"w*q*/{old_rel}.*"):
+        preset = variant.relative_to(variants).parts[0]
+        target = variants / preset / f"{new_rel}{variant.name[len(name):]}"
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(variant, target)
+
+
+def update_cas(root: Path, sha: str, old_rel: str, new_rel: str) -> None:
+    """Point the dedup record at the new path, under the same flock upload.php/delete.php take."""
+    if not re.fullmatch(r"[0-9a-f]{64}", sha):
+        return
+    try:
+        handle = open(root / "meta" / ".cas" / sha[0:2] / f"{sha}.json", "r+", encoding="utf-8")
+    except OSError:
+        return
+    with handle:
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            record = json.loads(handle.read() or "null")
+        except ValueError:
+            return
+        if not isinstance(record, dict) or not isinstance(record.get("paths"), list):
+            return
+        record["paths"] = [new_rel if path == old_rel else path for path in record["paths"]]
+        handle.seek(0)
+        handle.truncate()
+        handle.write(json.dumps(record, separators=(",", ":")))
+
+
+def move_one(root: Path, blob_dir: Path, meta_dir: Path, rel_folder: str, name: str, blob_path: str, index) -> bool:
+    stored = f"{name[0:2]}/{name[2:4]}/{name}"
+    src_blob = blob_dir / name
+    dst_blob = blob_dir / stored
+    if dst_blob.exists():
+        return False
+    old_rel = f"{rel_folder}/{name}" if rel_folder else name
+    new_rel = f"{rel_folder}/{stored}" if rel_folder else stored
+
+    src_meta = meta_dir / f"{name}.json"
+    dst_meta = meta_dir / f"{stored}.json"
+    meta = None
+    if src_meta.is_file():
+        try:
+            meta = json.loads(src_meta.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            meta = None
+    if isinstance(meta, dict):
+        meta["path"] = new_rel
+        url = meta.get("url")
+        suffix = f"/{blob_path}/{old_rel}"
+        if isinstance(url, str) and url.endswith(suffix):
+            meta["url"] = url[: -len(suffix)] + f"/{blob_path}/{new_rel}"
+        dst_meta.parent.mkdir(parents=True, exist_ok=True)
+        tmp = dst_meta.with_name(dst_meta.name + ".tmp")
+        tmp.write_text(json.dumps(meta, indent=4), encoding="utf-8")
+        os.replace(tmp, dst_meta)
+
+    dst_blob.parent.mkdir(parents=True, exist_ok=True)
+    os.rename(src_blob, dst_blob)
+    for suffix in (".br", ".gz"):
+        sibling = blob_dir / f"{name}{suffix}"
+        if sibling.is_file():
+            os.rename(sibling, blob_dir / f"{stored}{suffix}")
+
+    if index is not None:
+        payload = json.dumps(meta, separators=(",", ":")) if isinstance(meta, dict) else None
+        index.execute("UPDATE files SET name = ?, meta = ? WHERE name = ?", (stored, payload, name))
+    if isinstance(meta, dict):
+        src_meta.unlink(missing_ok=True)
+        if isinstance(meta.get("sha256"), str):
+            update_cas(root, meta["sha256"], old_rel, new_rel)
+    move_variants(root, old_rel, new_rel)
+    return True
+
+
+def migrate(root: Path, batch_size: int, pause: float, dry_run: bool) -> int:
+    env = read_env(root)
+    blob_path = env.get("HALAL_BLOB_PATH", "blob").strip("/ ") or "blob"
+    blob_root = root / blob_path
+    meta_root = root / "meta"
+    if not blob_root.is_dir():
+        raise SystemExit(f"blob root not found: {blob_root}")
+
+    moved = 0
+    for blob_dir in iter_folders(blob_root):
+        rel_folder = blob_dir.relative_to(blob_root).as_posix()
+        rel_folder = "" if rel_folder == "." else rel_folder
+        meta_dir = meta_root / rel_folder if rel_folder else meta_root
+        index = None if dry_run else open_index(meta_dir)
+        try:
+            for batch in iter_batches(blob_dir, batch_size):
+                if dry_run:
+                    moved += len(batch)
+                    continue
+                for name in batch:
+                    if move_one(root, blob_dir, meta_dir, rel_folder, name, blob_path, index):
+                        moved += 1
+                print(f"{rel_folder or '/'}: moved {moved} so far")
+                if pause > 0:
+                    time.sleep(pause)
+        finally:
+            if index is not None:
+                index.close()
+    return moved
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Move a flat blob/meta tree into the sharded layout.")
+    parser.add_argument("--root", type=Path, default=Path.cwd(), help="Gateway root holding .env, blob/ and meta/")
+    parser.add_argument("--batch-size", type=int, default=500, help="Files moved between pauses")
+    parser.add_argument("--pause", type=float, default=0.1, help="Seconds to sleep between batches")
+    parser.add_argument("--dry-run", action="store_true", help="Only count files that would move")
+    args = parser.parse_args()
+
+    moved = migrate(args.root.resolve(), max(1, args.batch_size), args.pause, args.dry_run)
+    verb = "would move" if args.dry_run else "moved"
+    print(f"Done: {verb} {moved} file(s).")
+
+
+if __name__ == "__main__":
+    main()